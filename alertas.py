@@ -0,0 +1,228 @@
+"""
+Motor de alertas evaluado en la ingesta.
+
+Las reglas salen de SENSOR_RANGES con los mismos umbrales que usa el dashboard
+(calculate_overall_status):
+
+    Crítico      valor > optimal_max * 1.5   o   valor < optimal_min * 0.5
+    Advertencia  valor > optimal_max         o   valor < optimal_min
+    Óptimo       en otro caso
+
+Para evitar alertas que parpadean:
+
+* histéresis: para bajar de nivel el valor debe quedar dentro del umbral con un
+  margen (HYSTERESIS * ancho del rango óptimo);
+* debounce: un cambio de nivel solo se confirma tras DEBOUNCE lecturas seguidas
+  que lo indiquen.
+
+Cada transición confirmada se agrega a la tabla `alerts` y el nivel vigente se
+guarda en `alert_state`, así el estado del galpón y las recomendaciones del
+dashboard son una consulta pequeña y las alertas funcionan sin nadie mirando.
+"""
+import queue
+import threading
+import time
+
+from sqlalchemy import text
+
+from almacenamiento import all_engines, split_rows
+from normalizacion import utc_now
+from rangos import SENSOR_RANGES
+
+LEVELS = ("Óptimo", "Advertencia", "Crítico")
+HYSTERESIS = 0.05   # fracción del rango óptimo
+DEBOUNCE = 3        # lecturas consecutivas para confirmar un cambio
+
+CREATE_TABLES_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS alerts (
+        id BIGSERIAL PRIMARY KEY,
+        device VARCHAR NOT NULL,
+        sensor VARCHAR NOT NULL,
+        level_from SMALLINT NOT NULL,
+        level_to SMALLINT NOT NULL,
+        value DOUBLE PRECISION,
+        time TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS alerts_time_idx ON alerts (time)",
+    """
+    CREATE TABLE IF NOT EXISTS alert_state (
+        device VARCHAR NOT NULL,
+        sensor VARCHAR NOT NULL,
+        level SMALLINT NOT NULL,
+        value DOUBLE PRECISION,
+        since TIMESTAMP NOT NULL,
+        PRIMARY KEY (device, sensor)
+    )
+    """,
+)
+
+INSERT_ALERT_SQL = """
+INSERT INTO alerts (device, sensor, level_from, level_to, value, time)
+VALUES (:device, :sensor, :level_from, :level_to, :value, :time)
+"""
+
+UPSERT_STATE_SQL = """
+INSERT INTO alert_state (device, sensor, level, value, since)
+VALUES (:device, :sensor, :level_to, :value, :time)
+ON CONFLICT (device, sensor) DO UPDATE SET
+    level = EXCLUDED.level, value = EXCLUDED.value, since = EXCLUDED.since
+"""
+
+
+def classify(value, details, margin=0.0):
+    """
+    Nivel de un valor (0 Óptimo, 1 Advertencia, 2 Crítico).
+
+    Con margin > 0 los umbrales se estrechan: se usa para decidir si un valor
+    ya volvió lo bastante adentro como para bajar de nivel.
+    """
+    opt_min = details['optimal_min']
+    opt_max = details['optimal_max']
+    # Con optimal_min = 0 no hay umbral inferior (ni margen que aplicarle)
+    low = opt_min > 0
+    if value > opt_max * 1.5 - margin or (low and value < opt_min * 0.5 + margin):
+        return 2
+    if value > opt_max - margin or (low and value < opt_min + margin):
+        return 1
+    return 0
+
+
+class _SensorState:
+    __slots__ = ("level", "candidate", "count")
+
+    def __init__(self):
+        self.level = 0
+        self.candidate = 0
+        self.count = 0
+
+
+class AlertEngine:
+    """
+    Evalúa las reglas por lectura y registra las transiciones confirmadas.
+
+    Args:
+        ranges (dict): Rangos por sensor (por defecto SENSOR_RANGES).
+        hysteresis (float): Margen para bajar de nivel, en fracción del rango óptimo.
+        debounce (int): Lecturas consecutivas para confirmar un cambio.
+    """
+
+    def __init__(self, ranges=None, hysteresis=HYSTERESIS, debounce=DEBOUNCE):
+        self.ranges = ranges or SENSOR_RANGES
+        self.debounce = debounce
+        self._margins = {
+            sensor: hysteresis * (d['optimal_max'] - d['optimal_min'])
+            for sensor, d in self.ranges.items()
+        }
+        self._state = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = None
+
+    def evaluate(self, device, values, t=None):
+        """
+        Evalúa una lectura.
+
+        Args:
+            device (str): Dispositivo.
+            values (dict): Valores por sensor.
+            t (datetime): Instante de la lectura, UTC sin zona (por defecto, ahora).
+
+        Returns:
+            list: Transiciones confirmadas por esta lectura (dicts).
+        """
+        t = t or utc_now()
+        transitions = []
+        with self._lock:
+            for sensor, details in self.ranges.items():
+                value = values.get(sensor)
+                if value is None:
+                    continue
+                value = float(value)
+                state = self._state.get((device, sensor))
+                if state is None:
+                    state = self._state[(device, sensor)] = _SensorState()
+
+                target = classify(value, details)
+                if target < state.level:
+                    # Solo baja si el valor está dentro del umbral con margen
+                    target = max(target, min(state.level, classify(value, details, self._margins[sensor])))
+
+                if target == state.level:
+                    state.candidate, state.count = state.level, 0
+                    continue
+                if target != state.candidate:
+                    state.candidate, state.count = target, 0
+                state.count += 1
+                if state.count >= self.debounce:
+                    transitions.append({
+                        "device": device,
+                        "sensor": sensor,
+                        "level_from": state.level,
+                        "level_to": target,
+                        "value": value,
+                        "time": t,
+                    })
+                    state.level, state.count = target, 0
+        for transition in transitions:
+            self._queue.put(transition)
+        return transitions
+
+    # ---------------------------------------------------------------- escritura
+
+    def _write(self, engine, transitions):
+        # Con un ShardRouter, cada alerta va al shard de la granja de su dispositivo.
+        # Las escritas se quitan de la lista: si un shard falla, solo se reintenta ese.
+        for shard, shard_transitions in split_rows(engine, list(transitions), lambda t: t["device"]):
+            with shard.begin() as conn:
+                for sql in CREATE_TABLES_SQL:
+                    conn.execute(text(sql))
+                conn.execute(text(INSERT_ALERT_SQL), shard_transitions)
+                conn.execute(text(UPSERT_STATE_SQL), shard_transitions)
+            for p in shard_transitions:
+                transitions.remove(p)
+                print(f"Alerta {p['device']} {p['sensor']}: {LEVELS[p['level_from']]} → {LEVELS[p['level_to']]} ({p['value']})")
+
+    def load_state(self, engine):
+        """Retoma los niveles vigentes de alert_state (p. ej. tras reiniciar la ingesta)."""
+        rows = []
+        for shard in all_engines(engine):
+            # Un shard recién agregado todavía no tiene las tablas
+            with shard.begin() as conn:
+                for sql in CREATE_TABLES_SQL:
+                    conn.execute(text(sql))
+                rows += conn.execute(text("SELECT device, sensor, level FROM alert_state")).fetchall()
+        with self._lock:
+            for device, sensor, level in rows:
+                state = self._state.setdefault((device, sensor), _SensorState())
+                state.level = state.candidate = int(level)
+        return len(rows)
+
+    def start_writer(self, engine, retry=5.0):
+        """Escribe las transiciones en un hilo aparte; si la BD falla, reintenta el lote."""
+        try:
+            self.load_state(engine)
+        except Exception as e:
+            print(f"No se pudo leer alert_state, se parte de niveles óptimos: {e}")
+
+        def loop():
+            pending = []
+            while True:
+                if not pending:
+                    pending.append(self._queue.get())
+                while True:
+                    try:
+                        pending.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    self._write(engine, pending)
+                except Exception as e:
+                    print(f"No se pudieron registrar {len(pending)} alertas: {e}")
+                    time.sleep(retry)
+
+        if self._writer is None:
+            self._writer = threading.Thread(target=loop, daemon=True)
+            self._writer.start()
+        return self
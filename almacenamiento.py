@@ -0,0 +1,301 @@
+"""
+Capa de almacenamiento compartida por la API, los servidores de sockets, el
+dashboard y las herramientas de línea de comandos.
+
+El backend se elige por entorno, en este orden:
+
+    DATABASE_URL=postgresql+pg8000://...   PostgreSQL (u otra URL de SQLAlchemy)
+    DB_HOST, DB_USER, DB_PASSWORD, ...     PostgreSQL armado por partes
+    (nada de lo anterior)                  SQLite embebido, sin servicio externo,
+                                           en SQLITE_PATH (por defecto granja.db)
+
+STORAGE_BACKEND=sqlite deja explícita la última opción. Las credenciales nunca
+van en el código: un despliegue con PostgreSQL debe definir DATABASE_URL o DB_*.
+
+Varias granjas (galpones) se reparten en shards: cada granja tiene su propia
+base (otra instancia de PostgreSQL u otro archivo de SQLite) con su propia
+tabla sensors3, y las lecturas se enrutan por el ID del dispositivo. Las
+granjas se declaran en un JSON (GRANJAS_CONFIG, por defecto granjas.json):
+
+    {
+        "ucc":   {"nombre": "Galpón Avícola UCC", "url": "postgresql+pg8000://...",
+                  "dispositivos": ["ESP1", "ESP2"]},
+        "norte": {"nombre": "Galpón Norte", "url": "sqlite:///norte.db",
+                  "prefijos": ["NOR-"]}
+    }
+
+Un dispositivo va a la granja que lo lista en "dispositivos"; si no, a la del
+prefijo más largo que coincida; si no, a la primera granja del archivo. Sin
+archivo hay una sola granja con la base de database_url(), como siempre.
+
+SQLite se abre en modo WAL (lectores y un escritor a la vez, como hacen el
+dashboard y la ingesta) y con índices en (device, time) y (time), así los
+rangos y agregaciones del dashboard corren localmente. El resto de las tablas
+auxiliares (sensor_stats, alert_state, ...) las crea cada módulo con su propio
+CREATE TABLE IF NOT EXISTS, que es compatible con ambos backends.
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import URL
+
+DEFAULT_SQLITE_PATH = "granja.db"
+DEFAULT_FARMS_CONFIG = "granjas.json"
+DEFAULT_FARM_NAME = "Galpón Avícola UCC"
+
+SENSORS3_COLUMNS = """
+    device VARCHAR,
+    ip VARCHAR,
+    lux DOUBLE PRECISION,
+    nh3 DOUBLE PRECISION,
+    hs DOUBLE PRECISION,
+    h DOUBLE PRECISION,
+    t DOUBLE PRECISION,
+    time TIMESTAMP
+"""
+
+SCHEMA_SQL = {
+    "postgresql": (
+        f"CREATE TABLE IF NOT EXISTS sensors3 (id BIGSERIAL PRIMARY KEY, {SENSORS3_COLUMNS})",
+        "CREATE INDEX IF NOT EXISTS sensors3_time_idx ON sensors3 (time)",
+    ),
+    "sqlite": (
+        f"CREATE TABLE IF NOT EXISTS sensors3 (id INTEGER PRIMARY KEY AUTOINCREMENT, {SENSORS3_COLUMNS})",
+        "CREATE UNIQUE INDEX IF NOT EXISTS sensors3_device_time_uq ON sensors3 (device, time)",
+        "CREATE INDEX IF NOT EXISTS sensors3_time_idx ON sensors3 (time)",
+        # BIGSERIAL no existe en SQLite: la tabla de alertas se crea aquí con su equivalente
+        """
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device VARCHAR NOT NULL,
+            sensor VARCHAR NOT NULL,
+            level_from SMALLINT NOT NULL,
+            level_to SMALLINT NOT NULL,
+            value DOUBLE PRECISION,
+            time TIMESTAMP NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS alerts_time_idx ON alerts (time)",
+    ),
+}
+
+# Inicio del intervalo de `time` (TIMESTAMP sin zona) en múltiplos de :interval
+# segundos desde la época; lo comparten la retención y el mapa de la granja
+BUCKET_SQL = "to_timestamp(floor(extract(epoch FROM time) / :interval) * :interval) AT TIME ZONE 'UTC'"
+SQLITE_BUCKET_SQL = "datetime(CAST(strftime('%s', time) AS INTEGER) / :interval * :interval, 'unixepoch')"
+
+Granja = namedtuple("Granja", "id nombre url dispositivos prefijos")
+
+_engines = {}
+_farms = None
+_lock = threading.Lock()
+
+
+def database_url():
+    """URL de la base configurada en el entorno (ver el docstring del módulo)."""
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    if os.getenv("DB_HOST"):
+        # URL.create escapa usuario y contraseña (una contraseña con @, / o :
+        # formateada tal cual cambiaría el host o la base)
+        return URL.create(
+            "postgresql+pg8000",
+            username=os.getenv("DB_USER", "postgres"),
+            password=os.getenv("DB_PASSWORD") or None,
+            host=os.getenv("DB_HOST"),
+            port=int(os.getenv("DB_PORT", "5432")),
+            database=os.getenv("DB_NAME", "galpon_db"),
+        ).render_as_string(hide_password=False)
+    backend = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+    if backend != "sqlite":
+        raise RuntimeError(f"STORAGE_BACKEND={backend} requiere DATABASE_URL o DB_HOST")
+    return f"sqlite:///{os.getenv('SQLITE_PATH', DEFAULT_SQLITE_PATH)}"
+
+
+def is_sqlite(bind):
+    """True si el engine o la conexión es de SQLite."""
+    return bind.dialect.name == "sqlite"
+
+
+def bucket_sql(bind):
+    """Expresión SQL del inicio del intervalo de cada lectura para este backend."""
+    return SQLITE_BUCKET_SQL if is_sqlite(bind) else BUCKET_SQL
+
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def ensure_schema(engine):
+    """Crea sensors3 y sus índices (y en SQLite, las tablas que lo necesitan) si faltan."""
+    statements = SCHEMA_SQL.get(engine.dialect.name, ())
+    with engine.begin() as conn:
+        for sql in statements:
+            conn.execute(text(sql))
+
+
+def get_engine(url=None, pool=None, **kwargs):
+    """
+    Engine compartido por proceso para la URL dada (por defecto, database_url()).
+
+    Args:
+        url (str): URL de SQLAlchemy.
+        pool (str): Nombre del pool. Con otro nombre se obtiene otro engine (y
+            otro pool de conexiones) para la misma base, p. ej. para que las
+            exportaciones largas no ocupen las conexiones de la ingesta.
+        **kwargs: Opciones del pool (pool_size, max_overflow, ...) para create_engine;
+            solo cuentan en la primera llamada de cada (url, pool).
+
+    Returns:
+        Engine: El mismo objeto en cada llamada con la misma URL y pool.
+    """
+    url = url or database_url()
+    with _lock:
+        engine = _engines.get((url, pool))
+        if engine is None:
+            if url.startswith("sqlite"):
+                print(f"Almacenamiento: SQLite local en {url}")
+                kwargs.setdefault("connect_args", {"check_same_thread": False})
+                engine = create_engine(url, **kwargs)
+                event.listen(engine, "connect", _sqlite_pragmas)
+                ensure_schema(engine)
+            else:
+                engine = create_engine(url, **kwargs)
+            _engines[(url, pool)] = engine
+        return engine
+
+
+def discard_inherited_connections():
+    """
+    Olvida, sin cerrarlas, las conexiones de los pools heredadas de un fork.
+
+    Llamar al comienzo de un proceso hijo: esas conexiones siguen siendo del
+    padre, y usarlas (o cerrarlas) desde el hijo corrompería las del padre.
+    """
+    with _lock:
+        engines = list(_engines.values())
+    for engine in engines:
+        engine.dispose(close=False)
+
+
+# |||||||||||||||||||||-----Granjas y shards------||||||||||||||||||||||||||||||
+
+def load_farms(path=None):
+    """
+    Lee la configuración de granjas.
+
+    Returns:
+        dict: Granjas por id, en el orden del archivo (la primera es la de por defecto).
+    """
+    path = path or os.getenv("GRANJAS_CONFIG", DEFAULT_FARMS_CONFIG)
+    if not os.path.exists(path):
+        return {"principal": Granja("principal", DEFAULT_FARM_NAME, database_url(), (), ())}
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    if not config:
+        raise ValueError(f"{path} no declara ninguna granja")
+    return {
+        farm_id: Granja(
+            farm_id,
+            item.get("nombre", farm_id),
+            item.get("url") or database_url(),
+            tuple(item.get("dispositivos", ())),
+            tuple(item.get("prefijos", ())),
+        )
+        for farm_id, item in config.items()
+    }
+
+
+def farms():
+    """Granjas configuradas (se leen una vez por proceso)."""
+    global _farms
+    if _farms is None:
+        _farms = load_farms()
+    return _farms
+
+
+def default_farm():
+    return next(iter(farms()))
+
+
+def farm_for_device(device):
+    """Id de la granja a la que pertenece un dispositivo."""
+    candidates = farms()
+    for farm in candidates.values():
+        if device in farm.dispositivos:
+            return farm.id
+    best, best_len = None, -1
+    for farm in candidates.values():
+        for prefix in farm.prefijos:
+            if device and device.startswith(prefix) and len(prefix) > best_len:
+                best, best_len = farm.id, len(prefix)
+    return best or default_farm()
+
+
+def engine_for_farm(farm_id=None, **kwargs):
+    """Engine del shard de una granja (por defecto, la primera)."""
+    return get_engine(farms()[farm_id or default_farm()].url, **kwargs)
+
+
+class ShardRouter:
+    """
+    Reparte filas entre los shards según el dispositivo de cada una.
+
+    Args:
+        **engine_kwargs: Opciones del pool para los engines de todos los shards.
+    """
+
+    def __init__(self, **engine_kwargs):
+        self.engine_kwargs = engine_kwargs
+        self._by_device = {}
+
+    def engine_for(self, device):
+        engine = self._by_device.get(device)
+        if engine is None:
+            engine = self._by_device[device] = engine_for_farm(farm_for_device(device), **self.engine_kwargs)
+        return engine
+
+    def engines(self):
+        """Un engine por shard distinto (granjas con la misma URL comparten engine)."""
+        unique = {}
+        for farm in farms().values():
+            unique.setdefault(farm.url, engine_for_farm(farm.id, **self.engine_kwargs))
+        return list(unique.values())
+
+    def split(self, rows, device_of):
+        """
+        Agrupa filas por shard.
+
+        Returns:
+            list: Pares (engine, filas) en el orden de aparición.
+        """
+        groups = {}
+        for row in rows:
+            engine = self.engine_for(device_of(row))
+            groups.setdefault(id(engine), (engine, []))[1].append(row)
+        return list(groups.values())
+
+
+def split_rows(target, rows, device_of):
+    """
+    Pares (engine, filas) para un engine fijo o un ShardRouter.
+
+    Permite que los módulos que escriben (estadísticas, alertas) acepten
+    cualquiera de los dos.
+    """
+    if isinstance(target, ShardRouter):
+        return target.split(rows, device_of)
+    return [(target, list(rows))] if rows else []
+
+
+def all_engines(target):
+    """Engines detrás de un engine fijo o un ShardRouter."""
+    return target.engines() if isinstance(target, ShardRouter) else [target]
@@ -0,0 +1,96 @@
+"""
+Comparación de codificaciones para la API HTTP de ingesta.
+
+Para cada formato (JSON, MessagePack, CBOR) y compresión (ninguna, gzip, zstd)
+mide bytes por lectura y segundos de CPU para decodificar 10.000 lecturas con
+codificacion.decode_readings, con cuerpos de una lectura (como envían hoy los
+ESP) y lotes de varias. Los formatos cuyo paquete no está instalado se omiten.
+
+Uso:
+    python bench_codificacion.py [n_lecturas] [lecturas_por_lote]
+"""
+import gzip
+import json
+import random
+import sys
+import time
+
+from codificacion import decode_readings
+
+
+def make_readings(n):
+    return [
+        {
+            "device": f"ESP{i % 6 + 1}",
+            "lux": random.randint(100, 500),
+            "nh3": random.randint(5, 20),
+            "hs": random.randint(30, 350),
+            "h": random.randint(50, 90),
+            "t": random.randint(18, 35),
+            "time": f"2024-05-01T12:{i // 60 % 60:02d}:{i % 60:02d}",
+        }
+        for i in range(n)
+    ]
+
+
+def encoders():
+    found = {"json": ("application/json", lambda obj: json.dumps(obj, separators=(",", ":")).encode())}
+    try:
+        import msgpack
+        found["msgpack"] = ("application/msgpack", msgpack.packb)
+    except ImportError:
+        print("msgpack no instalado, se omite")
+    try:
+        import cbor2
+        found["cbor"] = ("application/cbor", cbor2.dumps)
+    except ImportError:
+        print("cbor2 no instalado, se omite")
+    return found
+
+
+def compressors():
+    found = {"identity": lambda b: b, "gzip": lambda b: gzip.compress(b, 6)}
+    try:
+        import zstandard
+        cctx = zstandard.ZstdCompressor(level=3)
+        found["zstd"] = cctx.compress
+    except ImportError:
+        print("zstandard no instalado, se omite")
+    return found
+
+
+def bench(readings, batch, formats, compressions):
+    bodies_per_fmt = {}
+    for fmt, (content_type, dumps) in formats.items():
+        if batch == 1:
+            bodies_per_fmt[fmt] = (content_type, [dumps(r) for r in readings])
+        else:
+            bodies_per_fmt[fmt] = (content_type, [dumps(readings[i:i + batch]) for i in range(0, len(readings), batch)])
+
+    n = len(readings)
+    for fmt, (content_type, bodies) in bodies_per_fmt.items():
+        for encoding, compress in compressions.items():
+            compressed = [compress(b) for b in bodies]
+            t0 = time.process_time()
+            decoded = sum(len(decode_readings(b, content_type, encoding)) for b in compressed)
+            cpu = time.process_time() - t0
+            assert decoded == n
+            total_bytes = sum(len(b) for b in compressed)
+            print(
+                f"{fmt:<8} {encoding:<9} {total_bytes / n:8.1f} B/lectura"
+                f" {cpu * 10_000 / n * 1000:10.1f} ms CPU/10k"
+            )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    readings = make_readings(n)
+    formats, compressions = encoders(), compressors()
+    for size in (1, batch):
+        print(f"\n{n} lecturas, {size} por petición")
+        bench(readings, size, formats, compressions)
+
+
+if __name__ == "__main__":
+    main()
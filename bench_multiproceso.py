@@ -0,0 +1,93 @@
+"""
+Escalado de la ingesta por sockets con el número de workers (multiproceso.py).
+
+Cada worker hace lo que la ingesta hace con la CPU: leer marcos binarios y
+normalizar cada lectura (sin base de datos, que se mide aparte). Varios
+procesos cliente envían lotes tan rápido como pueden y se mide cuántas
+lecturas por segundo procesa el conjunto de workers.
+
+Uso:
+    python bench_multiproceso.py [workers separados por comas] [lecturas por cliente]
+    python bench_multiproceso.py 1,2,4 20000
+
+Con menos núcleos que workers no hay nada que escalar: el resultado muestra
+el costo de repartir, no la ganancia.
+"""
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+from multiproceso import Supervisor
+from normalizacion import normalize_reading
+from protocolo import encode_readings, read_readings
+
+IP = "127.0.0.1"
+BASE_PORT = 18890
+CLIENTS = 4
+BATCH = 50
+
+
+def handle(conn, stats):
+    with conn:
+        while True:
+            readings = read_readings(conn)
+            if not readings:
+                return
+            for j in readings:
+                normalize_reading(j)
+            stats.incr("lecturas", len(readings))
+
+
+def worker_main(sock, stats):
+    while True:
+        conn, _ = sock.accept()
+        threading.Thread(target=handle, args=(conn, stats), daemon=True).start()
+
+
+def client(port, n, index):
+    frame = encode_readings([
+        {"Device": f"ESP{index}-{i}", "IP": "10.0.0.1", "LUX": 120.5, "NH3": 8, "HS": 40, "H": 60, "T": 22.5,
+         "ts": 1_700_000_000 + i}
+        for i in range(BATCH)
+    ])
+    with socket.create_connection((IP, port)) as s:
+        for _ in range(n // BATCH):
+            s.sendall(frame)
+
+
+def measure(workers, per_client, port):
+    supervisor = Supervisor(worker_main, IP, port, workers=workers, stats_interval=1e9)
+    runner = threading.Thread(target=supervisor.run, daemon=True)
+    runner.start()
+    time.sleep(1.0 + 0.2 * workers)   # arranque de los workers
+    total = CLIENTS * (per_client // BATCH) * BATCH
+    clients = [multiprocessing.Process(target=client, args=(port, per_client, i)) for i in range(CLIENTS)]
+    t0 = time.perf_counter()
+    for p in clients:
+        p.start()
+    while supervisor.stats()["total"]["lecturas"] < total:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - t0
+    for p in clients:
+        p.join()
+    supervisor.stop()
+    runner.join()
+    return total / elapsed
+
+
+def main():
+    counts = [int(w) for w in (sys.argv[1] if len(sys.argv) > 1 else "1,2,4").split(",")]
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    print(f"{os.cpu_count()} núcleos, {CLIENTS} clientes x {per_client} lecturas en lotes de {BATCH}\n")
+    base = None
+    for i, workers in enumerate(counts):
+        rate = measure(workers, per_client, BASE_PORT + i)
+        base = base or rate
+        print(f"{workers:3d} workers {rate:12,.0f} lecturas/s  x{rate / base:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Costo por lectura de la normalización en la ingesta por sockets.
+
+Compara el camino anterior del handler (dos DataFrames de una fila por mensaje,
+rename, to_datetime y apply fila a fila) con normalize_reading (tuplas, sin
+pandas) más un to_frame por lote, que es cuando se usa pandas ahora.
+
+Uso:
+    python bench_normalizacion.py [n_lecturas] [lecturas_por_lote]
+"""
+import random
+import sys
+import time
+
+import pandas as pd
+
+from normalizacion import normalize_reading, to_frame
+
+COLUMNAS = {
+    'Device': 'device', 'IP': 'ip', 'LUX': 'lux', 'NH3': 'nh3',
+    'HS': 'hs', 'H': 'h', 'T': 't', 'time': 'time',
+}
+
+
+def make_readings(n):
+    now = int(time.time())
+    return [
+        {
+            "Device": f"ESP{i % 6 + 1}",
+            "IP": "192.168.1.100",
+            "LUX": round(random.uniform(100.0, 500.0), 2),
+            "NH3": round(random.uniform(5.0, 20.0), 2),
+            "HS": round(random.uniform(30.0, 350.0), 2),
+            "H": round(random.uniform(50.0, 90.0), 2),
+            "T": round(random.uniform(18.0, 35.0), 2),
+            "ts": now - n + i,
+        }
+        for i in range(n)
+    ]
+
+
+def legacy(j):
+    # Lo que hacía procesar_lectura por cada mensaje
+    j = dict(j)
+    ts = j.pop("ts", None)
+    j["time"] = time.strftime('%Y-%m-%d %X', time.localtime(ts))
+    df2 = pd.DataFrame([j])
+    df2 = df2.rename(columns=COLUMNAS)
+    df2['time'] = pd.to_datetime(df2['time'])
+    condicion = df2['time'].apply(lambda x: x.minute % 5 == 0 and 0 <= x.second <= 10)
+    df2[condicion]
+    return df2
+
+
+def report(name, seconds, n):
+    print(f"{name:<34} {seconds / n * 1e6:10.2f} µs/lectura {n / seconds:12,.0f} lecturas/s")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    readings = make_readings(n)
+    print(f"{n} lecturas, lotes de {batch}\n")
+
+    t0 = time.perf_counter()
+    for j in readings:
+        legacy(j)
+    report("pandas por mensaje (anterior)", time.perf_counter() - t0, n)
+
+    t0 = time.perf_counter()
+    filas = [normalize_reading(j) for j in readings]
+    t1 = time.perf_counter()
+    report("normalize_reading (tuplas)", t1 - t0, n)
+
+    for i in range(0, n, batch):
+        to_frame(filas[i:i + batch])
+    t2 = time.perf_counter()
+    report(f"to_frame por lote de {batch}", t2 - t1, n)
+    report("normalización + lote (nuevo)", t2 - t0, n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Comparación de rendimiento entre el JSON legado y el protocolo binario.
+
+Mide bytes por lectura y lecturas por segundo al codificar y decodificar,
+con marcos de una lectura (como envían hoy los ESP) y marcos de varias.
+
+Uso:
+    python bench_protocolo.py [n_lecturas]
+"""
+import json
+import random
+import sys
+import time
+
+from protocolo import HEADER, decode_body, encode_json, encode_readings
+
+
+def make_readings(n):
+    return [
+        {
+            "Device": f"ESP{i % 6 + 1}",
+            "IP": "192.168.1.100",
+            "LUX": round(random.uniform(100.0, 500.0), 2),
+            "NH3": round(random.uniform(5.0, 20.0), 2),
+            "HS": round(random.uniform(30.0, 350.0), 2),
+            "H": round(random.uniform(50.0, 90.0), 2),
+            "T": round(random.uniform(18.0, 35.0), 2),
+        }
+        for i in range(n)
+    ]
+
+
+def bench(name, encode, decode, readings):
+    t0 = time.perf_counter()
+    messages = encode(readings)
+    t1 = time.perf_counter()
+    decoded = decode(messages)
+    t2 = time.perf_counter()
+    assert decoded == len(readings)
+    total_bytes = sum(len(m) for m in messages)
+    n = len(readings)
+    print(
+        f"{name:<22} {total_bytes / n:8.1f} B/lectura"
+        f" {n / (t1 - t0):12,.0f} enc/s {n / (t2 - t1):12,.0f} dec/s"
+    )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    readings = make_readings(n)
+    print(f"{n} lecturas\n")
+
+    bench(
+        "JSON (1 por mensaje)",
+        lambda rs: [encode_json(r) for r in rs],
+        lambda ms: len([json.loads(m) for m in ms]),
+        readings,
+    )
+    bench(
+        "Binario (1 por marco)",
+        lambda rs: [encode_readings([r]) for r in rs],
+        lambda ms: sum(len(decode_body(m[HEADER.size:])) for m in ms),
+        readings,
+    )
+    for batch in (10, 100):
+        bench(
+            f"Binario ({batch} por marco)",
+            lambda rs, b=batch: [encode_readings(rs[i:i + b]) for i in range(0, len(rs), b)],
+            lambda ms: sum(len(decode_body(m[HEADER.size:])) for m in ms),
+            readings,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Decodificación de cuerpos de la API HTTP de ingesta.
+
+Además de JSON, /api/sensores acepta cuerpos más compactos para los enlaces
+celulares de las granjas:
+
+    Content-Type:      application/json | application/msgpack | application/cbor
+    Content-Encoding:  identity | gzip | deflate | zstd
+
+El cuerpo puede ser una lectura (objeto) o un lote (lista de objetos). La ruta
+rápida valida con una función simple en lugar de construir un modelo pydantic
+por lectura. msgpack, cbor2 y zstandard son opcionales: si falta alguno, ese
+formato responde 415 con el paquete a instalar.
+"""
+import json
+import zlib
+from datetime import datetime
+
+from normalizacion import NormalizationError, sensor_value, to_utc
+
+SENSOR_FIELDS = ("lux", "nh3", "hs", "h", "t")
+MAX_BODY_BYTES = 1 << 20   # tope del cuerpo ya descomprimido (evita bombas de compresión)
+
+CONTENT_TYPES = {
+    "application/json": "json",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+    "application/cbor": "cbor",
+}
+
+
+class UnsupportedEncoding(Exception):
+    """Content-Type o Content-Encoding no soportado (o sin su paquete instalado)."""
+
+
+class InvalidPayload(ValueError):
+    """Cuerpo que no se pudo decodificar o lectura con campos inválidos."""
+
+
+def _zlib_decompress(body, wbits, max_bytes):
+    d = zlib.decompressobj(wbits)
+    try:
+        data = d.decompress(body, max_bytes + 1)
+    except zlib.error as e:
+        raise InvalidPayload(f"Cuerpo comprimido inválido: {e}")
+    if len(data) > max_bytes:
+        raise InvalidPayload("Cuerpo descomprimido demasiado grande")
+    return data
+
+
+def _zstd_decompress(body, max_bytes):
+    try:
+        import zstandard
+    except ImportError:
+        raise UnsupportedEncoding("Content-Encoding zstd requiere zstandard (pip install zstandard)")
+    try:
+        with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+            data = reader.read(max_bytes + 1)
+    except zstandard.ZstdError as e:
+        raise InvalidPayload(f"Cuerpo comprimido inválido: {e}")
+    if len(data) > max_bytes:
+        raise InvalidPayload("Cuerpo descomprimido demasiado grande")
+    return data
+
+
+def decompress(body, content_encoding=None, max_bytes=MAX_BODY_BYTES):
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        data = body
+    elif encoding in ("gzip", "x-gzip"):
+        data = _zlib_decompress(body, 16 + zlib.MAX_WBITS, max_bytes)
+    elif encoding == "deflate":
+        data = _zlib_decompress(body, zlib.MAX_WBITS, max_bytes)
+    elif encoding == "zstd":
+        data = _zstd_decompress(body, max_bytes)
+    else:
+        raise UnsupportedEncoding(f"Content-Encoding no soportado: {encoding}")
+    if len(data) > max_bytes:
+        raise InvalidPayload("Cuerpo demasiado grande")
+    return data
+
+
+def _loads(data, fmt):
+    if fmt == "json":
+        return json.loads(data)
+    if fmt == "msgpack":
+        try:
+            import msgpack
+        except ImportError:
+            raise UnsupportedEncoding("application/msgpack requiere msgpack (pip install msgpack)")
+        return msgpack.unpackb(data, raw=False)
+    try:
+        import cbor2
+    except ImportError:
+        raise UnsupportedEncoding("application/cbor requiere cbor2 (pip install cbor2)")
+    return cbor2.loads(data)
+
+
+def normalize_reading(obj):
+    """
+    Valida una lectura y la deja con las columnas de sensors3.
+
+    Acepta las claves en minúsculas o las del JSON legado (Device, LUX, NH3, ...).
+    Valores y hora siguen las mismas reglas que la ingesta por sockets
+    (normalizacion.py): números finitos guardados como float, time en UTC.
+
+    Returns:
+        dict: device, lux, nh3, hs, h, t (float) y time (datetime o None).
+    """
+    if not isinstance(obj, dict):
+        raise InvalidPayload("Cada lectura debe ser un objeto")
+    get = obj.get
+    device = get("device", get("Device"))
+    if not isinstance(device, str) or not device:
+        raise InvalidPayload("Falta el campo device")
+    reading = {"device": device}
+    for field in SENSOR_FIELDS:
+        value = get(field, get(field.upper()))
+        if value is None:
+            raise InvalidPayload(f"Falta el campo {field}")
+        try:
+            reading[field] = sensor_value(value, field)
+        except NormalizationError as e:
+            raise InvalidPayload(str(e))
+    ts = get("time")
+    if ts is not None and not isinstance(ts, datetime):
+        try:
+            ts = datetime.fromisoformat(str(ts))
+        except ValueError:
+            raise InvalidPayload(f"Fecha inválida en time: {ts!r} (use ISO 8601)")
+    # sensors3.time no tiene zona: se guarda en UTC, como la hora por defecto
+    reading["time"] = to_utc(ts) if ts is not None else None
+    return reading
+
+
+def decode_readings(body, content_type=None, content_encoding=None, max_bytes=MAX_BODY_BYTES):
+    """
+    Decodifica el cuerpo de una petición de ingesta.
+
+    Args:
+        body (bytes): Cuerpo tal como llegó.
+        content_type (str): Cabecera Content-Type (por defecto JSON).
+        content_encoding (str): Cabecera Content-Encoding.
+
+    Returns:
+        list: Lecturas normalizadas (ver normalize_reading).
+    """
+    mime = (content_type or "application/json").split(";")[0].strip().lower()
+    fmt = CONTENT_TYPES.get(mime)
+    if fmt is None:
+        raise UnsupportedEncoding(f"Content-Type no soportado: {mime}")
+    data = decompress(body, content_encoding, max_bytes)
+    try:
+        obj = _loads(data, fmt)
+    except UnsupportedEncoding:
+        raise
+    except Exception as e:
+        raise InvalidPayload(f"Cuerpo {fmt} inválido: {e}")
+    items = obj if isinstance(obj, list) else [obj]
+    if not items:
+        raise InvalidPayload("Lote vacío")
+    return [normalize_reading(item) for item in items]
@@ -0,0 +1,112 @@
+"""
+Consultas del dashboard que no dependen de Streamlit.
+
+streamlit_app.py las envuelve con su caché y el engine de la granja elegida;
+aquí solo se arma el SQL y se interpretan los resultados, así se pueden probar
+contra una base SQLite sin levantar el dashboard.
+"""
+import math
+
+from sqlalchemy import DateTime, bindparam, text
+
+from alertas import LEVELS, classify
+from almacenamiento import bucket_sql
+from rangos import SENSOR_RANGES
+
+
+def build_history_query(cursor, page_size):
+    """
+    Una página del historial de un dispositivo, de la más reciente hacia atrás.
+
+    La página parte de la última fila de la anterior (keyset) en lugar de usar
+    OFFSET, así el costo no crece con la profundidad.
+
+    Args:
+        cursor (tuple): (device, time, id) de la última fila vista; time e id en
+            None para la primera página.
+        page_size (int): Filas por página.
+
+    Returns:
+        tuple: (consulta, parámetros).
+    """
+    device, last_time, last_id = cursor
+    where = "device = :device"
+    params = {"device": device, "limit": page_size}
+    if last_time is not None:
+        where += " AND (time, id) < (:last_time, :last_id)"
+        params.update(last_time=last_time, last_id=last_id)
+    query = text(f"""
+    SELECT id, device, lux, nh3, hs, h, t, time
+    FROM sensors3
+    WHERE {where}
+    ORDER BY time DESC, id DESC
+    LIMIT :limit
+    """)
+    if last_time is not None:
+        query = query.bindparams(bindparam("last_time", type_=DateTime))
+    return query, params
+
+
+def next_cursor(page_df):
+    """Cursor de la página siguiente: la última fila de esta."""
+    last = page_df.iloc[-1]
+    return (last['device'], last['time'].to_pydatetime(), int(last['id']))
+
+
+def build_fleet_query(bind, devices, since, interval, sensors=tuple(SENSOR_RANGES)):
+    """
+    Mínimo, máximo y promedio de cada sensor por dispositivo e intervalo.
+
+    Args:
+        bind: Engine o conexión (elige la expresión del intervalo según el backend).
+        devices (list): Dispositivos a incluir.
+        since (datetime): Inicio del rango.
+        interval (int): Segundos de cada intervalo.
+        sensors (tuple): Columnas a agregar.
+
+    Returns:
+        tuple: (consulta, parámetros); columnas device, bucket, n y
+            <sensor>_min/_max/_avg por sensor.
+    """
+    aggregates = ", ".join(
+        f"MIN({s}) AS {s}_min, MAX({s}) AS {s}_max, AVG({s}) AS {s}_avg" for s in sensors
+    )
+    query = text(f"""
+    SELECT device, {bucket_sql(bind)} AS bucket, COUNT(*) AS n, {aggregates}
+    FROM sensors3
+    WHERE time >= :since AND device IN :devices
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    """).bindparams(bindparam("devices", expanding=True), bindparam("since", type_=DateTime))
+    return query, {"since": since, "devices": list(devices), "interval": interval}
+
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def fleet_status(buckets):
+    """
+    Nivel de cada intervalo (0 Óptimo, 1 Advertencia, 2 Crítico) con las reglas
+    de alertas.py: el peor entre el mínimo y el máximo de todos los sensores.
+
+    Un sensor sin lecturas en el intervalo (columna NULL) no cuenta para el nivel.
+
+    Returns:
+        tuple: (nivel, descripción para el tooltip) por fila de buckets.
+    """
+    levels, details = [], []
+    for row in buckets.itertuples(index=False):
+        worst, lines = 0, []
+        for sensor, rango in SENSOR_RANGES.items():
+            low, high = getattr(row, f"{sensor}_min"), getattr(row, f"{sensor}_max")
+            if _missing(low) or _missing(high):
+                lines.append(f"{sensor}: sin datos")
+                continue
+            level = max(classify(low, rango), classify(high, rango))
+            worst = max(worst, level)
+            marker = f" ({LEVELS[level]})" if level else ""
+            lines.append(f"{sensor}: {getattr(row, f'{sensor}_avg'):.1f} {rango['unit']}{marker}")
+        levels.append(worst)
+        details.append(f"{row.n} lecturas<br>" + "<br>".join(lines))
+    return levels, details
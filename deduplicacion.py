@@ -0,0 +1,173 @@
+"""
+Deduplicación de lecturas en la ingesta.
+
+Los reintentos y reconexiones de los ESP pueden reenviar una lectura que ya se
+guardó. Cada lectura con identidad propia (dispositivo + marca de tiempo del
+dispositivo, y su número de secuencia si lo trae) se busca en una ventana de
+memoria acotada antes de escribirla; si ya se vio, se descarta sin tocar la
+base de datos. El seq solo no basta: el contador de un ESP vuelve a empezar al
+reiniciarse, y sus primeras lecturas nuevas parecerían reenvíos.
+
+La ventana es exacta (no da falsos positivos, a diferencia de un filtro de
+Bloom, que descartaría lecturas válidas) y su memoria está acotada tanto por
+tiempo (ttl) como por número de claves (max_entries).
+
+Como respaldo, la tabla sensors3 lleva un índice único (device, time) y las
+inserciones usan ON CONFLICT DO NOTHING, así un duplicado que escape de la
+ventana (p. ej. tras reiniciar el proceso, o un reintento que llega a otro
+worker) tampoco crea una fila nueva. Las dos ingestas (main.py y Servidor.py)
+no arrancan sin ese índice: si la tabla ya tiene duplicados, ensure_unique_index
+falla y explica cómo limpiarlos (DEDUP_DELETE_EXISTING=1 borra los repetidos y
+deja una fila por (device, time)).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+DEFAULT_TTL = float(os.getenv("DEDUP_TTL", 3600))            # segundos
+DEFAULT_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", 200_000))
+DELETE_EXISTING = os.getenv("DEDUP_DELETE_EXISTING") == "1"
+
+UNIQUE_INDEX_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS sensors3_device_time_uq
+ON sensors3 (device, time)
+"""
+
+# Borra duplicados existentes (deja la fila con menor ctid) para poder crear el índice
+DELETE_EXISTING_DUPLICATES_SQL = """
+DELETE FROM sensors3 a
+USING sensors3 b
+WHERE a.device = b.device
+  AND a.time = b.time
+  AND a.ctid > b.ctid
+"""
+
+# Lo mismo en SQLite, con rowid en lugar de ctid
+SQLITE_DELETE_EXISTING_DUPLICATES_SQL = """
+DELETE FROM sensors3
+WHERE rowid NOT IN (SELECT MIN(rowid) FROM sensors3 GROUP BY device, time)
+"""
+
+
+class DedupWindow:
+    """
+    Conjunto de claves vistas recientemente, con memoria acotada.
+
+    Args:
+        ttl (float): Segundos que se recuerda cada clave.
+        max_entries (int): Número máximo de claves; al superarlo se olvidan las
+            más antiguas.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def _expire(self, now):
+        # Las claves están en orden de inserción: basta con mirar el principio
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if now - seen_at <= self.ttl and len(self._seen) <= self.max_entries:
+                break
+            self._seen.popitem(last=False)
+
+    def seen(self, key):
+        """
+        Registra la clave y dice si ya se había visto dentro de la ventana.
+
+        Returns:
+            bool: True si es un duplicado.
+        """
+        if key is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            # Expirar primero: una clave más vieja que ttl ya no cuenta como vista
+            self._expire(now)
+            if key in self._seen:
+                self.duplicates += 1
+                return True
+            self._seen[key] = now
+            if len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return False
+
+    def forget(self, key):
+        # Para cuando la escritura falló y la lectura debe poder reintentarse
+        with self._lock:
+            self._seen.pop(key, None)
+
+    def __len__(self):
+        return len(self._seen)
+
+
+def reading_key(device, seq=None, ts=None):
+    """
+    Identidad de una lectura: (dispositivo, seq, marca de tiempo), o sin seq
+    (dispositivo, marca de tiempo).
+
+    Returns:
+        tuple | None: None si la lectura no trae marca de tiempo del dispositivo
+            (JSON legado, o solo seq) y por lo tanto no se puede deduplicar.
+    """
+    if not ts:
+        return None
+    return (device, seq or None, str(ts))
+
+
+def ensure_unique_index(engine, delete_existing=DELETE_EXISTING):
+    """
+    Garantiza el índice único (device, time) de sensors3 en una base.
+
+    Args:
+        engine: Engine de SQLAlchemy.
+        delete_existing (bool): Si la tabla ya tiene duplicados, borrarlos
+            (deja la primera fila de cada (device, time)) y crear el índice.
+
+    Raises:
+        RuntimeError: Si el índice no se pudo crear; la ingesta no debe
+            arrancar sin él.
+    """
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(UNIQUE_INDEX_SQL))
+        return
+    except Exception as e:
+        if not delete_existing:
+            raise RuntimeError(
+                f"No se pudo crear el índice único (device, time) de sensors3 en {engine.url!r}: {e}. "
+                "Si hay lecturas duplicadas, límpielas o arranque con DEDUP_DELETE_EXISTING=1."
+            ) from e
+    # Transacción nueva: en PostgreSQL la anterior quedó abortada
+    with engine.begin() as conn:
+        sqlite = conn.dialect.name == "sqlite"
+        deleted = conn.execute(
+            text(SQLITE_DELETE_EXISTING_DUPLICATES_SQL if sqlite else DELETE_EXISTING_DUPLICATES_SQL)
+        ).rowcount
+        conn.execute(text(UNIQUE_INDEX_SQL))
+    print(f"Deduplicación: {deleted} lecturas duplicadas borradas en {engine.url!r}")
+
+
+def insert_ignore_duplicates(table, conn, keys, data_iter):
+    """
+    Método para DataFrame.to_sql que inserta con ON CONFLICT DO NOTHING.
+
+        df.to_sql('sensors3', conn, if_exists='append', index=False,
+                  method=insert_ignore_duplicates)
+    """
+    if conn.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    if not rows:
+        return 0
+    stmt = insert(table.table).values(rows).on_conflict_do_nothing()
+    return conn.execute(stmt).rowcount
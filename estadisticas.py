@@ -0,0 +1,227 @@
+"""
+Estadísticas móviles por dispositivo y sensor, calculadas en la ingesta.
+
+Cada lectura actualiza en O(1) la media y varianza exponenciales (EWMA), la
+pendiente (unidades por hora) y el z-score de cada sensor. La pendiente usa la
+hora de la propia lectura y se mide contra una base de al menos
+MIN_SLOPE_SECONDS: lecturas casi simultáneas (un lote, un reenvío) no la
+disparan dividiendo por un dt de milisegundos. El estado vive en
+arreglos de numpy de tamaño fijo (una fila por dispositivo, una columna por
+sensor) y se publica periódicamente en la tabla sensor_stats, de donde el
+dashboard lee tendencias y anomalías sin recorrer el historial.
+
+    stats = StreamingStats()
+    stats.update("ESP1", {"lux": 120, "nh3": 8, ...}, time.time())
+    stats.start_publisher(engine)
+"""
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import text
+
+from almacenamiento import split_rows
+
+SENSORS = ("lux", "nh3", "hs", "h", "t")
+DEFAULT_ALPHA = 0.1          # peso de la lectura nueva en la EWMA
+ANOMALY_Z = 3.0              # |z| a partir del cual la lectura es anómala
+MIN_READINGS = 5             # lecturas antes de confiar en el z-score
+MIN_SLOPE_SECONDS = 30.0     # separación mínima entre lecturas para medir la pendiente
+PUBLISH_INTERVAL = 10.0      # segundos entre publicaciones a sensor_stats
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS sensor_stats (
+    device VARCHAR NOT NULL,
+    sensor VARCHAR NOT NULL,
+    n BIGINT,
+    last DOUBLE PRECISION,
+    mean DOUBLE PRECISION,
+    std DOUBLE PRECISION,
+    slope DOUBLE PRECISION,
+    z DOUBLE PRECISION,
+    updated TIMESTAMP,
+    PRIMARY KEY (device, sensor)
+)
+"""
+
+UPSERT_SQL = """
+INSERT INTO sensor_stats (device, sensor, n, last, mean, std, slope, z, updated)
+VALUES (:device, :sensor, :n, :last, :mean, :std, :slope, :z, :updated)
+ON CONFLICT (device, sensor) DO UPDATE SET
+    n = EXCLUDED.n, last = EXCLUDED.last, mean = EXCLUDED.mean, std = EXCLUDED.std,
+    slope = EXCLUDED.slope, z = EXCLUDED.z, updated = EXCLUDED.updated
+"""
+
+
+class StreamingStats:
+    """
+    Estado EWMA por (dispositivo, sensor) en arreglos compactos.
+
+    Args:
+        sensors (tuple): Columnas a seguir.
+        alpha (float): Factor de suavizado de la EWMA (0-1).
+        capacity (int): Dispositivos iniciales; los arreglos crecen al doble si se llenan.
+    """
+
+    def __init__(self, sensors=SENSORS, alpha=DEFAULT_ALPHA, capacity=64):
+        self.sensors = tuple(sensors)
+        self.alpha = alpha
+        self._index = {}
+        self._devices = []
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._publisher = None
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        shape = (capacity, len(self.sensors))
+        old = getattr(self, "mean", None)
+        arrays = {
+            "n": np.zeros(shape, dtype=np.int64),
+            "last": np.full(shape, np.nan),
+            "mean": np.zeros(shape),
+            "var": np.zeros(shape),
+            "slope": np.zeros(shape),
+            "z": np.zeros(shape),
+            "last_t": np.full(capacity, np.nan),
+            # Base de la pendiente: valor e instante de la última lectura usada para medirla
+            "base_x": np.full(shape, np.nan),
+            "base_t": np.full(shape, np.nan),
+        }
+        for name, array in arrays.items():
+            if old is not None:
+                prev = getattr(self, name)
+                array[:len(prev)] = prev
+            setattr(self, name, array)
+
+    def _row(self, device):
+        row = self._index.get(device)
+        if row is None:
+            row = len(self._devices)
+            if row >= len(self.last_t):
+                self._alloc(2 * len(self.last_t))
+            self._index[device] = row
+            self._devices.append(device)
+        return row
+
+    def update(self, device, values, t=None):
+        """
+        Incorpora una lectura y devuelve sus z-scores.
+
+        Args:
+            device (str): Dispositivo.
+            values (dict): Valores por sensor (se ignoran los que falten o sean None).
+            t (float): Instante epoch de la lectura (por defecto, ahora). Conviene
+                pasar la hora de la lectura y no la de llegada.
+
+        Returns:
+            dict: z-score de cada sensor de la lectura respecto a la media previa.
+        """
+        t = time.time() if t is None else t
+        a = self.alpha
+        zs = {}
+        with self._lock:
+            r = self._row(device)
+            for c, sensor in enumerate(self.sensors):
+                x = values.get(sensor)
+                if x is None:
+                    continue
+                x = float(x)
+                n = self.n[r, c]
+                if n == 0:
+                    self.mean[r, c] = x
+                    self.var[r, c] = 0.0
+                    z = 0.0
+                else:
+                    mean = self.mean[r, c]
+                    std = np.sqrt(self.var[r, c])
+                    z = (x - mean) / std if std > 0 and n >= MIN_READINGS else 0.0
+                    # EWMA incremental de media y varianza
+                    diff = x - mean
+                    incr = a * diff
+                    self.mean[r, c] = mean + incr
+                    self.var[r, c] = (1 - a) * (self.var[r, c] + diff * incr)
+                # Pendiente solo contra una base de al menos MIN_SLOPE_SECONDS (y no futura)
+                dt = t - self.base_t[r, c]
+                if dt >= MIN_SLOPE_SECONDS:
+                    inst_slope = (x - self.base_x[r, c]) / (dt / 3600)
+                    self.slope[r, c] += a * (inst_slope - self.slope[r, c])
+                if dt >= MIN_SLOPE_SECONDS or np.isnan(dt):
+                    self.base_x[r, c] = x
+                    self.base_t[r, c] = t
+                self.z[r, c] = z
+                self.last[r, c] = x
+                self.n[r, c] = n + 1
+                zs[sensor] = float(z)
+            self.last_t[r] = t
+            self._dirty.add(device)
+        return zs
+
+    def snapshot(self, devices=None):
+        """
+        Estado actual como filas planas (una por dispositivo y sensor).
+
+        Returns:
+            list: Dicts con device, sensor, n, last, mean, std, slope, z, updated.
+        """
+        with self._lock:
+            devices = self._devices if devices is None else [d for d in devices if d in self._index]
+            rows = []
+            for device in devices:
+                r = self._index[device]
+                updated = datetime.fromtimestamp(self.last_t[r]) if not np.isnan(self.last_t[r]) else None
+                for c, sensor in enumerate(self.sensors):
+                    if self.n[r, c] == 0:
+                        continue
+                    rows.append({
+                        "device": device,
+                        "sensor": sensor,
+                        "n": int(self.n[r, c]),
+                        "last": float(self.last[r, c]),
+                        "mean": float(self.mean[r, c]),
+                        "std": float(np.sqrt(self.var[r, c])),
+                        "slope": float(self.slope[r, c]),
+                        "z": float(self.z[r, c]),
+                        "updated": updated,
+                    })
+            return rows
+
+    # -------------------------------------------------------------- publicación
+
+    def publish(self, engine):
+        """
+        Escribe en sensor_stats los dispositivos que cambiaron desde la última vez.
+
+        Args:
+            engine: Engine, o ShardRouter para escribir cada dispositivo en el shard de su granja.
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        rows = self.snapshot(dirty)
+        if not rows:
+            return 0
+        try:
+            for shard, shard_rows in split_rows(engine, rows, lambda row: row["device"]):
+                with shard.begin() as conn:
+                    conn.execute(text(CREATE_TABLE_SQL))
+                    conn.execute(text(UPSERT_SQL), shard_rows)
+        except Exception:
+            with self._lock:
+                self._dirty |= dirty
+            raise
+        return len(rows)
+
+    def start_publisher(self, engine, interval=PUBLISH_INTERVAL):
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.publish(engine)
+                except Exception as e:
+                    print(f"No se pudieron publicar las estadísticas: {e}")
+
+        if self._publisher is None:
+            self._publisher = threading.Thread(target=loop, daemon=True)
+            self._publisher.start()
+        return self
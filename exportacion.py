@@ -0,0 +1,222 @@
+"""
+Exportación en streaming de lecturas de sensors3.
+
+Las filas se leen con un cursor del lado del servidor (stream_results) en
+bloques de `chunk_size`, y cada bloque se convierte a bytes en cuanto llega:
+la memoria usada no depende del rango exportado y los primeros bytes salen
+antes de terminar la consulta.
+
+Formatos: csv, ndjson y parquet (este último requiere pyarrow).
+
+Uso como CLI:
+    python exportacion.py --devices ESP1,ESP2 --start 2024-05-01 --end 2024-06-01 \\
+        --format parquet --output mayo.parquet
+
+El mismo generador lo usa el endpoint GET /api/export de main.py.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, text
+
+from almacenamiento import engine_for_farm, farms, get_engine
+
+EXPORT_COLUMNS = ("id", "device", "ip", "lux", "nh3", "hs", "h", "t", "time")
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def parse_time(value):
+    """
+    Convierte un límite del rango (ISO 8601) en datetime sin zona, en UTC como la columna time.
+
+    Raises:
+        ValueError: Si el texto no es una fecha u hora ISO 8601.
+    """
+    try:
+        when = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Fecha inválida: {value!r} (use ISO 8601, p. ej. 2024-05-01T10:00)")
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+
+def check_format(fmt):
+    """
+    Verifica que el formato exista y que sus dependencias estén instaladas.
+
+    Se llama antes de empezar a responder: dentro del generador, el error
+    llegaría cuando las cabeceras ya salieron.
+
+    Raises:
+        ValueError: Formato desconocido.
+        RuntimeError: Falta pyarrow para parquet.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt} (use {', '.join(FORMATS)})")
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise RuntimeError("La exportación a parquet requiere pyarrow (pip install pyarrow)")
+
+
+def build_query(devices=None, start=None, end=None):
+    """Consulta de exportación con los filtros pedidos, ordenada por (time, id)."""
+    where, params = [], {}
+    if devices:
+        where.append("device IN :devices")
+        params["devices"] = list(devices)
+    if start:
+        where.append("time >= :start")
+        params["start"] = start
+    if end:
+        where.append("time < :end")
+        params["end"] = end
+    sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM sensors3"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY time, id"
+    query = text(sql)
+    if devices:
+        query = query.bindparams(bindparam("devices", expanding=True))
+    return query, params
+
+
+def iter_chunks(engine, devices=None, start=None, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Recorre las filas en bloques usando un cursor del lado del servidor.
+
+    Yields:
+        list: Tuplas con las columnas de EXPORT_COLUMNS, hasta chunk_size por bloque.
+    """
+    query, params = build_query(devices, start, end)
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query, params)
+        for partition in result.partitions(chunk_size):
+            yield [tuple(row) for row in partition]
+
+
+def _csv_chunks(chunks):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buf.getvalue().encode()
+    for rows in chunks:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(rows)
+        yield buf.getvalue().encode()
+
+
+def _ndjson_chunks(chunks):
+    for rows in chunks:
+        lines = [json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) for row in rows]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+class _ByteSink(io.RawIOBase):
+    # Archivo de solo escritura que acumula bytes para entregarlos por bloques
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet_chunks(chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("device", pa.string()),
+        ("ip", pa.string()),
+        ("lux", pa.float64()),
+        ("nh3", pa.float64()),
+        ("hs", pa.float64()),
+        ("h", pa.float64()),
+        ("t", pa.float64()),
+        ("time", pa.timestamp("us")),
+    ])
+    sink = _ByteSink()
+    # Cada bloque se escribe como un row group y se entrega en cuanto está listo
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            table = pa.Table.from_arrays(
+                # Inferir y luego convertir: el driver puede entregar time como texto
+                [pa.array(col).cast(field.type) for col, field in zip(columns, schema)],
+                schema=schema,
+            )
+            writer.write_table(table)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def export_stream(engine, fmt="csv", devices=None, start=None, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Genera el archivo de exportación por bloques de bytes.
+
+    Args:
+        engine: Engine de SQLAlchemy.
+        fmt (str): "csv", "ndjson" o "parquet".
+        devices (list): Dispositivos a exportar (todos si es None).
+        start, end (datetime): Rango de tiempo [start, end); ver parse_time().
+        chunk_size (int): Filas por bloque leído de la base de datos.
+
+    Yields:
+        bytes: Partes consecutivas del archivo.
+    """
+    check_format(fmt)
+    chunks = iter_chunks(engine, devices, start, end, chunk_size)
+    encoder = {"csv": _csv_chunks, "ndjson": _ndjson_chunks, "parquet": _parquet_chunks}[fmt]
+    for data in encoder(chunks):
+        if data:
+            yield data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta lecturas de sensors3 en streaming.")
+    parser.add_argument("--devices", help="Dispositivos separados por comas (por defecto todos)")
+    parser.add_argument("--start", type=parse_time, help="Inicio del rango (incluido), p. ej. 2024-05-01")
+    parser.add_argument("--end", type=parse_time, help="Fin del rango (excluido)")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--output", help="Archivo de salida (por defecto, salida estándar)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--database-url", help="URL de SQLAlchemy (por defecto, la del entorno; ver almacenamiento.py)")
+    parser.add_argument("--granja", choices=sorted(farms()), help="Granja cuyo shard se usa (ver GRANJAS_CONFIG en almacenamiento.py)")
+    args = parser.parse_args(argv)
+
+    engine = engine_for_farm(args.granja) if args.granja else get_engine(args.database_url)
+    devices = [d.strip() for d in args.devices.split(",")] if args.devices else None
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for data in export_stream(engine, args.format, devices, args.start, args.end, args.chunk_size):
+            out.write(data)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
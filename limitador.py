@@ -0,0 +1,125 @@
+"""
+Control de admisión para la API HTTP de ingesta.
+
+* RateLimiter: un token bucket por clave (dispositivo o IP). Cada clave acumula
+  hasta `burst` fichas que se reponen a `rate` por segundo; cada petición gasta
+  una. Si no quedan, la petición se rechaza y se informa cuánto esperar.
+* ConcurrencyLimit: tope de peticiones que están usando la base de datos a la
+  vez. Se ajusta al tamaño del pool de conexiones, así una petición nunca queda
+  esperando una conexión: si no hay lugar se rechaza de inmediato. Solo es
+  exacto si ese pool es exclusivo de lo que se limita (ver `pool` en
+  almacenamiento.get_engine).
+
+Ambos responden en O(1) y sin esperar, para que un ESP que inunda la API reciba
+un 429 rápido en lugar de ocupar conexiones de los que se portan bien.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_KEYS = 10_000
+
+
+class RateLimiter:
+    """
+    Token buckets por clave con memoria acotada.
+
+    Args:
+        rate (float): Fichas repuestas por segundo (peticiones sostenidas).
+        burst (int): Capacidad del bucket (ráfaga permitida).
+        max_keys (int): Claves recordadas; al superarlo se olvidan las menos usadas.
+    """
+
+    def __init__(self, rate, burst, max_keys=DEFAULT_MAX_KEYS):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _refill(self, key, now):
+        # Llamar con self._lock tomado; devuelve el bucket de la clave ya repuesto
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            # Clave nueva: empieza con el bucket lleno
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            tokens, last = bucket
+            bucket[0] = min(self.burst, tokens + (now - last) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def _wait(self, bucket):
+        return (1 - bucket[0]) / self.rate if self.rate > 0 else float("inf")
+
+    def acquire(self, key, now=None):
+        """
+        Intenta gastar una ficha de la clave.
+
+        Returns:
+            float: 0 si la petición se admite; si no, segundos hasta la próxima ficha.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._refill(key, now)
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            self.rejected += 1
+            return self._wait(bucket)
+
+    def acquire_all(self, keys, now=None):
+        """
+        Gasta una ficha de cada clave, o de ninguna si a alguna le falta.
+
+        Así una petición rechazada por una clave no consume las fichas de las
+        demás (un lote de varios dispositivos rechazado no los castiga).
+
+        Returns:
+            tuple: (0, None) si se admite; si no, (segundos hasta poder admitirla,
+                clave sin fichas).
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            buckets = [(key, self._refill(key, now)) for key in dict.fromkeys(keys)]
+            missing = [(self._wait(bucket), key) for key, bucket in buckets if bucket[0] < 1]
+            if missing:
+                self.rejected += 1
+                return max(missing)
+            for _, bucket in buckets:
+                bucket[0] -= 1
+            return 0.0, None
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class ConcurrencyLimit:
+    """
+    Tope de peticiones simultáneas que no espera: o hay lugar o se rechaza.
+
+    Args:
+        limit (int): Peticiones simultáneas admitidas.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def try_acquire(self):
+        with self._lock:
+            if self.active >= self.limit:
+                self.rejected += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
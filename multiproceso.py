@@ -0,0 +1,204 @@
+"""
+Ingesta de sockets en varios procesos.
+
+Cada worker es un proceso con su propio intérprete (y su propio GIL) que corre
+el bucle de ingesta y escribe a la base de datos por su cuenta. El puerto se
+comparte de una de dos formas:
+
+* SO_REUSEPORT (Linux, BSD): cada worker abre su propio socket en el mismo
+  puerto y el kernel reparte las conexiones entre ellos.
+* pre-fork: el supervisor abre un único socket de escucha y los workers lo
+  heredan; todos hacen accept() sobre él.
+
+El supervisor reinicia los workers que mueren y agrega sus contadores, que se
+guardan en memoria compartida.
+
+El kernel reparte las conexiones sin saber de qué dispositivo son, así que el
+estado por dispositivo (estadísticas, alertas) no puede vivir en cada worker.
+Con `aggregator`, los workers envían sus eventos a una cola (stats.events) y un
+proceso agregador propio los procesa todos en un solo lugar. No es un hilo del
+supervisor: el supervisor hace fork de cada worker que reinicia, y un hilo suyo
+con conexiones a la base abiertas (o con un candado tomado en el momento del
+fork) las dejaría compartidas con el hijo.
+
+    Supervisor(worker_main, IP, PORT, workers=4, aggregator=agregar).run()
+
+`worker_main(listen_sock, stats)` y `aggregator(events)` deben ser funciones de
+nivel de módulo.
+"""
+import multiprocessing
+import os
+import socket
+import time
+
+STAT_FIELDS = ("conexiones", "lecturas", "duplicados", "errores")
+RESTART_BACKOFF = 1.0      # espera inicial antes de reiniciar un worker
+MAX_RESTART_BACKOFF = 30.0
+STABLE_UPTIME = 300.0      # segundos vivo tras los que un worker deja de contar como inestable
+
+
+def reuse_port_available():
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def listen_socket(ip, port, reuse_port=False, backlog=128):
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    s.bind((ip, port))
+    s.listen(backlog)
+    return s
+
+
+class WorkerStats:
+    """
+    Contadores de un worker en un arreglo compartido con el supervisor.
+
+    `events` es la cola hacia el agregador del supervisor (None si no hay).
+    """
+
+    def __init__(self, counters, index, events=None):
+        self._counters = counters
+        self._base = index * len(STAT_FIELDS)
+        self.index = index
+        self.events = events
+
+    def incr(self, field, n=1):
+        i = self._base + STAT_FIELDS.index(field)
+        with self._counters.get_lock():
+            self._counters[i] += n
+
+
+def _run_worker(worker_main, index, ip, port, shared_sock, counters, events):
+    sock = shared_sock if shared_sock is not None else listen_socket(ip, port, reuse_port=True)
+    print(f"Worker {index} (pid {os.getpid()}) escuchando en {ip}:{port}")
+    worker_main(sock, WorkerStats(counters, index, events))
+
+
+class Supervisor:
+    """
+    Lanza N workers de ingesta, los reinicia si fallan y agrega sus estadísticas.
+
+    Args:
+        worker_main (callable): Bucle de ingesta, recibe (socket de escucha, WorkerStats).
+        ip (str): Dirección de escucha.
+        port (int): Puerto compartido por todos los workers.
+        workers (int): Número de procesos (por defecto, uno por núcleo).
+        reuse_port (bool): Usar SO_REUSEPORT; si es None se usa cuando está disponible.
+        stats_interval (float): Segundos entre reportes de estadísticas.
+        aggregator (callable): Si se indica, corre en su propio proceso (reiniciado
+            si muere) y recibe la cola donde los workers publican sus eventos.
+    """
+
+    def __init__(self, worker_main, ip, port, workers=None, reuse_port=None, stats_interval=30.0,
+                 aggregator=None):
+        self.worker_main = worker_main
+        self.ip = ip
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.reuse_port = reuse_port_available() if reuse_port is None else reuse_port
+        self.stats_interval = stats_interval
+        self._ctx = multiprocessing.get_context(
+            "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        )
+        self._counters = self._ctx.Array("Q", self.workers * len(STAT_FIELDS))
+        self.aggregator = aggregator
+        self._events = self._ctx.Queue() if aggregator else None
+        self._aggregator_proc = None
+        self._procs = [None] * self.workers
+        self._restarts = [0] * self.workers
+        self._failures = [0] * self.workers      # caídas seguidas, para la espera
+        self._started = [0.0] * self.workers
+        self._next_start = [0.0] * self.workers
+        self._shared_sock = None
+        self._running = False
+
+    def _spawn(self, index):
+        p = self._ctx.Process(
+            target=_run_worker,
+            args=(self.worker_main, index, self.ip, self.port, self._shared_sock, self._counters, self._events),
+            name=f"ingesta-{index}",
+            daemon=True,
+        )
+        p.start()
+        self._procs[index] = p
+        self._started[index] = time.monotonic()
+
+    def _spawn_aggregator(self):
+        self._aggregator_proc = self._ctx.Process(
+            target=self.aggregator, args=(self._events,), name="agregador", daemon=True
+        )
+        self._aggregator_proc.start()
+
+    def stats(self):
+        """
+        Devuelve los contadores agregados y por worker.
+
+        Returns:
+            dict: {"total": {...}, "workers": [{...}, ...]}
+        """
+        with self._counters.get_lock():
+            values = list(self._counters)
+        n = len(STAT_FIELDS)
+        per_worker = []
+        for i in range(self.workers):
+            row = dict(zip(STAT_FIELDS, values[i * n:(i + 1) * n]))
+            row["reinicios"] = self._restarts[i]
+            row["vivo"] = bool(self._procs[i] and self._procs[i].is_alive())
+            per_worker.append(row)
+        total = {field: sum(w[field] for w in per_worker) for field in STAT_FIELDS + ("reinicios",)}
+        return {"total": total, "workers": per_worker}
+
+    def _check_workers(self):
+        now = time.monotonic()
+        if self.aggregator and not self._aggregator_proc.is_alive():
+            # Sin agregador los eventos se acumulan en la cola: se relanza enseguida
+            # (su estado en memoria se pierde, el publicado en la base no)
+            print(f"Agregador terminó (código {self._aggregator_proc.exitcode}), reiniciando")
+            self._spawn_aggregator()
+        for i, p in enumerate(self._procs):
+            if p is not None and p.is_alive():
+                if self._failures[i] and now - self._started[i] >= STABLE_UPTIME:
+                    # Estable otra vez: la próxima caída vuelve a la espera inicial
+                    self._failures[i] = 0
+                continue
+            if p is not None:
+                # Worker caído: reiniciar con espera creciente si falla seguido
+                print(f"Worker {i} terminó (código {p.exitcode}), reiniciando")
+                self._restarts[i] += 1
+                self._failures[i] += 1
+                backoff = min(RESTART_BACKOFF * 2 ** (self._failures[i] - 1), MAX_RESTART_BACKOFF)
+                self._next_start[i] = now + backoff
+                self._procs[i] = None
+            if now >= self._next_start[i]:
+                self._spawn(i)
+
+    def run(self):
+        if not self.reuse_port:
+            self._shared_sock = listen_socket(self.ip, self.port)
+        mode = "SO_REUSEPORT" if self.reuse_port else "pre-fork"
+        print(f"Supervisor: {self.workers} workers ({mode}) en {self.ip}:{self.port}")
+        if self.aggregator:
+            self._spawn_aggregator()
+        last_report = time.monotonic()
+        self._running = True
+        try:
+            while self._running:
+                self._check_workers()
+                time.sleep(1.0)
+                if time.monotonic() - last_report >= self.stats_interval:
+                    last_report = time.monotonic()
+                    print(f"Estadísticas de ingesta: {self.stats()['total']}")
+        except KeyboardInterrupt:
+            print("Supervisor detenido")
+        finally:
+            for p in self._procs + [self._aggregator_proc]:
+                if p is not None and p.is_alive():
+                    p.terminate()
+            if self._shared_sock is not None:
+                self._shared_sock.close()
+
+    def stop(self):
+        """Termina run() (desde otro hilo) y con él los workers."""
+        self._running = False
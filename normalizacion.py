@@ -0,0 +1,122 @@
+"""
+Normalización de lecturas en la ingesta por sockets.
+
+Cada mensaje llega como dict con claves legadas (Device, IP, LUX, NH3, HS, H, T
+y opcionalmente seq y ts). normalize_reading lo valida, renombra y le pone
+hora en una sola pasada y devuelve una tupla con las columnas de sensors3, sin
+crear objetos de pandas por mensaje. El DataFrame se arma recién al escribir un
+lote (to_frame), una vez por lote y no por lectura.
+
+    fila = normalize_reading({"Device": "ESP1", "LUX": 120, ...})
+    fila.device, fila.lux, fila.time
+    to_frame([fila, ...]).to_sql("sensors3", ...)
+
+Las reglas de valores y de hora son las mismas para las dos ingestas (sockets y
+la API HTTP, ver codificacion.py), que escriben las mismas filas y comparten el
+índice único (device, time): los sensores deben ser números finitos (no texto
+ni booleanos) y time se guarda en UTC sin zona.
+
+Ver bench_normalizacion.py para el costo por lectura.
+"""
+import math
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import pandas as pd
+
+# Columnas de sensors3 en el orden de la tupla, y su clave en el JSON legado
+COLUMNS = ("device", "ip", "lux", "nh3", "hs", "h", "t", "time")
+SENSOR_KEYS = (("lux", "LUX"), ("nh3", "NH3"), ("hs", "HS"), ("h", "H"), ("t", "T"))
+
+Lectura = namedtuple("Lectura", COLUMNS)
+
+
+class NormalizationError(ValueError):
+    """Lectura sin dispositivo o con valores que no son números."""
+
+
+def utc_now():
+    """Hora actual en UTC sin zona, la convención de sensors3.time."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_utc(when):
+    """Pasa una hora con zona a UTC sin zona; una sin zona ya se asume UTC."""
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+
+def from_epoch(ts):
+    """
+    Hora UTC sin zona de un epoch (segundos) del dispositivo.
+
+    Raises:
+        NormalizationError: Si no es un número o está fuera de rango.
+    """
+    # bool es int en Python, pero un ts verdadero/falso no es una hora
+    if isinstance(ts, bool) or not isinstance(ts, (int, float)):
+        raise NormalizationError(f"ts inválido: {ts!r}")
+    try:
+        return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+    except (ValueError, OverflowError, OSError):
+        raise NormalizationError(f"ts fuera de rango: {ts!r}")
+
+
+def sensor_value(value, name):
+    """
+    Valor de un sensor como float, igual que las columnas DOUBLE PRECISION.
+
+    Raises:
+        NormalizationError: Si no es un número finito (texto, booleano, nan, inf).
+    """
+    # bool es subclase de int: True no es una lectura válida
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise NormalizationError(f"Valor inválido en {name}: {value!r}")
+    return float(value)
+
+
+def normalize_reading(j, now=None):
+    """
+    Convierte una lectura legada en una fila de sensors3.
+
+    Args:
+        j (dict): Lectura con claves legadas (Device, IP, LUX, ...); se aceptan
+            también en minúsculas. Si trae ts (epoch del dispositivo) se usa
+            como hora de la lectura.
+        now (datetime): Hora a usar si la lectura no trae ts (por defecto,
+            utc_now()).
+
+    Returns:
+        Lectura: Tupla (device, ip, lux, nh3, hs, h, t, time) con valores float
+            y time datetime en UTC sin zona.
+    """
+    get = j.get
+    device = get("Device") or get("device")
+    if not device:
+        raise NormalizationError(f"Lectura sin dispositivo: {j!r}")
+    values = []
+    for name, key in SENSOR_KEYS:
+        value = get(key)
+        if value is None:
+            value = get(name)
+        values.append(sensor_value(value, f"{key} de {device}"))
+    ts = get("ts")
+    if ts:
+        try:
+            when = from_epoch(ts)
+        except NormalizationError as e:
+            raise NormalizationError(f"{e} en {device}")
+    else:
+        when = now or utc_now()
+    return Lectura(str(device), get("IP") or get("ip"), *values, when)
+
+
+def sensor_values(fila):
+    """Valores de los sensores de una fila, por nombre (para estadísticas y alertas)."""
+    return {name: value for (name, _), value in zip(SENSOR_KEYS, fila[2:7])}
+
+
+def to_frame(filas):
+    """DataFrame de un lote de filas normalizadas, listo para to_sql."""
+    return pd.DataFrame.from_records(filas, columns=COLUMNS)
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# Variables de entorno / parámetros de URL que activan el modo de depuración
+PROFILE_ENV = "DASHBOARD_PROFILE"
+PROFILE_LOG_ENV = "DASHBOARD_PROFILE_LOG"
+PROFILE_QUERY_PARAM = "profile"
+
+
+def profiling_enabled(query_params=None):
+    """
+    Indica si el perfilado por rerun está activo.
+
+    Se activa con la variable de entorno DASHBOARD_PROFILE=1 o con el
+    parámetro de URL ?profile=1.
+    """
+    if os.getenv(PROFILE_ENV, "").lower() in ("1", "true", "yes", "on"):
+        return True
+    if query_params is not None:
+        value = query_params.get(PROFILE_QUERY_PARAM)
+        if isinstance(value, list):
+            value = value[0] if value else None
+        return str(value).lower() in ("1", "true", "yes", "on")
+    return False
+
+
+class RerunProfiler:
+    """
+    Mide el tiempo de cada fase de un rerun del dashboard.
+
+    Las fases se anidan con `phase()` y se registran con nombres jerárquicos
+    ("dispositivos/ESP1/graficas"); una fase repetida dentro del mismo rerun
+    acumula su tiempo. Si el perfilador está desactivado, `phase()` no mide
+    nada y su costo es despreciable.
+    """
+
+    def __init__(self, enabled=False, log_path=None):
+        self.enabled = enabled
+        self.log_path = log_path
+        self._stack = []
+        self._timings = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        depth = len(self._stack)
+        self._stack.append(name)
+        # Registrar la fase al entrar para conservar el orden de inicio
+        entry = self._timings.setdefault("/".join(self._stack), [depth, 0.0])
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry[1] += time.perf_counter() - t0
+            self._stack.pop()
+
+    def total(self):
+        return time.perf_counter() - self._start
+
+    def report(self):
+        """
+        Devuelve las fases medidas en orden de inicio.
+
+        Returns:
+            list: Tuplas (nombre, profundidad, milisegundos).
+        """
+        return [(name, depth, elapsed * 1000) for name, (depth, elapsed) in self._timings.items()]
+
+    def write_log(self):
+        """Agrega el desglose del rerun como una línea JSON al archivo de log."""
+        if not self.enabled or not self.log_path:
+            return
+        record = {
+            "ts": time.time(),
+            "total_ms": round(self.total() * 1000, 3),
+            "phases": {name: round(ms, 3) for name, _, ms in self.report()},
+        }
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"No se pudo escribir el log de perfilado: {e}")
+
+    def render(self, container):
+        """Muestra el desglose del rerun en un contenedor de Streamlit (p. ej. la barra lateral)."""
+        if not self.enabled:
+            return
+        lines = [f"**Total rerun:** {self.total() * 1000:.1f} ms", ""]
+        for name, depth, ms in self.report():
+            indent = "&nbsp;" * 4 * depth
+            label = name.split("/")[-1]
+            lines.append(f"{indent}`{label}` — {ms:.1f} ms  ")
+        box = container.container()
+        box.markdown("### Perfilado del rerun ⏱️")
+        box.markdown("\n".join(lines), unsafe_allow_html=True)
+
+
+def profiler_from_env(query_params=None):
+    """Crea un RerunProfiler configurado desde el entorno y los parámetros de URL."""
+    return RerunProfiler(
+        enabled=profiling_enabled(query_params),
+        log_path=os.getenv(PROFILE_LOG_ENV),
+    )
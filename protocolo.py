@@ -0,0 +1,251 @@
+"""
+Protocolo de cable entre los módulos ESP y el servidor de sockets.
+
+Se aceptan dos formatos en la misma conexión:
+
+* JSON legado: un objeto {"Device": ..., "IP": ..., "LUX": ..., ...}. Se lee
+  hasta tener un objeto completo aunque llegue partido en varios segmentos TCP.
+* Binario con marco de longitud: cabecera fija seguida de una o varias
+  lecturas de ancho fijo.
+
+Cabecera (8 bytes, big-endian):
+    magic   2s   b"GS"
+    version B    PROTOCOL_VERSION
+    tipo    B    MSG_READINGS
+    largo   I    bytes del cuerpo que siguen
+
+Cuerpo de MSG_READINGS:
+    count   H    número de lecturas
+    count x lectura (48 bytes):
+        device  16s  identificador ASCII, relleno con \\x00
+        ip      4s   IPv4 empaquetada (0.0.0.0 si se desconoce)
+        seq     I    número de secuencia del dispositivo (0 si no se usa)
+        ts      I    marca de tiempo epoch del dispositivo (0 = la pone el servidor)
+        lux, nh3, hs, h, t   5 x i   valores en centésimas (valor * 100)
+
+Una lectura que no entra en el formato (ID de más de 16 bytes ASCII, valores
+fuera de rango) no se codifica: ProtocolError. Nunca se trunca, porque dos IDs
+con el mismo prefijo terminarían siendo el mismo dispositivo. Esos dispositivos
+deben usar el JSON legado.
+"""
+import json
+import socket
+import struct
+
+MAGIC = b"GS"
+PROTOCOL_VERSION = 1
+MSG_READINGS = 1
+
+HEADER = struct.Struct("!2sBBI")
+COUNT = struct.Struct("!H")
+READING = struct.Struct("!16s4sIIiiiii")
+
+# Límites para no aceptar marcos absurdos de un cliente defectuoso
+MAX_FRAME_BYTES = COUNT.size + 1024 * READING.size
+MAX_JSON_BYTES = 65536
+
+SENSOR_KEYS = ("LUX", "NH3", "HS", "H", "T")
+SCALE = 100
+DEVICE_BYTES = 16
+UINT32_MAX = 2 ** 32 - 1
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+class ProtocolError(ValueError):
+    """Mensaje mal formado o con versión no soportada."""
+
+
+def recv_exact(sock, n):
+    """Lee exactamente n bytes del socket o lanza ProtocolError si se cierra antes."""
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ProtocolError(f"Conexión cerrada tras {len(buf)} de {n} bytes")
+        buf += chunk
+    return bytes(buf)
+
+
+# |||||||||||||||||||||-----Codificación------||||||||||||||||||||||||||||||
+
+def _check_range(name, value, low, high, device):
+    if not low <= value <= high:
+        raise ProtocolError(f"{name}={value} de {device} fuera del rango del protocolo [{low}, {high}]")
+    return value
+
+
+def _pack_reading(reading):
+    device_id = str(reading["Device"])
+    try:
+        device = device_id.encode("ascii")
+    except UnicodeEncodeError:
+        raise ProtocolError(f"ID de dispositivo no ASCII: {device_id!r}")
+    if not device or len(device) > DEVICE_BYTES:
+        raise ProtocolError(f"ID de dispositivo de {len(device)} bytes (1 a {DEVICE_BYTES}): {device_id!r}")
+    try:
+        ip = socket.inet_aton(reading.get("IP") or "0.0.0.0")
+    except OSError:
+        ip = b"\x00\x00\x00\x00"
+    values = []
+    for key in SENSOR_KEYS:
+        try:
+            value = int(round(float(reading[key]) * SCALE))
+        except (TypeError, ValueError, OverflowError):
+            raise ProtocolError(f"Valor inválido en {key} de {device_id}: {reading[key]!r}")
+        values.append(_check_range(key, value, INT32_MIN, INT32_MAX, device_id))
+    seq = _check_range("seq", int(reading.get("seq", 0)), 0, UINT32_MAX, device_id)
+    ts = _check_range("ts", int(reading.get("ts", 0)), 0, UINT32_MAX, device_id)
+    return READING.pack(device, ip, seq, ts, *values)
+
+
+def encode_readings(readings):
+    """
+    Codifica una o varias lecturas (dicts con claves legadas) en un marco binario.
+
+    Args:
+        readings (list): Lecturas con claves Device, IP, LUX, NH3, HS, H, T y
+            opcionalmente seq y ts.
+
+    Returns:
+        bytes: Marco listo para enviar con sendall().
+    """
+    body = COUNT.pack(len(readings)) + b"".join(_pack_reading(r) for r in readings)
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, MSG_READINGS, len(body)) + body
+
+
+def encode_json(reading):
+    """Codificación legada: un objeto JSON por conexión."""
+    return json.dumps(reading).encode()
+
+
+# |||||||||||||||||||||-----Decodificación------||||||||||||||||||||||||||||||
+
+def decode_body(body):
+    """Decodifica el cuerpo de un marco MSG_READINGS a una lista de dicts legados."""
+    if len(body) < COUNT.size:
+        raise ProtocolError("Cuerpo vacío")
+    (count,) = COUNT.unpack_from(body, 0)
+    if len(body) != COUNT.size + count * READING.size:
+        raise ProtocolError(f"Largo {len(body)} no corresponde a {count} lecturas")
+    readings = []
+    for fields in READING.iter_unpack(body[COUNT.size:]):
+        device, ip, seq, ts = fields[:4]
+        reading = {
+            "Device": device.rstrip(b"\x00").decode("ascii"),
+            "IP": socket.inet_ntoa(ip),
+        }
+        for key, value in zip(SENSOR_KEYS, fields[4:]):
+            reading[key] = value / SCALE
+        if seq:
+            reading["seq"] = seq
+        if ts:
+            reading["ts"] = ts
+        readings.append(reading)
+    return readings
+
+
+def _check_header(header):
+    """Valida la cabecera de un marco y devuelve el largo del cuerpo."""
+    magic, version, msg_type, length = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ProtocolError(f"Magic inválido {magic!r}")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Versión de protocolo no soportada: {version}")
+    if msg_type != MSG_READINGS:
+        raise ProtocolError(f"Tipo de mensaje desconocido: {msg_type}")
+    if length > MAX_FRAME_BYTES:
+        raise ProtocolError(f"Marco demasiado grande: {length} bytes")
+    return length
+
+
+def _read_frame(sock, first):
+    length = _check_header(first + recv_exact(sock, HEADER.size - len(first)))
+    return decode_body(recv_exact(sock, length))
+
+
+def _json_reading(obj):
+    # El formato legado es un objeto por mensaje; otro valor JSON no es una lectura
+    if not isinstance(obj, dict):
+        raise ProtocolError(f"Se esperaba un objeto JSON, llegó {type(obj).__name__}")
+    return [obj]
+
+
+def _read_json(sock, first):
+    # Acumular segmentos hasta que el objeto JSON esté completo
+    buf = bytearray(first)
+    decoder = json.JSONDecoder()
+    while True:
+        try:
+            obj, _ = decoder.raw_decode(buf.decode().lstrip())
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            if len(buf) > MAX_JSON_BYTES:
+                raise ProtocolError("Mensaje JSON demasiado grande")
+        else:
+            return _json_reading(obj)
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ProtocolError(f"JSON incompleto: {bytes(buf[:64])!r}")
+        buf += chunk
+
+
+def parse_message(buf):
+    """
+    Extrae un mensaje completo del inicio de un buffer, sin bloquear.
+
+    Para lectores no bloqueantes (sesiones.py), que acumulan lo recibido de
+    cada conexión y solo procesan mensajes completos.
+
+    Args:
+        buf (bytes): Datos recibidos y aún no consumidos.
+
+    Returns:
+        tuple: (lecturas, bytes consumidos), o (None, 0) si el mensaje todavía
+            no llegó completo.
+
+    Raises:
+        ProtocolError: Si el mensaje está mal formado (incluido un JSON que no
+            es un objeto).
+    """
+    if not buf:
+        return None, 0
+    if buf[:1] == MAGIC[:1]:
+        if len(buf) < HEADER.size:
+            return None, 0
+        end = HEADER.size + _check_header(bytes(buf[:HEADER.size]))
+        if len(buf) < end:
+            return None, 0
+        return decode_body(bytes(buf[HEADER.size:end])), end
+    try:
+        text = bytes(buf).decode()
+    except UnicodeDecodeError:
+        text = None   # puede ser un carácter partido entre segmentos
+    if text is not None:
+        stripped = text.lstrip()
+        if not stripped:
+            return [], len(buf)   # solo espacios entre mensajes
+        try:
+            obj, end = json.JSONDecoder().raw_decode(stripped)
+        except json.JSONDecodeError:
+            pass
+        else:
+            consumed = len(text) - len(stripped) + end
+            return _json_reading(obj), len(text[:consumed].encode())
+    if len(buf) > MAX_JSON_BYTES:
+        raise ProtocolError("Mensaje JSON demasiado grande")
+    return None, 0
+
+
+def read_readings(sock):
+    """
+    Lee un mensaje del socket, en cualquiera de los dos formatos.
+
+    Returns:
+        list: Lecturas con claves legadas (Device, IP, LUX, ...). Lista vacía si
+            el cliente cerró la conexión sin enviar nada.
+    """
+    first = sock.recv(2)
+    if not first:
+        return []
+    if first[:1] == MAGIC[:1]:
+        return _read_frame(sock, first)
+    return _read_json(sock, first)
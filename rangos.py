@@ -0,0 +1,33 @@
+# Configuración de rangos óptimos para sensores de galpón avícola
+SENSOR_RANGES = {
+    'lux': {
+        'optimal_min': 10,
+        'optimal_max': 300,
+        'unit': 'lux',
+        'description': 'Iluminación para bienestar animal. Rango óptimo entre 10-100 lux.'
+    },
+    'nh3': {
+        'optimal_min': 0,
+        'optimal_max': 250,
+        'unit': 'ppm',
+        'description': 'Nivel de amoniaco. Valores menores a 20 ppm son seguros para las aves.'
+    },
+    'hs': {
+        'optimal_min': 0,
+        'optimal_max': 100,
+        'unit': 'ppm',
+        'description': 'Sulfuro de hidrógeno. Niveles bajos (< 10 ppm) indican buena ventilación.'
+    },
+    'h': {
+        'optimal_min': 50,
+        'optimal_max': 100,
+        'unit': '%',
+        'description': 'Humedad relativa ideal para galpones. Entre 50-70% reduce estrés.'
+    },
+    't': {
+        'optimal_min': 18,
+        'optimal_max': 40,
+        'unit': '°C',
+        'description': 'Temperatura óptima para aves. Rango entre 18-24°C para máximo confort.'
+    }
+}
@@ -0,0 +1,256 @@
+"""
+Retención y compactación de lecturas crudas de sensors3.
+
+Las filas más antiguas que `--days` se resumen en la tabla sensors3_agregados
+(una fila por dispositivo e intervalo, con n, promedio, mínimo y máximo de cada
+sensor) y se borran de sensors3. Cada lote es una sola sentencia:
+
+    WITH borradas AS (DELETE ... LIMIT lote RETURNING ...)
+    INSERT INTO sensors3_agregados SELECT ... FROM borradas GROUP BY ...
+    ON CONFLICT DO UPDATE  -- combina con lo ya agregado del mismo intervalo
+
+así borrar y agregar es atómico (un corte a mitad no pierde ni cuenta dos veces
+una lectura), cada transacción toca pocas filas y la ingesta, que inserta
+lecturas nuevas, no queda bloqueada. Entre lotes se hace una pausa corta.
+
+En SQLite (que no admite DELETE dentro de un WITH) el lote son dos sentencias,
+INSERT ... SELECT y DELETE sobre las mismas filas, en una misma transacción.
+
+Uso:
+    python retencion.py --days 30 --dry-run     # informe, sin cambios
+    python retencion.py --days 30               # una pasada
+    python retencion.py --days 30 --every 3600  # programado, cada hora
+"""
+import argparse
+import os
+import time
+from datetime import timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from almacenamiento import (
+    BUCKET_SQL, SQLITE_BUCKET_SQL, engine_for_farm, farms, get_engine, is_sqlite,
+)
+from normalizacion import utc_now
+
+SENSORS = ("lux", "nh3", "hs", "h", "t")
+DEFAULT_DAYS = int(os.getenv("RETENTION_DAYS", 30))
+DEFAULT_INTERVAL = int(os.getenv("RETENTION_INTERVAL", 3600))   # segundos por agregado
+DEFAULT_BATCH = 5000
+DEFAULT_PAUSE = 0.5
+MAX_RETRIES = 5       # lotes seguidos cancelados por bloqueo antes de rendirse
+AGG_ROW_BYTES = 200   # tamaño aproximado de una fila de sensors3_agregados con su índice
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS sensors3_agregados (
+    device VARCHAR NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    segundos INTEGER NOT NULL,
+    n BIGINT NOT NULL,
+    {columns},
+    PRIMARY KEY (device, bucket)
+)
+""".format(columns=",\n    ".join(
+    f"{s}_avg DOUBLE PRECISION, {s}_min DOUBLE PRECISION, {s}_max DOUBLE PRECISION" for s in SENSORS
+))
+
+_AGG_COLUMNS = ", ".join(f"{s}_avg, {s}_min, {s}_max" for s in SENSORS)
+_AGG_VALUES = ", ".join(f"AVG({s}), MIN({s}), MAX({s})" for s in SENSORS)
+
+
+def _merge(least="LEAST", greatest="GREATEST"):
+    return ",\n    ".join(
+        f"{s}_avg = (a.{s}_avg * a.n + EXCLUDED.{s}_avg * EXCLUDED.n) / (a.n + EXCLUDED.n), "
+        f"{s}_min = {least}(a.{s}_min, EXCLUDED.{s}_min), "
+        f"{s}_max = {greatest}(a.{s}_max, EXCLUDED.{s}_max)"
+        for s in SENSORS
+    ) + ",\n    n = a.n + EXCLUDED.n"
+
+COMPACT_BATCH_SQL = f"""
+WITH borradas AS (
+    DELETE FROM sensors3
+    WHERE ctid = ANY(ARRAY(
+        SELECT ctid FROM sensors3 WHERE time < :cutoff ORDER BY time LIMIT :batch
+    ))
+    RETURNING device, time, {", ".join(SENSORS)}
+), agregadas AS (
+    INSERT INTO sensors3_agregados AS a (device, bucket, segundos, n, {_AGG_COLUMNS})
+    SELECT COALESCE(device, ''), {BUCKET_SQL}, :interval, COUNT(*), {_AGG_VALUES}
+    FROM borradas
+    GROUP BY 1, 2
+    ON CONFLICT (device, bucket) DO UPDATE SET
+    {_merge()}
+)
+SELECT COUNT(*) FROM borradas
+"""
+
+_SQLITE_BATCH = "SELECT rowid FROM sensors3 WHERE time < :cutoff ORDER BY time LIMIT :batch"
+
+SQLITE_COMPACT_SQL = (
+    f"""
+    INSERT INTO sensors3_agregados AS a (device, bucket, segundos, n, {_AGG_COLUMNS})
+    SELECT COALESCE(device, ''), {SQLITE_BUCKET_SQL}, :interval, COUNT(*), {_AGG_VALUES}
+    FROM sensors3
+    WHERE rowid IN ({_SQLITE_BATCH})
+    GROUP BY 1, 2
+    ON CONFLICT (device, bucket) DO UPDATE SET
+    {_merge("min", "max")}
+    """,
+    f"DELETE FROM sensors3 WHERE rowid IN ({_SQLITE_BATCH})",
+)
+
+DRY_RUN_SQL = """
+SELECT COUNT(*) AS filas,
+       COUNT(DISTINCT COALESCE(device, '') || '|' || {bucket}) AS agregados,
+       MIN(time) AS desde,
+       MAX(time) AS hasta
+FROM sensors3
+WHERE time < :cutoff
+"""
+
+TABLE_SIZE_SQL = """
+SELECT pg_total_relation_size('sensors3') AS bytes, GREATEST(reltuples, 1) AS filas
+FROM pg_class WHERE oid = 'sensors3'::regclass
+"""
+
+# En SQLite, tamaño del archivo completo repartido entre las filas de sensors3
+SQLITE_SIZE_SQL = """
+SELECT (SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()) AS bytes,
+       MAX((SELECT COUNT(*) FROM sensors3), 1) AS filas
+"""
+
+
+def _mb(n):
+    return f"{n / 1e6:,.1f} MB"
+
+
+def dry_run(engine, days=DEFAULT_DAYS, interval=DEFAULT_INTERVAL):
+    """
+    Informe de lo que haría una pasada, sin modificar nada.
+
+    Returns:
+        dict: filas a compactar, agregados a crear, rango de tiempo y bytes estimados.
+    """
+    cutoff = utc_now() - timedelta(days=days)
+    sqlite = is_sqlite(engine)
+    dry_run_sql = DRY_RUN_SQL.format(bucket=SQLITE_BUCKET_SQL if sqlite else f"({BUCKET_SQL})::text")
+    with engine.connect() as conn:
+        old = conn.execute(text(dry_run_sql), {"cutoff": cutoff, "interval": interval}).mappings().one()
+        size = conn.execute(text(SQLITE_SIZE_SQL if sqlite else TABLE_SIZE_SQL)).mappings().one()
+    bytes_per_row = size["bytes"] / size["filas"]
+    report = {
+        "cutoff": cutoff,
+        "filas": old["filas"],
+        "agregados": old["agregados"],
+        "desde": old["desde"],
+        "hasta": old["hasta"],
+        "bytes_tabla": size["bytes"],
+        "bytes_liberados": int(old["filas"] * bytes_per_row),
+        "bytes_agregados": old["agregados"] * AGG_ROW_BYTES,
+    }
+    print(f"Lecturas anteriores a {cutoff:%Y-%m-%d %H:%M}: {report['filas']:,} ({report['desde']} a {report['hasta']})")
+    print(f"Agregados de {interval} s a crear: {report['agregados']:,}")
+    print(f"sensors3 ocupa {_mb(report['bytes_tabla'])} (tabla + índices)")
+    print(f"Espacio liberado estimado: {_mb(report['bytes_liberados'])}, "
+          f"agregados: +{_mb(report['bytes_agregados'])}, "
+          f"neto: {_mb(report['bytes_liberados'] - report['bytes_agregados'])}")
+    if sqlite:
+        print("(el espacio se reutiliza dentro del archivo; solo VACUUM lo devuelve al sistema)")
+    else:
+        print("(el espacio se reutiliza tras VACUUM; solo VACUUM FULL lo devuelve al sistema)")
+    return report
+
+
+def _is_lock_timeout(error):
+    # Solo la espera de un bloqueo se arregla reintentando: lock_timeout y
+    # deadlock en PostgreSQL, base ocupada en SQLite
+    if not isinstance(error, OperationalError):
+        return False
+    message = str(error.orig)
+    return any(s in message for s in (
+        "55P03", "40P01", "lock timeout", "deadlock detected",
+        "database is locked", "database is busy",
+    ))
+
+
+def compact(engine, days=DEFAULT_DAYS, interval=DEFAULT_INTERVAL, batch=DEFAULT_BATCH,
+            pause=DEFAULT_PAUSE, lock_timeout="2s"):
+    """
+    Resume y borra las lecturas anteriores al corte, por lotes.
+
+    Args:
+        engine: Engine de SQLAlchemy.
+        days (int): Edad (en días) a partir de la cual se compacta.
+        interval (int): Segundos de cada agregado.
+        batch (int): Filas borradas por transacción.
+        pause (float): Segundos de espera entre lotes.
+        lock_timeout (str): Si un lote espera un bloqueo más que esto, se cancela y se reintenta
+            (hasta MAX_RETRIES veces seguidas).
+
+    Returns:
+        int: Lecturas compactadas.
+
+    Raises:
+        OperationalError: Si el bloqueo persiste tras MAX_RETRIES intentos.
+        Exception: Cualquier otro error del lote, sin reintentar.
+    """
+    cutoff = utc_now() - timedelta(days=days)
+    sqlite = is_sqlite(engine)
+    params = {"cutoff": cutoff, "batch": batch, "interval": interval}
+    with engine.begin() as conn:
+        conn.execute(text(CREATE_TABLE_SQL))
+    total = 0
+    retries = 0
+    while True:
+        try:
+            with engine.begin() as conn:
+                if sqlite:
+                    insert_sql, delete_sql = SQLITE_COMPACT_SQL
+                    conn.execute(text(insert_sql), params)
+                    n = conn.execute(text(delete_sql), params).rowcount
+                else:
+                    conn.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}'"))
+                    n = conn.execute(text(COMPACT_BATCH_SQL), params).scalar()
+        except OperationalError as e:
+            retries += 1
+            if not _is_lock_timeout(e) or retries > MAX_RETRIES:
+                raise
+            print(f"Lote de retención cancelado por bloqueo ({retries}/{MAX_RETRIES}), se reintenta: {e.orig}")
+            time.sleep(pause * 10)
+            continue
+        retries = 0
+        total += n
+        if n < batch:
+            break
+        time.sleep(pause)
+    print(f"Retención: {total:,} lecturas anteriores a {cutoff:%Y-%m-%d %H:%M} compactadas")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compacta las lecturas antiguas de sensors3.")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="Edad mínima (días) de las lecturas a compactar")
+    parser.add_argument("--interval", type=int, default=DEFAULT_INTERVAL, help="Segundos por agregado")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="Filas por transacción")
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE, help="Segundos entre lotes")
+    parser.add_argument("--dry-run", action="store_true", help="Solo informar, sin cambios")
+    parser.add_argument("--every", type=float, help="Repetir cada N segundos")
+    parser.add_argument("--database-url", help="URL de SQLAlchemy (por defecto, la del entorno; ver almacenamiento.py)")
+    parser.add_argument("--granja", choices=sorted(farms()), help="Granja cuyo shard se usa (ver GRANJAS_CONFIG en almacenamiento.py)")
+    args = parser.parse_args(argv)
+
+    engine = engine_for_farm(args.granja) if args.granja else get_engine(args.database_url)
+
+    if args.dry_run:
+        dry_run(engine, args.days, args.interval)
+        return
+    while True:
+        compact(engine, args.days, args.interval, args.batch, args.pause)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
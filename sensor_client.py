@@ -3,6 +3,11 @@ import json
 import time
 import random
 import sys
+import os
+import itertools
+import threading
+from collections import deque
+from protocolo import encode_readings
 
 # Server connection details
 SERVER_IP = "127.0.0.1"  # Same as your server IP
@@ -11,6 +16,23 @@ SERVER_PORT = 8889       # Same as your server PORT
 # Device information
 DEVICE_ID = "ESP32-Sensor1"  # You can change this or make it configurable
 
+# Wire protocol: "json" (legacy) or "binary" (length-prefixed frames, see protocolo.py)
+PROTOCOL = "binary" if "--binary" in sys.argv else os.getenv("SENSOR_PROTOCOL", "json")
+
+# Persistent session: keep the connection open and answer every server poll
+PERSISTENT = "--persistent" in sys.argv or os.getenv("SENSOR_PERSISTENT") == "1"
+
+# Offline buffering: readings are sampled on their own schedule and kept in a
+# bounded buffer until the server takes them (oldest dropped when full)
+BUFFER_SIZE = int(os.getenv("SENSOR_BUFFER_SIZE", 1000))
+BATCH_SIZE = min(int(os.getenv("SENSOR_BATCH_SIZE", 100)), 1024)  # 1024 = max readings per frame
+SAMPLE_INTERVAL = (5, 15)  # seconds between readings (random in this range)
+SEND_INTERVAL = float(os.getenv("SENSOR_SEND_INTERVAL", 60))  # binary: connect at most this often unless a batch is full
+
+# Reconnect backoff: exponential with full jitter, so devices do not all retry at once
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 300.0
+
 def generate_random_data():
     """Generate random sensor data"""
     return {
@@ -23,62 +45,145 @@ def generate_random_data():
         "T": round(random.uniform(18.0, 35.0), 2)
     }
 
-def connect_and_send_data():
-    """Connect to the server and send random sensor data"""
-    try:
-        # Create a socket object
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        
-        # Connect to the server
-        print(f"Connecting to server at {SERVER_IP}:{SERVER_PORT}...")
-        client_socket.connect((SERVER_IP, SERVER_PORT))
-        
+class ReadingBuffer:
+    """Bounded FIFO of readings waiting to be sent, safe to share between threads"""
+
+    def __init__(self, maxlen=BUFFER_SIZE):
+        self._readings = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, reading):
+        with self._lock:
+            if len(self._readings) == self._readings.maxlen:
+                self.dropped += 1
+            self._readings.append(reading)
+
+    def peek(self, n):
+        """Oldest n readings, left in the buffer until confirm()"""
+        with self._lock:
+            return list(itertools.islice(self._readings, n))
+
+    def confirm(self, sent):
+        """Remove the readings that were sent (unless already dropped for space)"""
+        with self._lock:
+            for reading in sent:
+                if self._readings and self._readings[0] is reading:
+                    self._readings.popleft()
+
+    def __len__(self):
+        return len(self._readings)
+
+def sample_forever(buffer):
+    """Take a reading every SAMPLE_INTERVAL seconds, stamped with the device time"""
+    while True:
+        sensor_data = generate_random_data()
+        sensor_data["ts"] = int(time.time())
+        buffer.put(sensor_data)
+        print(f"Buffered reading ({len(buffer)} pending, {buffer.dropped} dropped): {sensor_data}")
+        time.sleep(random.uniform(*SAMPLE_INTERVAL))
+
+def send_pending(client_socket, buffer):
+    """Send buffered readings: a batch per frame in binary, one object in legacy JSON"""
+    if PROTOCOL == "binary":
+        batch = buffer.peek(BATCH_SIZE)
+        if batch:
+            client_socket.sendall(encode_readings(batch))
+    else:
+        batch = buffer.peek(1)
+        if batch:
+            client_socket.sendall(json.dumps(batch[0]).encode())
+    buffer.confirm(batch)
+    print(f"Sent {len(batch)} readings ({len(buffer)} still pending)")
+    return len(batch)
+
+def connect_and_send_data(buffer):
+    """
+    Connect to the server and send one batch when it asks for data.
+
+    Returns the number of readings sent: 0 if the server closed the
+    connection (or sent something else) without asking for data.
+    """
+    with socket.create_connection((SERVER_IP, SERVER_PORT), timeout=30) as client_socket:
+        print(f"Connected to server at {SERVER_IP}:{SERVER_PORT}")
         # Wait for server request
         data = client_socket.recv(1024)
-        if data == b"a":
-            print("Received request from server")
-            
-            # Generate random sensor data
-            sensor_data = generate_random_data()
-            print(f"Generated sensor data: {sensor_data}")
-            
-            # Convert to JSON and send
-            json_data = json.dumps(sensor_data)
-            client_socket.sendall(json_data.encode())
-            print("Data sent successfully")
-            
-        # Close the connection
-        client_socket.close()
-        return True
-        
-    except ConnectionRefusedError:
-        print("Connection refused. Make sure the server is running.")
-        return False
-    except Exception as e:
-        print(f"Error: {e}")
+        if data != b"a":
+            print(f"No data request from server (got {data!r})")
+            return 0
+        print("Received request from server")
+        return send_pending(client_socket, buffer)
+
+def run_persistent_session(buffer):
+    """Keep one connection open and answer each server poll until it closes"""
+    with socket.create_connection((SERVER_IP, SERVER_PORT)) as client_socket:
+        print(f"Persistent session open with {SERVER_IP}:{SERVER_PORT}")
+        while True:
+            data = client_socket.recv(1)
+            if not data:
+                print("Server closed the session")
+                return
+            if data == b"a":
+                send_pending(client_socket, buffer)
+
+def should_send(buffer, last_send):
+    """Whether to open a connection now (one per batch, not one per reading)"""
+    if not len(buffer):
         return False
+    if PROTOCOL != "binary":
+        # Legacy JSON carries one reading per connection: drain as fast as the server allows
+        return True
+    return len(buffer) >= BATCH_SIZE or time.monotonic() - last_send >= SEND_INTERVAL
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter: uniform in [0, min(max, base * 2^attempt)]"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
 
 def main():
     """Main function to run the client"""
-    print("Sensor Client Started")
+    print(f"Sensor Client Started ({PROTOCOL} protocol, buffer {BUFFER_SIZE}, batch {BATCH_SIZE})")
     print("Press Ctrl+C to stop")
-    
+
+    if PROTOCOL == "binary":
+        # Fail now, not on every send, if DEVICE_ID does not fit the binary frame
+        encode_readings([generate_random_data()])
+
+    buffer = ReadingBuffer()
+    threading.Thread(target=sample_forever, args=(buffer,), daemon=True).start()
+
+    attempt = 0
+    last_send = time.monotonic()
     try:
         while True:
-            success = connect_and_send_data()
-            if success:
-                # Wait before sending next data
-                wait_time = random.randint(5, 15)  # Random wait between 5-15 seconds
-                print(f"Waiting {wait_time} seconds before sending next data...")
-                time.sleep(wait_time)
-            else:
-                # If connection failed, wait a bit longer before retrying
-                print("Retrying in 10 seconds...")
-                time.sleep(10)
+            if not PERSISTENT and not should_send(buffer, last_send):
+                time.sleep(1)
+                continue
+            started = time.monotonic()
+            try:
+                if PERSISTENT:
+                    run_persistent_session(buffer)
+                elif connect_and_send_data(buffer):
+                    last_send = time.monotonic()
+                    attempt = 0
+                    continue
+                # Session ended, or accepted but never polled (server busy or shutting
+                # down): back off like any other failure, not in a tight reconnect loop
+            except ConnectionRefusedError:
+                print("Connection refused. Make sure the server is running.")
+            except OSError as e:
+                print(f"Error: {e}")
+            if time.monotonic() - started > BACKOFF_MAX:
+                # The session was healthy for a while: start the backoff over
+                attempt = 0
+            # Server unavailable, busy or restarting: readings stay buffered until the next try
+            delay = backoff_delay(attempt)
+            attempt += 1
+            print(f"Retrying in {delay:.1f} seconds ({len(buffer)} readings buffered)...")
+            time.sleep(delay)
     except KeyboardInterrupt:
         print("\nClient stopped by user")
     except Exception as e:
         print(f"Unexpected error: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
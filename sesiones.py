@@ -0,0 +1,281 @@
+"""
+Sesiones persistentes con los módulos ESP y sondeo programado por el servidor.
+
+En lugar de una conexión TCP por lectura, cada dispositivo mantiene abierta su
+conexión y el servidor le envía la petición (b"a") según un calendario. Las
+próximas peticiones se guardan en un heap ordenado por instante de vencimiento,
+con jitter para que cientos de módulos no se sondeen en el mismo instante.
+
+    server = SessionServer(on_readings=procesar, intervals=load_poll_config())
+    server.serve_forever(IP, PORT)
+
+Hilos:
+    * principal: acepta conexiones y registra sesiones.
+    * sondeo: saca del heap las sesiones vencidas y les envía la petición.
+    * lectura: espera con un selector a que algún dispositivo responda. Los
+      sockets no bloquean: lo recibido se acumula en un buffer por sesión y
+      solo se procesan mensajes completos (JSON legado o marco binario, ver
+      protocolo.py), así un dispositivo lento no frena la lectura de los demás.
+    * pool: ejecuta on_readings() para que las escrituras a la base de datos no
+      frenen la lectura ni el sondeo.
+"""
+import heapq
+import itertools
+import json
+import os
+import random
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from protocolo import parse_message
+
+POLL_REQUEST = b"a"
+DEFAULT_INTERVAL = 60.0   # segundos entre peticiones a un mismo dispositivo
+DEFAULT_JITTER = 0.1      # fracción del intervalo que se reparte al azar
+RESPONSE_TIMEOUT = 30.0   # tiempo máximo para responder a una petición
+READ_TIMEOUT = 5.0        # tiempo máximo para completar un mensaje ya iniciado
+RECV_BYTES = 65536
+
+
+def load_poll_config(path=None):
+    """
+    Carga los intervalos de sondeo por dispositivo.
+
+    El archivo (por defecto el indicado en POLL_CONFIG) es un JSON como
+    {"default": 60, "jitter": 0.1, "devices": {"ESP1": 30, "ESP2": 120}}.
+    Sin archivo se usa POLL_INTERVAL (o DEFAULT_INTERVAL) para todos.
+
+    Returns:
+        PollIntervals: Configuración de intervalos.
+    """
+    path = path or os.getenv("POLL_CONFIG")
+    config = {}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+    return PollIntervals(
+        default=float(config.get("default", os.getenv("POLL_INTERVAL", DEFAULT_INTERVAL))),
+        jitter=float(config.get("jitter", DEFAULT_JITTER)),
+        devices={k: float(v) for k, v in config.get("devices", {}).items()},
+    )
+
+
+class PollIntervals:
+    """Intervalo de sondeo por dispositivo, con jitter aleatorio."""
+
+    def __init__(self, default=DEFAULT_INTERVAL, jitter=DEFAULT_JITTER, devices=None):
+        self.default = default
+        self.jitter = jitter
+        self.devices = devices or {}
+
+    def interval(self, device):
+        return self.devices.get(device, self.default)
+
+    def next_delay(self, device):
+        interval = self.interval(device)
+        return interval + random.uniform(-self.jitter, self.jitter) * interval
+
+    def initial_delay(self, device=None):
+        # Repartir el primer sondeo para evitar ráfagas tras un reinicio
+        return random.uniform(0, self.jitter * self.interval(device))
+
+
+class DeviceSession:
+    """Conexión abierta con un dispositivo."""
+
+    def __init__(self, session_id, sock, address):
+        self.id = session_id
+        self.sock = sock
+        self.address = address
+        self.device = None          # se conoce con la primera lectura
+        self.pending_since = None   # instante de la petición sin respuesta
+        self.buffer = bytearray()   # bytes recibidos de un mensaje aún incompleto
+        self.partial_since = None   # instante en que empezó ese mensaje
+        self.token = 0              # invalida entradas anteriores del heap
+        self.last_reading = None
+        self.polls = 0
+        self.readings = 0
+
+    def __repr__(self):
+        return f"DeviceSession({self.device or '?'} @ {self.address[0]})"
+
+
+class SessionServer:
+    """
+    Servidor de sesiones persistentes con sondeo programado.
+
+    Args:
+        on_readings (callable): Recibe (session, lecturas) por cada respuesta.
+        intervals (PollIntervals): Intervalos por dispositivo.
+        workers (int): Hilos para ejecutar on_readings.
+    """
+
+    def __init__(self, on_readings, intervals=None, workers=8):
+        self.on_readings = on_readings
+        self.intervals = intervals or PollIntervals()
+        self.sessions = {}
+        self._heap = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._selector = selectors.DefaultSelector()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._running = False
+
+    # ---------------------------------------------------------------- sesiones
+
+    def add_session(self, sock, address):
+        sock.setblocking(False)
+        session = DeviceSession(next(self._ids), sock, address)
+        with self._lock:
+            self.sessions[session.id] = session
+            self._schedule(session, self.intervals.initial_delay())
+        self._selector.register(sock, selectors.EVENT_READ, session)
+        print(f"Sesión abierta {session}")
+        return session
+
+    def close_session(self, session, reason=""):
+        with self._lock:
+            if self.sessions.pop(session.id, None) is None:
+                return
+        try:
+            self._selector.unregister(session.sock)
+        except (KeyError, ValueError):
+            pass
+        session.sock.close()
+        print(f"Sesión cerrada {session} {reason}")
+
+    def _schedule(self, session, delay):
+        # Llamar con self._lock tomado. Reprogramar descarta la entrada previa.
+        session.token += 1
+        heapq.heappush(self._heap, (time.monotonic() + delay, session.id, session.token))
+        self._wakeup.notify()
+
+    # ------------------------------------------------------------------ sondeo
+
+    def _poll_loop(self):
+        while self._running:
+            with self._lock:
+                while self._running and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._wakeup.wait(timeout)
+                if not self._running:
+                    return
+                _, session_id, token = heapq.heappop(self._heap)
+                session = self.sessions.get(session_id)
+                if session is None or token != session.token:
+                    continue  # sesión cerrada o reprogramada: entrada obsoleta
+                now = time.monotonic()
+                stale = bool(session.pending_since) and now - session.pending_since > RESPONSE_TIMEOUT
+                waiting = bool(session.pending_since)
+                if not stale:
+                    self._schedule(session, self.intervals.next_delay(session.device))
+                    if not waiting:
+                        session.pending_since = now
+            if stale:
+                self.close_session(session, "(sin respuesta)")
+                continue
+            if waiting:
+                continue  # aún no responde la petición anterior
+            try:
+                session.sock.send(POLL_REQUEST)
+                session.polls += 1
+            except OSError as e:
+                self.close_session(session, f"({e})")
+
+    # ----------------------------------------------------------------- lectura
+
+    def _read_loop(self):
+        while self._running:
+            if not self._selector.get_map():
+                time.sleep(0.1)
+                continue
+            for key, _ in self._selector.select(timeout=1.0):
+                self._receive(key.data)
+            self._expire_partial()
+
+    def _receive(self, session):
+        # Lee lo disponible sin bloquear y procesa los mensajes ya completos
+        try:
+            data = session.sock.recv(RECV_BYTES)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self.close_session(session, f"({e})")
+            return
+        if not data:
+            self.close_session(session, "(cerrada por el dispositivo)")
+            return
+        if not session.buffer:
+            session.partial_since = time.monotonic()
+        session.buffer += data
+        # Un mensaje que no se puede procesar cierra solo esta sesión; el hilo
+        # lector tiene que seguir atendiendo a los demás dispositivos
+        try:
+            while session.buffer:
+                readings, consumed = parse_message(session.buffer)
+                if readings is None:
+                    return  # mensaje incompleto: se sigue con los demás dispositivos
+                del session.buffer[:consumed]
+                session.partial_since = time.monotonic() if session.buffer else None
+                if readings:
+                    self._accept(session, readings)
+        except Exception as e:
+            self.close_session(session, f"({e})")
+
+    def _expire_partial(self):
+        # Un mensaje iniciado que no se completa en READ_TIMEOUT cierra la sesión
+        now = time.monotonic()
+        with self._lock:
+            stuck = [s for s in self.sessions.values()
+                     if s.partial_since is not None and now - s.partial_since > READ_TIMEOUT]
+        for session in stuck:
+            self.close_session(session, "(mensaje incompleto)")
+
+    def _accept(self, session, readings):
+        first_reading = session.device is None
+        session.device = session.device or readings[0].get("Device")
+        session.pending_since = None
+        session.last_reading = time.time()
+        session.readings += len(readings)
+        if first_reading:
+            # Ya se conoce el dispositivo: pasar a su intervalo propio
+            with self._lock:
+                self._schedule(session, self.intervals.next_delay(session.device))
+        self._pool.submit(self._deliver, session, readings)
+
+    def _deliver(self, session, readings):
+        try:
+            self.on_readings(session, readings)
+        except Exception as e:
+            print(f"Error procesando lecturas de {session}: {e}")
+
+    # ---------------------------------------------------------------- servidor
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._poll_loop, daemon=True).start()
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._wakeup.notify_all()
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            self.close_session(session, "(servidor detenido)")
+        self._pool.shutdown(wait=True)
+
+    def serve_forever(self, ip, port):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.start()
+        with s:
+            s.bind((ip, port))
+            s.listen(128)
+            while self._running:
+                client_soc, client_address = s.accept()
+                self.add_session(client_soc, client_address)
@@ -0,0 +1,400 @@
+"""
+Spool en disco (write-ahead log) entre la recepción y la escritura a la base de datos.
+
+La ingesta solo agrega registros al spool (append-only, sin esperar a la base
+de datos) y un hilo drenador los envía por lotes al destino. Si la base de datos
+está lenta o caída, los registros se acumulan en disco y se drenan en bloque
+cuando se recupera.
+
+Formato:
+    <dir>/<seq inicial, 20 dígitos>.seg   segmentos rotados por tamaño
+    <dir>/checkpoint                      último seq confirmado en el destino
+    <dir>/incarnation                     UUID aleatorio de esta instancia del spool
+
+Cada registro es una cabecera `!QII` (seq, largo, crc32) seguida del JSON del
+registro. Al abrir, el final del último segmento se valida y se trunca si quedó
+un registro incompleto por un corte de energía.
+
+El drenador solo envía registros que ya pasaron por fsync. Si enviara uno que
+después se pierde en un corte de energía, el checkpoint del destino quedaría
+por delante del disco, y al reabrir se volverían a repartir esos seq a
+registros nuevos, que el destino descartaría como ya guardados.
+
+Semántica exactly-once: el destino recibe pares (seq, registro) y debe guardar
+el último seq en la misma transacción que las filas, descartando los seq que ya
+tenga. Así, si el proceso cae después de escribir un lote pero antes de
+actualizar el checkpoint local, el reenvío de ese lote no duplica filas.
+Los seq solo son únicos dentro de una misma carpeta: si se borra, vuelven a
+empezar en 1. Por eso el destino debe identificar el spool con su
+`incarnation`, que se genera de nuevo junto con la carpeta; si no, un
+checkpoint viejo descartaría en silencio los registros nuevos.
+
+Un lote que el destino no podrá escribir nunca (datos inválidos, no una base
+caída) se señala con PoisonBatch: se copia a <dir>/cuarentena/ y el drenado
+sigue con el siguiente, en lugar de reintentarlo para siempre y frenar todo lo
+que viene detrás.
+"""
+import json
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+
+RECORD_HEADER = struct.Struct("!QII")
+SEGMENT_SUFFIX = ".seg"
+CHECKPOINT_FILE = "checkpoint"
+INCARNATION_FILE = "incarnation"
+QUARANTINE_DIR = "cuarentena"
+
+DEFAULT_SEGMENT_BYTES = 4 * 1024 * 1024
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_FSYNC_INTERVAL = 0.05   # segundos entre fsync agrupados
+DEFAULT_BATCH_SIZE = 500
+MAX_RETRY_BACKOFF = 30.0
+
+
+class SpoolFull(Exception):
+    """El spool alcanzó su límite de disco; el registro no se guardó."""
+
+
+class PoisonBatch(Exception):
+    """El destino rechaza el lote por su contenido; reintentarlo no serviría."""
+
+
+def _segment_name(base_seq):
+    return f"{base_seq:020d}{SEGMENT_SUFFIX}"
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Windows no permite abrir directorios
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _scan(path, offset=0):
+    """
+    Recorre los registros válidos de un segmento desde `offset`.
+
+    Yields:
+        tuple: (seq, payload, offset siguiente). Se detiene en el primer
+            registro incompleto o corrupto.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            seq, length, crc = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            offset += RECORD_HEADER.size + length
+            yield seq, payload, offset
+
+
+class Spool:
+    """
+    Cola durable en disco con drenado por lotes hacia un destino.
+
+    Args:
+        directory (str): Carpeta de los segmentos.
+        sink (callable): Recibe una lista de pares (seq, registro); debe lanzar
+            una excepción si no pudo escribirlos.
+        segment_bytes (int): Tamaño a partir del cual se rota el segmento.
+        max_bytes (int): Uso máximo de disco; por encima, append() lanza SpoolFull.
+        fsync_interval (float): Cada cuánto se hace fsync de lo escrito.
+        batch_size (int): Registros máximos por lote enviado al destino.
+    """
+
+    def __init__(self, directory, sink, segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 max_bytes=DEFAULT_MAX_BYTES, fsync_interval=DEFAULT_FSYNC_INTERVAL,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        self.directory = directory
+        self.sink = sink
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._new_data = threading.Condition(self._lock)
+        self._running = False
+        self._dirty = False
+        self._threads = []
+        self.last_error = None
+        self.quarantined = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.incarnation = self._read_incarnation()
+        self.committed = self._read_checkpoint()
+        self._segments = self._list_segments()
+        self._recover()
+        # Último seq que ya está en disco (fsync); el drenador no pasa de ahí
+        self._durable_seq = self._next_seq - 1
+        # Posición de lectura del drenador: (base del segmento, offset)
+        self._read_pos = None
+
+    # ------------------------------------------------------------ recuperación
+
+    def _list_segments(self):
+        bases = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SEGMENT_SUFFIX):
+                bases.append(int(name[:-len(SEGMENT_SUFFIX)]))
+        return sorted(bases)
+
+    def _path(self, base):
+        return os.path.join(self.directory, _segment_name(base))
+
+    def _read_incarnation(self):
+        # Se crea una sola vez por carpeta; sobrevive a los reinicios del proceso
+        path = os.path.join(self.directory, INCARNATION_FILE)
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value:
+                return value
+        except OSError:
+            pass
+        value = uuid.uuid4().hex
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(value)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _fsync_dir(self.directory)
+        return value
+
+    def _read_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE)) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_checkpoint(self, seq):
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(seq))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _recover(self):
+        # Truncar un registro incompleto al final y ubicar el siguiente seq
+        next_seq = self.committed + 1
+        if self._segments:
+            base = self._segments[-1]
+            path = self._path(base)
+            valid_end = 0
+            next_seq = max(next_seq, base)
+            for seq, _, end in _scan(path):
+                valid_end = end
+                next_seq = max(next_seq, seq + 1)
+            with open(path, "r+b") as f:
+                if os.path.getsize(path) != valid_end:
+                    print(f"Spool: truncando registro incompleto en {path}")
+                    f.truncate(valid_end)
+                # Lo que quedó de la ejecución anterior puede estar solo en caché
+                os.fsync(f.fileno())
+        else:
+            self._segments = [next_seq]
+            open(self._path(next_seq), "ab").close()
+            _fsync_dir(self.directory)
+        self._next_seq = next_seq
+        self._size = sum(os.path.getsize(self._path(b)) for b in self._segments)
+        self._file = open(self._path(self._segments[-1]), "ab", buffering=0)
+        self._segment_size = self._file.tell()
+
+    # ---------------------------------------------------------------- escritura
+
+    def append(self, record):
+        """
+        Agrega un registro (dict serializable a JSON) al spool.
+
+        Returns:
+            int: seq asignado al registro.
+
+        Raises:
+            SpoolFull: Si se superaría el uso máximo de disco.
+        """
+        payload = json.dumps(record, separators=(",", ":"), default=str).encode()
+        size = RECORD_HEADER.size + len(payload)
+        with self._lock:
+            if self._size + size > self.max_bytes:
+                raise SpoolFull(f"Spool lleno ({self._size} bytes en {self.directory})")
+            if self._segment_size and self._segment_size + size > self.segment_bytes:
+                self._rotate()
+            seq = self._next_seq
+            # Una sola escritura por registro; el drenador descarta uno a medio escribir
+            self._file.write(RECORD_HEADER.pack(seq, len(payload), zlib.crc32(payload)) + payload)
+            self._next_seq += 1
+            self._segment_size += size
+            self._size += size
+            self._dirty = True
+            self._new_data.notify_all()
+        return seq
+
+    def _rotate(self):
+        # Llamar con self._lock tomado
+        os.fsync(self._file.fileno())
+        self._durable_seq = self._next_seq - 1
+        self._file.close()
+        base = self._next_seq
+        self._segments.append(base)
+        self._file = open(self._path(base), "ab", buffering=0)
+        self._segment_size = 0
+        _fsync_dir(self.directory)
+
+    def _flush_loop(self):
+        while self._running:
+            time.sleep(self.fsync_interval)
+            with self._lock:
+                if not self._dirty:
+                    continue
+                self._dirty = False
+                fileno = self._file.fileno()
+                written = self._next_seq - 1
+            # fsync fuera del candado para no frenar append(); si el segmento
+            # rotó mientras tanto, _rotate() ya hizo su propio fsync
+            try:
+                os.fsync(fileno)
+            except OSError:
+                with self._lock:
+                    self._dirty = True   # reintentar en la próxima vuelta
+                continue
+            with self._lock:
+                self._durable_seq = max(self._durable_seq, written)
+                self._new_data.notify_all()
+
+    # ------------------------------------------------------------------ drenado
+
+    def _read_batch(self):
+        """
+        Lee hasta batch_size registros posteriores al último confirmado y
+        que ya están en disco.
+
+        Returns:
+            tuple: (pares (seq, registro), último seq leído, posición tras el lote).
+        """
+        with self._lock:
+            segments = list(self._segments)
+            durable = self._durable_seq
+        start = self.committed + 1
+        if self._read_pos is None or self._read_pos[0] not in segments:
+            base = max((b for b in segments if b <= start), default=segments[0])
+            self._read_pos = (base, 0)
+        base, offset = self._read_pos
+        records, last_seq = [], None
+        while len(records) < self.batch_size:
+            for seq, payload, end in _scan(self._path(base), offset):
+                if seq > durable:
+                    return records, last_seq, (base, offset)
+                offset = end
+                if seq < start:
+                    continue
+                records.append((seq, json.loads(payload)))
+                last_seq = seq
+                if len(records) >= self.batch_size:
+                    break
+            if len(records) >= self.batch_size:
+                break
+            # Fin del segmento: seguir con el siguiente si ya fue rotado
+            later = [b for b in segments if b > base]
+            if not later:
+                break
+            base, offset = later[0], 0
+        return records, last_seq, (base, offset)
+
+    def _drain_loop(self):
+        backoff = 0.5
+        while self._running:
+            records, last_seq, pos = self._read_batch()
+            if not records:
+                self._read_pos = pos
+                with self._lock:
+                    if self._running and self._next_seq <= self.committed + 1:
+                        self._new_data.wait(1.0)
+                    elif self._running:
+                        self._new_data.wait(0.05)
+                continue
+            try:
+                self.sink(records)
+            except PoisonBatch as e:
+                self._quarantine(records, e)
+            except Exception as e:
+                # Destino lento o caído: reintentar el mismo lote con espera creciente
+                self.last_error = str(e)
+                print(f"Spool: error enviando {len(records)} registros, reintento en {backoff:.1f} s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RETRY_BACKOFF)
+                continue
+            backoff = 0.5
+            self.last_error = None
+            self.committed = last_seq
+            self._read_pos = pos
+            self._write_checkpoint(last_seq)
+            self._delete_drained_segments()
+
+    def _quarantine(self, records, error):
+        """Guarda un lote rechazado en cuarentena (una línea JSON por registro) para revisarlo a mano."""
+        directory = os.path.join(self.directory, QUARANTINE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{records[0][0]:020d}-{records[-1][0]:020d}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for seq, record in records:
+                f.write(json.dumps({"seq": seq, "error": str(error), "registro": record}, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_dir(directory)
+        self.quarantined += len(records)
+        print(f"Spool: {len(records)} registros en cuarentena ({path}): {error}")
+
+    def _delete_drained_segments(self):
+        with self._lock:
+            while len(self._segments) > 1 and self._segments[1] <= self.committed + 1:
+                base = self._segments.pop(0)
+                path = self._path(base)
+                self._size -= os.path.getsize(path)
+                os.remove(path)
+
+    # ------------------------------------------------------------------ control
+
+    def start(self):
+        self._running = True
+        for target in (self._flush_loop, self._drain_loop):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._new_data.notify_all()
+        for t in self._threads:
+            t.join()
+        with self._lock:
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pendientes": self._next_seq - 1 - self.committed,
+                "bytes": self._size,
+                "segmentos": len(self._segments),
+                "confirmado": self.committed,
+                "cuarentena": self.quarantined,
+                "error": self.last_error,
+            }
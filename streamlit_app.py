@@ -2,27 +2,16 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
-from sqlalchemy import create_engine
+from sqlalchemy import text, bindparam
 import time
 from min_tabla import create_table_with_sparklines
+from perfilador import profiler_from_env
+from rangos import SENSOR_RANGES
+from alertas import LEVELS
+from consultas import build_fleet_query, build_history_query, fleet_status, next_cursor
+import almacenamiento
 import os
 
-# Función para crear la tabla sensors3 si no existe
-def create_table_if_not_exists(engine):
-    create_table_sql = '''
-    CREATE TABLE IF NOT EXISTS sensors3 (
-        lp VARCHAR,
-        device VARCHAR,
-        lux DOUBLE PRECISION,
-        nh3 DOUBLE PRECISION,
-        hs DOUBLE PRECISION,
-        h DOUBLE PRECISION
-    );
-    '''
-    with engine.connect() as conn:
-        conn.execute(create_table_sql)
-        conn.commit()
-
 # Configuración de la página (DEBE SER LA PRIMERA INSTRUCCIÓN)
 st.set_page_config(
     page_title="Monitoreo Galpón Avícola",
@@ -39,72 +28,37 @@ def local_css(file_name):
 # Cargar estilos CSS
 local_css("styles.css")
 
-# Configuración de rangos óptimos para sensores de galpón avícola
-SENSOR_RANGES = {
-    'lux': {
-        'optimal_min': 10,
-        'optimal_max': 300,
-        'unit': 'lux',
-        'description': 'Iluminación para bienestar animal. Rango óptimo entre 10-100 lux.'
-    },
-    'nh3': {
-        'optimal_min': 0,
-        'optimal_max': 250,
-        'unit': 'ppm',
-        'description': 'Nivel de amoniaco. Valores menores a 20 ppm son seguros para las aves.'
-    },
-    'hs': {
-        'optimal_min': 0,
-        'optimal_max': 100,
-        'unit': 'ppm',
-        'description': 'Sulfuro de hidrógeno. Niveles bajos (< 10 ppm) indican buena ventilación.'
-    },
-    'h': {
-        'optimal_min': 50,
-        'optimal_max': 100,
-        'unit': '%',
-        'description': 'Humedad relativa ideal para galpones. Entre 50-70% reduce estrés.'
-    },
-    't': {
-        'optimal_min': 18,
-        'optimal_max': 40,
-        'unit': '°C',
-        'description': 'Temperatura óptima para aves. Rango entre 18-24°C para máximo confort.'
-    }
-}
+# Perfilado opcional por rerun (DASHBOARD_PROFILE=1 o ?profile=1)
+profiler = profiler_from_env(st.query_params)
 
 # |||||||||||||||||||||-----Conexión a la base de datos------||||||||||||||||||||||||||||||
 
-# Usa DATABASE_URL si está definida, si no, arma la cadena manualmente
-DATABASE_URL = os.getenv("DATABASE_URL")
-if DATABASE_URL:
-    db_url = DATABASE_URL
-else:
-    db_user = os.getenv("DB_USER", "postgres")
-    db_password = os.getenv("DB_PASSWORD", "12345")
-    db_host = os.getenv("DB_HOST", "localhost")
-    db_port = os.getenv("DB_PORT", "5432")
-    db_name = os.getenv("DB_NAME", "galpon_db")
+# Backend compartido con la ingesta: DATABASE_URL, DB_HOST/DB_USER/... o, sin
+# ninguna de las dos, una base SQLite local sin servicio externo (ver almacenamiento.py)
 
-    
-    db_url = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+# Con varias granjas (granjas.json) cada una vive en su propio shard y el
+# dashboard consulta solo el de la granja elegida
+FARMS = almacenamiento.farms()
+farm = almacenamiento.default_farm()
+if len(FARMS) > 1:
+    farm = st.sidebar.selectbox("🏠 Granja", list(FARMS), format_func=lambda f: FARMS[f].nombre, key="granja")
 
+# Un solo engine (y su pool de conexiones) por granja para todas las sesiones y reruns
+@st.cache_resource
+def get_engine(farm=None):
+    return almacenamiento.engine_for_farm(farm)
 
-# Simula una carga de datos y crea la tabla si no existe
+# Crea la tabla sensors3 y sus índices si no existen
 with st.spinner("Cargando datos y verificando tabla..."):
-    time.sleep(2)
-    # Crear engine temporal para crear la tabla
     try:
-        engine = create_engine(db_url)
-        create_table_if_not_exists(engine)
+        almacenamiento.ensure_schema(get_engine(farm))
     except Exception as e:
         st.error(f"Error al crear/verificar la tabla sensors3: {e}")
 
 # Función para obtener la conexión a la base de datos
 def get_connection():
     try:
-        engine = create_engine(db_url)
-        conn = engine.connect()
+        conn = get_engine(farm).connect()
         return conn
     except Exception as e:
         st.error(f"Error al conectar a la base de datos: {e}")
@@ -121,7 +75,7 @@ def get_latest_data():
             ORDER BY time DESC
             LIMIT 30
             """
-            df = pd.read_sql_query(query, conn)
+            df = pd.read_sql_query(query, conn, parse_dates=['time'])
             conn.close()
             return df
         except Exception as e:
@@ -129,6 +83,239 @@ def get_latest_data():
             return pd.DataFrame()
     return pd.DataFrame()
 
+# Módulos disponibles en el shard de la granja (se refresca cada minuto)
+@st.cache_data(ttl=60)
+def get_devices(farm):
+    conn = get_connection()
+    if conn:
+        try:
+            query = """
+            SELECT device, MAX(time) AS last_seen
+            FROM sensors3
+            GROUP BY device
+            ORDER BY device
+            """
+            devices = pd.read_sql_query(query, conn)['device'].dropna().tolist()
+            conn.close()
+            return devices
+        except Exception as e:
+            conn.close()
+            st.error(f"Error al consultar dispositivos: {e}")
+            return []
+    return []
+
+# Últimas lecturas de cada módulo de la página visible (no de todo el galpón)
+def get_device_data(devices, limit_per_device=30):
+    if not devices:
+        return pd.DataFrame()
+    conn = get_connection()
+    if conn:
+        try:
+            query = text("""
+            SELECT *
+            FROM (
+                SELECT s.*, ROW_NUMBER() OVER (PARTITION BY device ORDER BY time DESC) AS rn
+                FROM sensors3 s
+                WHERE device IN :devices
+            ) ultimas
+            WHERE rn <= :limit
+            ORDER BY device, time
+            """).bindparams(bindparam("devices", expanding=True))
+            df = pd.read_sql_query(query, conn, params={"devices": list(devices), "limit": limit_per_device}, parse_dates=['time'])
+            conn.close()
+            return df.drop(columns=['rn'])
+        except Exception as e:
+            conn.close()
+            st.error(f"Error al consultar datos de los módulos: {e}")
+            return pd.DataFrame()
+    return pd.DataFrame()
+
+# Historial paginado por cursor (device, time, id): cada página parte de la última
+# fila de la anterior en lugar de usar OFFSET, así el costo no crece con la profundidad
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_BUDGET_MS = int(os.getenv("HISTORY_BUDGET_MS", "500"))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_history_page(farm, cursor, page_size=HISTORY_PAGE_SIZE, budget_ms=HISTORY_BUDGET_MS):
+    """
+    Una página del historial de un dispositivo, de la más reciente hacia atrás.
+
+    Args:
+        farm (str): Granja cuyo shard se consulta.
+        cursor (tuple): (device, time, id) de la última fila vista; time e id en
+            None para la primera página.
+        page_size (int): Filas por página.
+        budget_ms (int): Tiempo máximo de la consulta (statement_timeout).
+
+    Returns:
+        pd.DataFrame: Filas de la página (puede venir vacía al final del historial).
+    """
+    query, params = build_history_query(cursor, page_size)
+    with get_engine(farm).connect() as conn:
+        # Presupuesto de latencia: la base cancela la consulta si se pasa
+        # (SQLite local no tiene statement_timeout; ahí no hay red ni contención)
+        if not almacenamiento.is_sqlite(conn):
+            conn.execute(text(f"SET LOCAL statement_timeout = {int(budget_ms)}"))
+        return pd.read_sql_query(query, conn, params=params, parse_dates=['time'])
+
+def render_history(devices):
+    st.markdown("## Historial de Lecturas 🔎")
+    if not devices:
+        st.info("Seleccione al menos un módulo.")
+        return
+    device = st.selectbox("Módulo", devices, key="hist_device")
+    # Pila de cursores de las páginas visitadas (para volver atrás)
+    if st.session_state.get("hist_for") != (farm, device):
+        st.session_state["hist_for"] = (farm, device)
+        st.session_state["hist_cursors"] = [(device, None, None)]
+    cursors = st.session_state["hist_cursors"]
+
+    start = time.perf_counter()
+    try:
+        page_df = get_history_page(farm, cursors[-1])
+    except Exception as e:
+        st.warning(f"La página no se pudo cargar dentro de {HISTORY_BUDGET_MS} ms, intente de nuevo: {e}")
+        return
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if page_df.empty:
+        st.info("No hay más lecturas para este módulo.")
+    else:
+        st.dataframe(page_df.drop(columns=['id']), use_container_width=True, hide_index=True)
+
+    # Precarga de la página siguiente: al pulsar "Siguiente" ya está en caché
+    has_next = False
+    if len(page_df) == HISTORY_PAGE_SIZE:
+        try:
+            has_next = not get_history_page(farm, next_cursor(page_df)).empty
+        except Exception:
+            has_next = True  # se reintentará al pedirla
+
+    col_prev, col_info, col_next = st.columns([1, 3, 1])
+    if col_prev.button("◀ Anterior", key="hist_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    col_info.caption(f"Página {len(cursors)} · {elapsed_ms:.0f} ms")
+    if col_next.button("Siguiente ▶", key="hist_next", disabled=not has_next):
+        cursors.append(next_cursor(page_df))
+        st.rerun()
+
+# Separar un DataFrame por dispositivo en una sola pasada
+def split_by_device(df):
+    if df.empty or 'device' not in df.columns:
+        return {}
+    return {device: group for device, group in df.groupby('device', sort=False)}
+
+# Mapa de la granja: estado de cada módulo por intervalo, agregado en la base
+# (una fila por dispositivo e intervalo en lugar de todas las lecturas crudas)
+FLEET_HOURS = int(os.getenv("FLEET_HOURS", "24"))
+FLEET_BUCKET_MINUTES = int(os.getenv("FLEET_BUCKET_MINUTES", "15"))
+FLEET_COLORS = ('rgb(67, 160, 71)', 'rgb(255, 165, 0)', 'rgb(229, 57, 53)')   # Óptimo, Advertencia, Crítico
+
+def fleet_columns(hours=FLEET_HOURS, bucket_minutes=FLEET_BUCKET_MINUTES):
+    # Inicio de cada intervalo del mapa, alineados como los de la consulta (múltiplos desde la época)
+    freq = f"{bucket_minutes}min"
+    return pd.date_range(end=pd.Timestamp.now(tz='UTC').tz_localize(None).floor(freq), periods=hours * 60 // bucket_minutes, freq=freq)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_fleet_buckets(farm, devices, hours=FLEET_HOURS, bucket_minutes=FLEET_BUCKET_MINUTES):
+    """
+    Mínimo, máximo y promedio de cada sensor por dispositivo e intervalo.
+
+    Args:
+        farm (str): Granja cuyo shard se consulta.
+        devices (tuple): Dispositivos a incluir.
+        hours (int): Horas hacia atrás desde ahora.
+        bucket_minutes (int): Minutos de cada intervalo.
+
+    Returns:
+        pd.DataFrame: device, bucket, n y <sensor>_min/_max/_avg por sensor.
+    """
+    if not devices:
+        return pd.DataFrame()
+    with get_engine(farm).connect() as conn:
+        since = fleet_columns(hours, bucket_minutes)[0].to_pydatetime()
+        query, params = build_fleet_query(conn, devices, since, bucket_minutes * 60)
+        return pd.read_sql_query(query, conn, params=params, parse_dates=['bucket'])
+
+def create_fleet_heatmap(buckets, hours=FLEET_HOURS, bucket_minutes=FLEET_BUCKET_MINUTES):
+    # Una sola figura: filas = módulos, columnas = intervalos (los sin lecturas quedan vacíos)
+    levels, details = fleet_status(buckets)
+    buckets = buckets.assign(level=levels, detail=details)
+    columns = fleet_columns(hours, bucket_minutes)
+    z = buckets.pivot(index='device', columns='bucket', values='level').reindex(columns=columns)
+    text_matrix = buckets.pivot(index='device', columns='bucket', values='detail').reindex(index=z.index, columns=columns)
+    colorscale = [
+        [0.0, FLEET_COLORS[0]], [1 / 3, FLEET_COLORS[0]],
+        [1 / 3, FLEET_COLORS[1]], [2 / 3, FLEET_COLORS[1]],
+        [2 / 3, FLEET_COLORS[2]], [1.0, FLEET_COLORS[2]],
+    ]
+    fig = go.Figure(go.Heatmap(
+        z=z.values,
+        x=columns,
+        y=z.index,
+        text=text_matrix.fillna("Sin lecturas").values,
+        hovertemplate="<b>%{y}</b> · %{x|%d/%m %H:%M}<br>%{text}<extra></extra>",
+        colorscale=colorscale,
+        zmin=-0.5,
+        zmax=2.5,
+        xgap=1,
+        ygap=1,
+        colorbar=dict(tickvals=[0, 1, 2], ticktext=list(LEVELS), title="Estado"),
+    ))
+    fig.update_layout(
+        template='plotly_dark',
+        height=max(250, 40 * len(z.index) + 120),
+        margin=dict(l=20, r=20, t=40, b=20),
+        plot_bgcolor='rgb(20, 20, 30)',
+        paper_bgcolor='rgb(10, 10, 20)',
+        title=f"Últimas {hours} h en intervalos de {bucket_minutes} min",
+        yaxis=dict(autorange='reversed', type='category'),
+    )
+    return fig
+
+# Estadísticas móviles calculadas en la ingesta (tabla sensor_stats)
+def get_sensor_stats():
+    conn = get_connection()
+    if conn:
+        try:
+            df = pd.read_sql_query("SELECT * FROM sensor_stats", conn)
+            conn.close()
+            return df
+        except Exception:
+            # La tabla aún no existe si la ingesta no ha publicado estadísticas
+            conn.close()
+            return pd.DataFrame()
+    return pd.DataFrame()
+
+# Nivel de alerta vigente por dispositivo y sensor (evaluado en la ingesta)
+def get_alert_state():
+    conn = get_connection()
+    if conn:
+        try:
+            df = pd.read_sql_query("SELECT device, sensor, level, value, since FROM alert_state", conn)
+            conn.close()
+            return df
+        except Exception:
+            conn.close()
+            return pd.DataFrame()
+    return pd.DataFrame()
+
+# Flecha de tendencia a partir de la pendiente EWMA (unidades por hora) de todos
+# los dispositivos; si no hay estadísticas se compara la media con el rango óptimo
+def trend_arrow(sensor, mean_value, stats_df, devices=None):
+    if not stats_df.empty:
+        rows = stats_df[stats_df['sensor'] == sensor]
+        if devices is not None:
+            rows = rows[rows['device'].isin(devices)]
+        if not rows.empty:
+            slope = rows['slope'].mean()
+            details = SENSOR_RANGES[sensor]
+            # Cambios menores al 1% del rango óptimo por hora se consideran estables
+            threshold = 0.01 * (details['optimal_max'] - details['optimal_min'])
+            return "↑" if slope > threshold else "↓" if slope < -threshold else "→"
+    return "↑" if mean_value > SENSOR_RANGES[sensor]['optimal_max'] else "↓" if mean_value < SENSOR_RANGES[sensor]['optimal_min'] else "→"
+
 # Aplicar estilos condicionales a la tabla
 def style_table(df):
     def highlight_status(value, sensor):
@@ -257,7 +444,7 @@ def create_trading_view_plot(df, sensor, title, max_val, min_val):
 
 # ||||||||||||||||||||||||||||-----Configuración del dashboard-----||||||||||||||||||||||||||||||
 
-st.title("📈Monitoreo de Galpón Avícola UCC🐔")
+st.title(f"📈Monitoreo de {FARMS[farm].nombre}🐔")
 
 # Sidebar con información adicional
 st.sidebar.markdown('<h2 style="font-weight: bold; font-size: 1.5rem;">💠 Panel de Control</h2>', unsafe_allow_html=True)
@@ -279,7 +466,7 @@ def filter_data_by_time(df, time_range):
     df['time'] = pd.to_datetime(df['time'], errors='coerce')
  
     # Obtener el tiempo actual
-    now = pd.Timestamp.now()
+    now = pd.Timestamp.now(tz='UTC').tz_localize(None)   # sensors3.time está en UTC
 
     # Calcular el rango de tiempo según la selección
     if time_range == "Últimos 5 minutos":
@@ -306,10 +493,12 @@ def filter_data_by_time(df, time_range):
     return df
 
 # Obtener datos iniciales
-df = get_latest_data()
+with profiler.phase("sql_inicial"):
+    df = get_latest_data()
 
 # Filtrar los datos según la selección del tiempo
-df = filter_data_by_time(df, time_range)
+with profiler.phase("filtrado"):
+    df = filter_data_by_time(df, time_range)
 
 # Renombrar columnas para mostrar encabezados personalizados
 columnas_personalizadas = {
@@ -324,8 +513,15 @@ columnas_personalizadas = {
 }
 df_mostrar = df.rename(columns=columnas_personalizadas)
 
+# Estado de alertas calculado en la ingesta; si aún no existe, se calcula aquí
+with profiler.phase("sql_alertas"):
+    alert_state = get_alert_state()
+
 # Indicador de estado general
-overall_status = calculate_overall_status(df)
+if not alert_state.empty:
+    overall_status = LEVELS[int(alert_state['level'].max())]
+else:
+    overall_status = calculate_overall_status(df)
 st.sidebar.markdown("### Estado General del Galpón🛖")
 if overall_status == "Óptimo":
     st.sidebar.success(f"Estado: {overall_status}")
@@ -338,19 +534,37 @@ else:
 st.sidebar.markdown('<h2>🔻 Seleccionar dispositivos</h2>', unsafe_allow_html=True)
 
 # Multiselect debajo del título
+with profiler.phase("sql_dispositivos"):
+    all_devices = get_devices(farm)
 selected_devices = st.sidebar.multiselect(
     "",
-    options=["ESP1", "ESP2", "ESP3", "ESP4", "ESP5", "ESP6"],
-    default=["ESP1", "ESP2", "ESP3", "ESP4", "ESP5", "ESP6"]
+    options=all_devices,
+    default=all_devices
 )
-# Recomendaciones dinámicas por módulo
-with st.sidebar.expander("### Recomendaciones por Módulo 🛠️"):
-    for device in selected_devices:
-        device_df = df[df['device'] == device]
-        if not device_df.empty:
+
+# Paginación: solo se consultan y dibujan los módulos de la página visible
+DEVICES_PER_PAGE = int(os.getenv("DEVICES_PER_PAGE", "6"))
+n_pages = max(1, -(-len(selected_devices) // DEVICES_PER_PAGE))
+page = st.sidebar.number_input(f"Página de módulos (de {n_pages})", min_value=1, max_value=n_pages, value=1, step=1)
+page_devices = selected_devices[(page - 1) * DEVICES_PER_PAGE:page * DEVICES_PER_PAGE]
+
+# Lecturas por módulo separadas una sola vez
+device_groups = split_by_device(df)
+
+# Recomendaciones dinámicas por módulo (de la página visible)
+with profiler.phase("sidebar"), st.sidebar.expander("### Recomendaciones por Módulo 🛠️"):
+    for device in page_devices:
+        if not alert_state.empty:
+            # Solo los sensores con alerta vigente, con el valor que la disparó
+            device_alerts = alert_state[(alert_state['device'] == device) & (alert_state['level'] > 0)]
+            last_values = dict(zip(device_alerts['sensor'], device_alerts['value']))
+        else:
+            device_df = device_groups.get(device)
+            last_values = {sensor: device_df[sensor].iloc[-1] for sensor in SENSOR_RANGES} if device_df is not None else None
+        if last_values is not None:
             recommendations = []
-            for sensor, details in SENSOR_RANGES.items():
-                last_value = device_df[sensor].iloc[-1]
+            for sensor, last_value in last_values.items():
+                details = SENSOR_RANGES[sensor]
                 if last_value < details['optimal_min']:
                     deviation = details['optimal_min'] - last_value
                     recommendations.append(f"⚠️ {sensor.upper()}: Aumentar {details['description'].split(' ')[0]} en al menos {deviation:.2f} {details['unit']}.")
@@ -365,6 +579,18 @@ with st.sidebar.expander("### Recomendaciones por Módulo 🛠️"):
             else:
                 st.markdown(f"**{device}:** ✅ Todo en orden.")
 
+# Anomalías detectadas en la ingesta (|z| >= 3 respecto a la media móvil)
+with profiler.phase("sql_estadisticas"):
+    stats_df = get_sensor_stats()
+if not stats_df.empty:
+    anomalies = stats_df[(stats_df['z'].abs() >= 3) & stats_df['device'].isin(selected_devices)]
+    with st.sidebar.expander(f"### Anomalías detectadas ({len(anomalies)}) 📈"):
+        if anomalies.empty:
+            st.markdown("✅ Sin cambios bruscos recientes.")
+        for _, row in anomalies.iterrows():
+            unit = SENSOR_RANGES[row['sensor']]['unit']
+            st.markdown(f"- **{row['device']}** {row['sensor'].upper()}: {row['last']:.2f} {unit} (z = {row['z']:.1f}, media {row['mean']:.2f})")
+
 # Botón de actualización manual
 if st.sidebar.button("Actualizar datos 🔄"):
     st.rerun()
@@ -372,10 +598,14 @@ if st.sidebar.button("Actualizar datos 🔄"):
 # Contenedor para actualización
 update_container = st.container()
 
+# Panel de perfilado en la barra lateral (se llena al final de cada rerun)
+profile_container = st.sidebar.empty()
+
 # ||||||||||||||||||||||||||||||||||||-----Función principal-----||||||||||||||||||||||||||||||
 def main():
     while True:
-        df = get_latest_data()
+        with profiler.phase("sql"):
+            df = get_latest_data()
         if df.empty:
             st.warning("No se encontraron datos. Verifica la conexión o la tabla.")
             st.stop()
@@ -401,209 +631,241 @@ def main():
             df_mostrar = df.rename(columns=columnas_personalizadas)
 
             # Mostrar la tabla con los nuevos encabezados
-            st.dataframe(
-                df_mostrar,
-                use_container_width=True,
-                hide_index=True
-            )
-
-            # Resumen del Galpón en tarjetas horizontales
-            st.markdown("### Resumen del Galpón 📊")
-            cols = st.columns(3)  # Crear tres columnas para las tarjetas
-
-            # Tarjeta de Temperatura Promedio
-            with cols[0]:
-                temp_mean = df['t'].mean()
-                temp_trend = "↑" if temp_mean > SENSOR_RANGES['t']['optimal_max'] else "↓" if temp_mean < SENSOR_RANGES['t']['optimal_min'] else "→"
-                st.markdown(f"""
-                <div class="summary-card" style="
-                    border: 1px solid #4CAF50;
-                    border-radius: 10px;
-                    padding: 15px;
-                    background-color: rgba(240, 240, 240, 0.8);
-                    box-shadow: 2px 2px 5px rgba(0, 0, 0, 0.1);
-                ">
-                    <h4 style="margin-bottom: 5px;">🌡️ <strong>Temperatura Promedio</strong></h4>
-                    <p style="margin: 0; font-size: 16px;">{temp_mean:.2f} °C</p>
-                    <p style="margin: 0; font-size: 14px; color: gray;">Tendencia: {temp_trend}</p>
-                </div>
-                """, unsafe_allow_html=True)
-
-            # Tarjeta de Humedad Promedio
-            with cols[1]:
-                humidity_mean = df['h'].mean()
-                humidity_trend = "↑" if humidity_mean > SENSOR_RANGES['h']['optimal_max'] else "↓" if humidity_mean < SENSOR_RANGES['h']['optimal_min'] else "→"
-                st.markdown(f"""
-                <div class="summary-card" style="
-                    border: 1px solid #2196F3;
-                    border-radius: 10px;
-                    padding: 15px;
-                    background-color: rgba(240, 240, 240, 0.8);
-                    box-shadow: 2px 2px 5px rgba(0, 0, 0, 0.1);
-                ">
-                    <h4 style="margin-bottom: 5px;">💧 <strong>Humedad Promedio</strong></h4>
-                    <p style="margin: 0; font-size: 16px;">{humidity_mean:.2f} %</p>
-                    <p style="margin: 0; font-size: 14px; color: gray;">Tendencia: {humidity_trend}</p>
-                </div>
-                """, unsafe_allow_html=True)
-
-            # Tarjeta de Amoniaco Promedio
-            with cols[2]:
-                nh3_mean = df['nh3'].mean()
-                nh3_trend = "↑" if nh3_mean > SENSOR_RANGES['nh3']['optimal_max'] else "↓" if nh3_mean < SENSOR_RANGES['nh3']['optimal_min'] else "→"
-                st.markdown(f"""
-                <div class="summary-card" style="
-                    border: 1px solid #FF5722;
-                    border-radius: 10px;
-                    padding: 15px;
-                    background-color: rgba(240, 240, 240, 0.8);
-                    box-shadow: 2px 2px 5px rgba(0, 0, 0, 0.1);
-                ">
-                    <h4 style="margin-bottom: 5px;">⚠️ <strong>Amoniaco Promedio</strong></h4>
-                    <p style="margin: 0; font-size: 16px;">{nh3_mean:.2f} ppm</p>
-                    <p style="margin: 0; font-size: 14px; color: gray;">Tendencia: {nh3_trend}</p>
-                </div>
-                """, unsafe_allow_html=True) 
-
-            # Lista de dispositivos
-            devices = selected_devices
+            with profiler.phase("tabla"):
+                st.dataframe(
+                    df_mostrar,
+                    use_container_width=True,
+                    hide_index=True
+                )
+
+            with profiler.phase("historial"):
+                with st.expander("Ver historial completo"):
+                    render_history(selected_devices)
+
+            with profiler.phase("resumen"):
+                # Resumen del Galpón en tarjetas horizontales
+                st.markdown("### Resumen del Galpón 📊")
+                cols = st.columns(3)  # Crear tres columnas para las tarjetas
+
+                # Tarjeta de Temperatura Promedio
+                with cols[0]:
+                    temp_mean = df['t'].mean()
+                    temp_trend = trend_arrow('t', temp_mean, stats_df, selected_devices)
+                    st.markdown(f"""
+                    <div class="summary-card" style="
+                        border: 1px solid #4CAF50;
+                        border-radius: 10px;
+                        padding: 15px;
+                        background-color: rgba(240, 240, 240, 0.8);
+                        box-shadow: 2px 2px 5px rgba(0, 0, 0, 0.1);
+                    ">
+                        <h4 style="margin-bottom: 5px;">🌡️ <strong>Temperatura Promedio</strong></h4>
+                        <p style="margin: 0; font-size: 16px;">{temp_mean:.2f} °C</p>
+                        <p style="margin: 0; font-size: 14px; color: gray;">Tendencia: {temp_trend}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+
+                # Tarjeta de Humedad Promedio
+                with cols[1]:
+                    humidity_mean = df['h'].mean()
+                    humidity_trend = trend_arrow('h', humidity_mean, stats_df, selected_devices)
+                    st.markdown(f"""
+                    <div class="summary-card" style="
+                        border: 1px solid #2196F3;
+                        border-radius: 10px;
+                        padding: 15px;
+                        background-color: rgba(240, 240, 240, 0.8);
+                        box-shadow: 2px 2px 5px rgba(0, 0, 0, 0.1);
+                    ">
+                        <h4 style="margin-bottom: 5px;">💧 <strong>Humedad Promedio</strong></h4>
+                        <p style="margin: 0; font-size: 16px;">{humidity_mean:.2f} %</p>
+                        <p style="margin: 0; font-size: 14px; color: gray;">Tendencia: {humidity_trend}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+
+                # Tarjeta de Amoniaco Promedio
+                with cols[2]:
+                    nh3_mean = df['nh3'].mean()
+                    nh3_trend = trend_arrow('nh3', nh3_mean, stats_df, selected_devices)
+                    st.markdown(f"""
+                    <div class="summary-card" style="
+                        border: 1px solid #FF5722;
+                        border-radius: 10px;
+                        padding: 15px;
+                        background-color: rgba(240, 240, 240, 0.8);
+                        box-shadow: 2px 2px 5px rgba(0, 0, 0, 0.1);
+                    ">
+                        <h4 style="margin-bottom: 5px;">⚠️ <strong>Amoniaco Promedio</strong></h4>
+                        <p style="margin: 0; font-size: 16px;">{nh3_mean:.2f} ppm</p>
+                        <p style="margin: 0; font-size: 14px; color: gray;">Tendencia: {nh3_trend}</p>
+                    </div>
+                    """, unsafe_allow_html=True) 
+
+            with profiler.phase("mapa_granja"):
+                st.markdown("### Mapa de la Granja 🗺️")
+                st.markdown("🔶Estado de todos los módulos seleccionados por intervalo, según los rangos óptimos de cada sensor.")
+                try:
+                    buckets = get_fleet_buckets(farm, tuple(selected_devices))
+                except Exception as e:
+                    st.error(f"Error al consultar el mapa de la granja: {e}")
+                    buckets = pd.DataFrame()
+                if buckets.empty:
+                    st.info("No hay lecturas de los módulos seleccionados en este período.")
+                else:
+                    st.plotly_chart(create_fleet_heatmap(buckets), use_container_width=True)
+
+            # Lista de dispositivos de la página visible
+            devices = page_devices
+            with profiler.phase("sql_modulos"):
+                page_groups = split_by_device(get_device_data(devices))
             
 #|||||||||||||||||||||----- Mostrar gráficas y tabla para cada dispositivo-----|||||||||||||||||
-        for device in devices:
-            device_df = df[df['device'] == device]
-            if not device_df.empty:
-                # Título del módulo
-                st.markdown(f"""
-                <h2 style='color: #43a047; font-size: 24px; font-weight: bold;'>
-                    <i class="fas fa-microchip"></i> Módulo: {device}
-                </h2>
-                """, unsafe_allow_html=True)
-
-                # Llamar a la función para crear la tabla con Sparklines
-                sensors_config = [
-                    ('lux', 'Luminosidad', 140, 60),
-                    ('nh3', 'Amoniaco', 25, 5),
-                    ('hs', 'Sulfuro de Hidrógeno', 400, 0),
-                    ('h', 'Humedad', 100, 70),
-                    ('t', 'Temperatura', 24, 18)
-                ]
-                create_table_with_sparklines(device_df, sensors_config, SENSOR_RANGES)
-
-                # Botón para desplegar/replegar la sección de pestañas
-                if f"{device}_tabs_expanded" not in st.session_state:
-                    st.session_state[f"{device}_tabs_expanded"] = False
-                toggle_button_label = "Ocultar Detalles" if st.session_state[f"{device}_tabs_expanded"] else "Ver Detalles"
-                toggle_button_color = "red" if st.session_state[f"{device}_tabs_expanded"] else "green"
-                if st.button(f"{toggle_button_label}", key=f"toggle_tabs_{device}"):
-                    st.session_state[f"{device}_tabs_expanded"] = not st.session_state[f"{device}_tabs_expanded"]
-
-                # Mostrar la sección de pestañas si está expandida
-                if st.session_state[f"{device}_tabs_expanded"]:
-                    tabs = st.tabs(["📊 Gráficas Detalladas", "📝 Explicación y Sugerencias"])
-                    # Pestaña de gráficas detalladas
-                    with tabs[0]:
-                        st.markdown(f"### Gráficas Detalladas del Módulo {device}")
-                        for sensor, title, max_val, min_val in sensors_config:
-                            st.markdown(f"<h4 style='color: #1E88E5;'>{title}</h4>", unsafe_allow_html=True)
-                            opt_range = SENSOR_RANGES[sensor]
-                            time_list = device_df['time'].tolist()
-                            optimal_max = [opt_range['optimal_max']] * len(time_list)
-                            optimal_min = [opt_range['optimal_min']] * len(time_list)
-
-                            optimal_area = go.Scatter(
-                                x=time_list + time_list[::-1],
-                                y=optimal_max + optimal_min[::-1],
-                                fill='toself',
-                                fillcolor='rgba(0, 255, 0, 0.1)',
-                                line=dict(color='rgba(0,0,0,0)'),
-                                name='Rango Óptimo',
-                                showlegend=False
-                            )
-                            # Crear figura individual
-                            fig = go.Figure()
-                            # Definir la traza para el sensor actual
-                            trace = go.Scatter(
-                                x=device_df['time'],
-                                y=device_df[sensor],
-                                mode='lines+markers',
-                                name=title,
-                                line=dict(color='rgb(0, 123, 255)', width=2)
-                            )
-                            fig.add_trace(trace)
-                            fig.add_trace(optimal_area)
-                            # Configurar diseño
-                            fig.update_layout(
-                                template='plotly_dark',
-                                height=300,
-                                showlegend=False,
-                                margin=dict(l=20, r=20, t=40, b=20),
-                                plot_bgcolor='rgb(20, 20, 30)',
-                                paper_bgcolor='rgb(10, 10, 20)',
-                                title=f"{title} ({opt_range['unit']})"
-                            )
-                            # Mostrar gráfica
-                            st.plotly_chart(fig, use_container_width=True)
-                    # Pestaña de explicación y sugerencias
-                    with tabs[1]:
-                        st.markdown(f"### Explicación y Sugerencias para el Módulo {device}")
+        with profiler.phase("dispositivos"):
+            if len(selected_devices) > len(devices):
+                st.caption(f"Mostrando {len(devices)} de {len(selected_devices)} módulos (página {page} de {n_pages}).")
+            for device in devices:
+                with profiler.phase(device):
+                    device_df = page_groups.get(device, pd.DataFrame())
+                    if not device_df.empty:
+                        # Título del módulo
+                        st.markdown(f"""
+                        <h2 style='color: #43a047; font-size: 24px; font-weight: bold;'>
+                            <i class="fas fa-microchip"></i> Módulo: {device}
+                        </h2>
+                        """, unsafe_allow_html=True)
+
+                        # Llamar a la función para crear la tabla con Sparklines
                         sensors_config = [
-                            ('lux', 'Luminosidad'),
-                            ('nh3', 'Amoniaco'),
-                            ('hs', 'Sulfuro de Hidrógeno'),
-                            ('h', 'Humedad'),
-                            ('t', 'Temperatura')
+                            ('lux', 'Luminosidad', 140, 60),
+                            ('nh3', 'Amoniaco', 25, 5),
+                            ('hs', 'Sulfuro de Hidrógeno', 400, 0),
+                            ('h', 'Humedad', 100, 70),
+                            ('t', 'Temperatura', 24, 18)
                         ]
-                        # Crear columnas para las tarjetas
-                        cols = st.columns(len(sensors_config))
-                        for i, (sensor, title) in enumerate(sensors_config):
-                            details = SENSOR_RANGES[sensor]
-                            last_value = device_df[sensor].iloc[-1]
-                            # Determinar el estado, color y el ícono de la tarjeta
-                            if last_value < details['optimal_min']:
-                                status = "Bajo"
-                                color = "rgba(255, 0, 0, 0.2)"  # Rojo
-                                icon = '<i class="fas fa-exclamation-circle" style="color: red;"></i>'
-                                suggestion = f"Aumentar {details['description'].split(' ')[0]} para alcanzar el rango óptimo."
-                            elif last_value > details['optimal_max']:
-                                status = "Alto"
-                                color = "rgba(255, 165, 0, 0.2)"  # Amarillo
-                                icon = '<i class="fas fa-exclamation-triangle" style="color: orange;"></i>'
-                                suggestion = f"Reducir {details['description'].split(' ')[0]} para alcanzar el rango óptimo."
-                            else:
-                                status = "Óptimo"
-                                color = "rgba(0, 255, 0, 0.2)"  # Verde
-                                icon = '<i class="fas fa-check-circle" style="color: green;"></i>'
-                                suggestion = "Todo está funcionando correctamente."
-                            # Mostrar tarjeta en la columna correspondiente
-                            with cols[i]:
-                                st.markdown(f"""
-                                <div style="
-                                    border: 1px solid #ddd;
-                                    border-radius: 10px;
-                                    padding: 15px;
-                                    margin-bottom: 10px;
-                                    background-color: {color};
-                                    box-shadow: 2px 2px 5px rgba(0, 0, 0, 0.1);
-                                    transition: transform 0.3s ease, box-shadow 0.3s ease;
-                                " onmouseover="this.style.transform='scale(1.05)'; this.style.boxShadow='4px 4px 15px rgba(0, 0, 0, 0.3)';" 
-                                    onmouseout="this.style.transform='scale(1)'; this.style.boxShadow='2px 2px 5px rgba(0, 0, 0, 0.1)';">
-                                    <h4 style="margin-bottom: 5px; color: #1E88E5;">
-                                        {icon} {title}
-                                    </h4>
-                                    <p style="margin: 0; font-size: 14px;">{details['description']}</p>
-                                    <p style="margin: 0; font-size: 14px; color: black;">
-                                        <strong>Valor Actual:</strong> {last_value} {details['unit']}
-                                    </p>
-                                    <p style="margin: 0; font-size: 14px; color: #000; font-weight: bold;">
-                                        <strong>Estado:</strong> <span style="color: {icon.split('style="color: ')[1].split(';')[0]};">{status}</span>
-                                    </p>
-                                    <p style="margin: 0; font-size: 14px; color: #000; font-weight: bold;">
-                                        <strong>Sugerencia:</strong> <span style="color: #333;">{suggestion}</span>
-                                    </p>
-                                </div>
-                                """, unsafe_allow_html=True)
-            else:
-                st.warning(f"No hay datos para {device}.")
+                        with profiler.phase("sparklines"):
+                            create_table_with_sparklines(device_df, sensors_config, SENSOR_RANGES)
+
+                        # Botón para desplegar/replegar la sección de pestañas
+                        if f"{device}_tabs_expanded" not in st.session_state:
+                            st.session_state[f"{device}_tabs_expanded"] = False
+                        toggle_button_label = "Ocultar Detalles" if st.session_state[f"{device}_tabs_expanded"] else "Ver Detalles"
+                        toggle_button_color = "red" if st.session_state[f"{device}_tabs_expanded"] else "green"
+                        if st.button(f"{toggle_button_label}", key=f"toggle_tabs_{device}"):
+                            st.session_state[f"{device}_tabs_expanded"] = not st.session_state[f"{device}_tabs_expanded"]
+
+                        # Mostrar la sección de pestañas si está expandida
+                        if st.session_state[f"{device}_tabs_expanded"]:
+                            tabs = st.tabs(["📊 Gráficas Detalladas", "📝 Explicación y Sugerencias"])
+                            # Pestaña de gráficas detalladas
+                            with tabs[0]:
+                                st.markdown(f"### Gráficas Detalladas del Módulo {device}")
+                                for sensor, title, max_val, min_val in sensors_config:
+                                    st.markdown(f"<h4 style='color: #1E88E5;'>{title}</h4>", unsafe_allow_html=True)
+                                    opt_range = SENSOR_RANGES[sensor]
+                                    time_list = device_df['time'].tolist()
+                                    optimal_max = [opt_range['optimal_max']] * len(time_list)
+                                    optimal_min = [opt_range['optimal_min']] * len(time_list)
+
+                                    with profiler.phase("figuras"):
+                                        optimal_area = go.Scatter(
+                                            x=time_list + time_list[::-1],
+                                            y=optimal_max + optimal_min[::-1],
+                                            fill='toself',
+                                            fillcolor='rgba(0, 255, 0, 0.1)',
+                                            line=dict(color='rgba(0,0,0,0)'),
+                                            name='Rango Óptimo',
+                                            showlegend=False
+                                        )
+                                        # Crear figura individual
+                                        fig = go.Figure()
+                                        # Definir la traza para el sensor actual
+                                        trace = go.Scatter(
+                                            x=device_df['time'],
+                                            y=device_df[sensor],
+                                            mode='lines+markers',
+                                            name=title,
+                                            line=dict(color='rgb(0, 123, 255)', width=2)
+                                        )
+                                        fig.add_trace(trace)
+                                        fig.add_trace(optimal_area)
+                                        # Configurar diseño
+                                        fig.update_layout(
+                                            template='plotly_dark',
+                                            height=300,
+                                            showlegend=False,
+                                            margin=dict(l=20, r=20, t=40, b=20),
+                                            plot_bgcolor='rgb(20, 20, 30)',
+                                            paper_bgcolor='rgb(10, 10, 20)',
+                                            title=f"{title} ({opt_range['unit']})"
+                                        )
+                                    # Mostrar gráfica
+                                    with profiler.phase("envio"):
+                                        st.plotly_chart(fig, use_container_width=True)
+                            # Pestaña de explicación y sugerencias
+                            with tabs[1]:
+                                st.markdown(f"### Explicación y Sugerencias para el Módulo {device}")
+                                sensors_config = [
+                                    ('lux', 'Luminosidad'),
+                                    ('nh3', 'Amoniaco'),
+                                    ('hs', 'Sulfuro de Hidrógeno'),
+                                    ('h', 'Humedad'),
+                                    ('t', 'Temperatura')
+                                ]
+                                # Crear columnas para las tarjetas
+                                cols = st.columns(len(sensors_config))
+                                for i, (sensor, title) in enumerate(sensors_config):
+                                    details = SENSOR_RANGES[sensor]
+                                    last_value = device_df[sensor].iloc[-1]
+                                    # Determinar el estado, color y el ícono de la tarjeta
+                                    if last_value < details['optimal_min']:
+                                        status = "Bajo"
+                                        color = "rgba(255, 0, 0, 0.2)"  # Rojo
+                                        icon = '<i class="fas fa-exclamation-circle" style="color: red;"></i>'
+                                        suggestion = f"Aumentar {details['description'].split(' ')[0]} para alcanzar el rango óptimo."
+                                    elif last_value > details['optimal_max']:
+                                        status = "Alto"
+                                        color = "rgba(255, 165, 0, 0.2)"  # Amarillo
+                                        icon = '<i class="fas fa-exclamation-triangle" style="color: orange;"></i>'
+                                        suggestion = f"Reducir {details['description'].split(' ')[0]} para alcanzar el rango óptimo."
+                                    else:
+                                        status = "Óptimo"
+                                        color = "rgba(0, 255, 0, 0.2)"  # Verde
+                                        icon = '<i class="fas fa-check-circle" style="color: green;"></i>'
+                                        suggestion = "Todo está funcionando correctamente."
+                                    # Mostrar tarjeta en la columna correspondiente
+                                    with cols[i]:
+                                        st.markdown(f"""
+                                        <div style="
+                                            border: 1px solid #ddd;
+                                            border-radius: 10px;
+                                            padding: 15px;
+                                            margin-bottom: 10px;
+                                            background-color: {color};
+                                            box-shadow: 2px 2px 5px rgba(0, 0, 0, 0.1);
+                                            transition: transform 0.3s ease, box-shadow 0.3s ease;
+                                        " onmouseover="this.style.transform='scale(1.05)'; this.style.boxShadow='4px 4px 15px rgba(0, 0, 0, 0.3)';" 
+                                            onmouseout="this.style.transform='scale(1)'; this.style.boxShadow='2px 2px 5px rgba(0, 0, 0, 0.1)';">
+                                            <h4 style="margin-bottom: 5px; color: #1E88E5;">
+                                                {icon} {title}
+                                            </h4>
+                                            <p style="margin: 0; font-size: 14px;">{details['description']}</p>
+                                            <p style="margin: 0; font-size: 14px; color: black;">
+                                                <strong>Valor Actual:</strong> {last_value} {details['unit']}
+                                            </p>
+                                            <p style="margin: 0; font-size: 14px; color: #000; font-weight: bold;">
+                                                <strong>Estado:</strong> <span style="color: {icon.split('style="color: ')[1].split(';')[0]};">{status}</span>
+                                            </p>
+                                            <p style="margin: 0; font-size: 14px; color: #000; font-weight: bold;">
+                                                <strong>Sugerencia:</strong> <span style="color: #333;">{suggestion}</span>
+                                            </p>
+                                        </div>
+                                        """, unsafe_allow_html=True)
+                    else:
+                        st.warning(f"No hay datos para {device}.")
+
+        # Mostrar y registrar el desglose de tiempos del rerun
+        profiler.render(profile_container)
+        profiler.write_log()
 
         time.sleep(10)
         st.rerun()
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del proyecto están en la raíz del repositorio (sin paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    """Engine de SQLite en un archivo temporal, con sensors3 y sus índices."""
+    import almacenamiento
+    return almacenamiento.get_engine(f"sqlite:///{tmp_path / 'granja.db'}")
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+from alertas import AlertEngine, classify
+
+RANGOS = {"t": {"optimal_min": 18, "optimal_max": 40}}
+
+
+def niveles(motor, valores):
+    return [[(t["level_from"], t["level_to"]) for t in motor.evaluate("ESP1", {"t": v})] for v in valores]
+
+
+def test_classify():
+    details = RANGOS["t"]
+    assert [classify(v, details) for v in (25, 41, 61, 17, 8)] == [0, 1, 2, 1, 2]
+
+
+def test_debounce_confirma_tras_lecturas_seguidas():
+    motor = AlertEngine(ranges=RANGOS, debounce=3)
+    assert niveles(motor, [45, 45, 25, 45, 45, 45]) == [[], [], [], [], [], [(0, 1)]]
+
+
+def test_histeresis_no_baja_en_el_borde():
+    motor = AlertEngine(ranges=RANGOS, debounce=1, hysteresis=0.1)
+    assert niveles(motor, [45]) == [[(0, 1)]]
+    # 39.5 está dentro del rango, pero no a 10% del ancho (2.2) del umbral
+    assert niveles(motor, [39.5, 39.5]) == [[], []]
+    assert niveles(motor, [30]) == [[(1, 0)]]
+
+
+def test_escribe_y_retoma_el_estado(sqlite_engine):
+    motor = AlertEngine(ranges=RANGOS, debounce=1)
+    transiciones = motor.evaluate("ESP1", {"t": 70}, datetime(2024, 5, 1, 12))
+    motor._write(sqlite_engine, transiciones)
+    assert transiciones == []   # las escritas se quitan de la lista
+    with sqlite_engine.connect() as conn:
+        assert conn.execute(text("SELECT level_to FROM alerts")).scalar() == 2
+    otro = AlertEngine(ranges=RANGOS, debounce=1)
+    assert otro.load_state(sqlite_engine) == 1
+    # Ya está en Crítico: la misma lectura no genera otra alerta
+    assert otro.evaluate("ESP1", {"t": 70}) == []
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from sqlalchemy import make_url, text
+
+import almacenamiento
+from almacenamiento import database_url
+
+
+@pytest.fixture(autouse=True)
+def entorno_limpio(monkeypatch):
+    for name in ("DATABASE_URL", "DB_HOST", "STORAGE_BACKEND", "SQLITE_PATH", "GRANJAS_CONFIG"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(almacenamiento, "_farms", None)
+
+
+def test_precedencia_de_la_url(monkeypatch):
+    assert database_url() == "sqlite:///granja.db"
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("DB_HOST", "db.local")
+    assert database_url() == "postgresql+pg8000://postgres@db.local:5432/galpon_db"
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///otra.db")
+    assert database_url() == "sqlite:///otra.db"
+
+
+def test_credenciales_con_caracteres_especiales(monkeypatch):
+    monkeypatch.setenv("DB_HOST", "db.local")
+    monkeypatch.setenv("DB_USER", "granja@ucc")
+    monkeypatch.setenv("DB_PASSWORD", "p@ss/w:rd#1")
+    url = make_url(database_url())
+    assert (url.username, url.password) == ("granja@ucc", "p@ss/w:rd#1")
+    assert (url.host, url.port, url.database) == ("db.local", 5432, "galpon_db")
+
+
+def test_backend_sin_url_es_error(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "postgres")
+    with pytest.raises(RuntimeError):
+        database_url()
+
+
+
+@pytest.fixture
+def dos_granjas(tmp_path, monkeypatch):
+    config = {
+        "ucc": {"nombre": "UCC", "url": f"sqlite:///{tmp_path / 'ucc.db'}", "dispositivos": ["ESP1"]},
+        "norte": {"nombre": "Norte", "url": f"sqlite:///{tmp_path / 'norte.db'}", "prefijos": ["NOR-"]},
+        "nb": {"nombre": "Norte B", "url": f"sqlite:///{tmp_path / 'nb.db'}", "prefijos": ["NOR-B"]},
+    }
+    path = tmp_path / "granjas.json"
+    path.write_text(json.dumps(config), encoding="utf-8")
+    monkeypatch.setenv("GRANJAS_CONFIG", str(path))
+
+
+def test_dispositivo_va_a_su_granja(dos_granjas):
+    assert almacenamiento.farm_for_device("ESP1") == "ucc"
+    assert almacenamiento.farm_for_device("NOR-7") == "norte"
+    assert almacenamiento.farm_for_device("NOR-B1") == "nb"             # gana el prefijo más largo
+    assert almacenamiento.farm_for_device("OTRO") == "ucc"              # por defecto, la primera
+
+
+def test_router_reparte_filas_por_shard(dos_granjas):
+    router = almacenamiento.ShardRouter()
+    grupos = router.split(["ESP1", "NOR-1", "X", "NOR-2"], lambda device: device)
+    assert [filas for _, filas in grupos] == [["ESP1", "X"], ["NOR-1", "NOR-2"]]
+    assert len(router.engines()) == 3
+
+
+def test_servidor3_escribe_en_el_shard_de_cada_dispositivo(dos_granjas, monkeypatch):
+    Servidor3 = pytest.importorskip("Servidor3")
+    from normalizacion import normalize_reading
+    monkeypatch.setattr(Servidor3, "router", None)
+    filas = [normalize_reading({"Device": device, "LUX": 50, "NH3": 5, "HS": 1, "H": 60, "T": 25,
+                                "ts": 1714557600})
+             for device in ("ESP1", "NOR-1", "NOR-1")]
+    Servidor3.send_to_db(filas)
+    # El reenvío de NOR-1 (mismo dispositivo y hora) se descarta por el índice único
+    for farm, esperadas in (("ucc", 1), ("norte", 1)):
+        with almacenamiento.engine_for_farm(farm).connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM sensors3")).scalar() == esperadas
+
+
+def test_un_engine_por_url_y_pool(tmp_path):
+    url = f"sqlite:///{tmp_path / 'pools.db'}"
+    ingesta = almacenamiento.get_engine(url)
+    assert almacenamiento.get_engine(url) is ingesta
+    assert almacenamiento.get_engine(url, pool="exportacion") is not ingesta
@@ -0,0 +1,40 @@
+import gzip
+import json
+
+import pytest
+
+from codificacion import InvalidPayload, UnsupportedEncoding, decode_readings
+
+LECTURA = {"device": "ESP1", "lux": 120, "nh3": 4.5, "hs": 1, "h": 60, "t": 22.7}
+
+
+def test_json_y_gzip_dan_lo_mismo():
+    body = json.dumps([LECTURA, dict(LECTURA, Device="ESP2")]).encode()
+    assert decode_readings(body) == decode_readings(gzip.compress(body), content_encoding="gzip")
+
+
+def test_conserva_decimales():
+    (lectura,) = decode_readings(json.dumps(LECTURA).encode())
+    assert lectura["t"] == 22.7 and isinstance(lectura["lux"], float)
+
+
+def test_hora_con_zona_pasa_a_utc_sin_zona():
+    (lectura,) = decode_readings(json.dumps(dict(LECTURA, time="2024-05-01T12:00:00-05:00")).encode())
+    assert lectura["time"].isoformat() == "2024-05-01T17:00:00"
+
+
+@pytest.mark.parametrize("valor", [True, "12", None, [1]])
+def test_rechaza_valores_no_numericos(valor):
+    with pytest.raises(InvalidPayload):
+        decode_readings(json.dumps(dict(LECTURA, t=valor)).encode())
+
+
+def test_rechaza_bomba_de_compresion():
+    body = gzip.compress(b"[" + b" " * 2_000_000 + b"]")
+    with pytest.raises(InvalidPayload):
+        decode_readings(body, content_encoding="gzip")
+
+
+def test_formato_desconocido():
+    with pytest.raises(UnsupportedEncoding):
+        decode_readings(b"<xml/>", content_type="application/xml")
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import DateTime, bindparam, text
+
+from consultas import build_fleet_query, build_history_query, fleet_status, next_cursor
+
+
+def _insertar(engine, filas):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO sensors3 (device, lux, nh3, hs, h, t, time) "
+            "VALUES (:device, :lux, :nh3, :hs, :h, :t, :time)"
+        ).bindparams(bindparam("time", type_=DateTime)), filas)   # como la ingesta
+
+
+def _lectura(device, time, t, **otros):
+    return {"device": device, "time": time, "t": t,
+            **{s: otros.get(s, 1.0) for s in ("lux", "nh3", "hs", "h")}}
+
+
+def test_mapa_agrupa_por_dispositivo_e_intervalo(sqlite_engine):
+    _insertar(sqlite_engine, [
+        _lectura("ESP1", datetime(2024, 5, 1, 10, 1), 20.0),
+        _lectura("ESP1", datetime(2024, 5, 1, 10, 14), 24.0),
+        _lectura("ESP1", datetime(2024, 5, 1, 10, 16), 30.0),
+        _lectura("ESP2", datetime(2024, 5, 1, 10, 5), 25.0),
+        _lectura("ESP3", datetime(2024, 5, 1, 10, 5), 25.0),      # no pedido
+        _lectura("ESP1", datetime(2024, 5, 1, 9, 0), 25.0),       # antes del rango
+    ])
+    with sqlite_engine.connect() as conn:
+        query, params = build_fleet_query(conn, ("ESP1", "ESP2"), datetime(2024, 5, 1, 10), 900)
+        buckets = pd.read_sql_query(query, conn, params=params, parse_dates=["bucket"])
+    assert list(zip(buckets["device"], buckets["bucket"].dt.strftime("%H:%M"), buckets["n"])) == [
+        ("ESP1", "10:00", 2), ("ESP1", "10:15", 1), ("ESP2", "10:00", 1),
+    ]
+    assert (buckets["t_min"][0], buckets["t_max"][0], buckets["t_avg"][0]) == (20.0, 24.0, 22.0)
+
+
+def test_estado_ignora_sensores_sin_lecturas(sqlite_engine):
+    _insertar(sqlite_engine, [_lectura("ESP1", datetime(2024, 5, 1, 10), 25.0, nh3=None)])
+    with sqlite_engine.connect() as conn:
+        query, params = build_fleet_query(conn, ("ESP1",), datetime(2024, 5, 1), 900)
+        buckets = pd.read_sql_query(query, conn, params=params)
+    levels, details = fleet_status(buckets)
+    assert len(levels) == 1
+    assert "nh3: sin datos" in details[0]
+
+
+def test_historial_por_keyset_recorre_todo_sin_repetir(sqlite_engine):
+    inicio = datetime(2024, 5, 1)
+    _insertar(sqlite_engine, [_lectura("ESP1", inicio + timedelta(minutes=i), float(i)) for i in range(7)]
+              + [_lectura("ESP2", inicio, 0.0)])
+    cursor, vistas = ("ESP1", None, None), []
+    with sqlite_engine.connect() as conn:
+        for _ in range(10):   # si el cursor no avanzara, no quedar en un bucle
+            query, params = build_history_query(cursor, page_size=3)
+            pagina = pd.read_sql_query(query, conn, params=params, parse_dates=["time"])
+            if pagina.empty:
+                break
+            vistas.extend(pagina["t"])
+            cursor = next_cursor(pagina)
+    assert vistas == [6.0, 5.0, 4.0, 3.0, 2.0, 1.0, 0.0]
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import deduplicacion
+from deduplicacion import DedupWindow, ensure_unique_index, reading_key
+
+
+def test_ventana_detecta_reenvios():
+    window = DedupWindow()
+    clave = reading_key("ESP1", seq=7, ts=1_700_000_000)
+    assert not window.seen(clave)
+    assert window.seen(clave)
+    window.forget(clave)
+    assert not window.seen(clave)
+    assert not window.seen(None) and not window.seen(None)   # sin identidad no se deduplica
+
+
+def test_ventana_acotada_por_claves_y_tiempo(monkeypatch):
+    window = DedupWindow(ttl=10, max_entries=2)
+    for seq in (1, 2, 3):
+        window.seen(reading_key("ESP1", seq=seq, ts=1_700_000_000 + seq))
+    assert len(window) == 2 and not window.seen(reading_key("ESP1", seq=1, ts=1_700_000_001))
+    ahora = deduplicacion.time.monotonic()
+    monkeypatch.setattr(deduplicacion.time, "monotonic", lambda: ahora + 60)
+    assert not window.seen(reading_key("ESP1", seq=3, ts=1_700_000_003))
+
+
+def test_seq_reiniciado_no_es_duplicado():
+    window = DedupWindow()
+    assert not window.seen(reading_key("ESP1", seq=1, ts=1_700_000_000))
+    # El ESP se reinició: el contador vuelve a 1, pero es otra lectura
+    assert not window.seen(reading_key("ESP1", seq=1, ts=1_700_000_600))
+    assert window.seen(reading_key("ESP1", seq=1, ts=1_700_000_600))
+    assert reading_key("ESP1", seq=5) is None          # seq sin hora: no se confía
+
+
+@pytest.fixture
+def tabla_con_duplicados(tmp_path):
+    # Tabla sin el índice (como una base anterior a la deduplicación), con una lectura repetida
+    engine = create_engine(f"sqlite:///{tmp_path / 'vieja.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE sensors3 (device VARCHAR, lux DOUBLE PRECISION, time TIMESTAMP)"))
+        conn.execute(text("INSERT INTO sensors3 VALUES (:d, 1, :t)"),
+                     [{"d": "ESP1", "t": datetime(2024, 5, 1)}] * 2 + [{"d": "ESP2", "t": datetime(2024, 5, 1)}])
+    return engine
+
+
+def test_indice_con_duplicados_falla_de_forma_visible(tabla_con_duplicados):
+    with pytest.raises(RuntimeError, match="DEDUP_DELETE_EXISTING"):
+        ensure_unique_index(tabla_con_duplicados)
+
+
+def test_indice_limpiando_duplicados(tabla_con_duplicados):
+    ensure_unique_index(tabla_con_duplicados, delete_existing=True)
+    with tabla_con_duplicados.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM sensors3")).scalar() == 2
+    ensure_unique_index(tabla_con_duplicados)   # ya existe: no hace nada
@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import text
+
+from estadisticas import MIN_SLOPE_SECONDS, StreamingStats
+
+
+def fila(stats, device, sensor):
+    (row,) = [r for r in stats.snapshot([device]) if r["sensor"] == sensor]
+    return row
+
+
+def test_ewma_y_z_score():
+    stats = StreamingStats(sensors=("t",), alpha=0.5)
+    for i, x in enumerate([20, 22, 20, 22, 20, 22]):
+        stats.update("ESP1", {"t": x}, 1000 + 60 * i)
+    z = stats.update("ESP1", {"t": 40}, 2000)["t"]
+    assert z > 5
+    row = fila(stats, "ESP1", "t")
+    assert row["n"] == 7 and row["last"] == 40
+
+
+def test_pendiente_en_unidades_por_hora():
+    stats = StreamingStats(sensors=("t",), alpha=1.0)
+    stats.update("ESP1", {"t": 20}, 0)
+    stats.update("ESP1", {"t": 21}, 1800)
+    assert fila(stats, "ESP1", "t")["slope"] == pytest.approx(2.0)
+
+
+def test_lecturas_casi_simultaneas_no_disparan_la_pendiente():
+    stats = StreamingStats(sensors=("t",), alpha=1.0)
+    stats.update("ESP1", {"t": 20}, 0)
+    stats.update("ESP1", {"t": 21}, 0.001)
+    assert fila(stats, "ESP1", "t")["slope"] == 0
+    # La base sigue siendo la primera lectura
+    stats.update("ESP1", {"t": 21}, MIN_SLOPE_SECONDS * 2)
+    assert fila(stats, "ESP1", "t")["slope"] == pytest.approx(3600 / (MIN_SLOPE_SECONDS * 2))
+
+
+def test_publica_en_sensor_stats(sqlite_engine):
+    stats = StreamingStats()
+    stats.update("ESP1", {"lux": 1, "nh3": 2, "hs": 3, "h": 4, "t": 5}, 1000)
+    assert stats.publish(sqlite_engine) == 5
+    with sqlite_engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM sensor_stats")).scalar() == 5
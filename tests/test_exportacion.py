@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import DateTime, bindparam, text
+
+from exportacion import EXPORT_COLUMNS, check_format, export_stream, iter_chunks, parse_time
+
+INICIO = datetime(2024, 5, 1)
+
+
+@pytest.fixture
+def lecturas(sqlite_engine):
+    filas = [{"device": device, "t": float(i), "time": INICIO + timedelta(hours=i)}
+             for i in range(5) for device in ("ESP1", "ESP2")]
+    with sqlite_engine.begin() as conn:
+        conn.execute(text("INSERT INTO sensors3 (device, t, time) VALUES (:device, :t, :time)")
+                     .bindparams(bindparam("time", type_=DateTime)), filas)
+    return sqlite_engine
+
+
+def test_csv_con_filtros(lecturas):
+    data = b"".join(export_stream(lecturas, "csv", ["ESP1"], INICIO + timedelta(hours=1), INICIO + timedelta(hours=3)))
+    filas = list(csv.DictReader(io.StringIO(data.decode())))
+    assert list(filas[0]) == list(EXPORT_COLUMNS)
+    assert [(f["device"], float(f["t"])) for f in filas] == [("ESP1", 1.0), ("ESP1", 2.0)]
+
+
+def test_ndjson_ordenado_por_tiempo(lecturas):
+    data = b"".join(export_stream(lecturas, "ndjson", start=INICIO + timedelta(hours=4)))
+    filas = [json.loads(linea) for linea in data.decode().splitlines()]
+    assert [f["device"] for f in filas] == ["ESP1", "ESP2"]
+    assert {f["t"] for f in filas} == {4.0}
+
+
+def test_lee_por_bloques(lecturas):
+    bloques = list(iter_chunks(lecturas, chunk_size=3))
+    assert [len(b) for b in bloques] == [3, 3, 3, 1]
+    partes = list(export_stream(lecturas, "csv", chunk_size=3))
+    assert len(partes) == 1 + 4   # cabecera y un bloque de bytes por bloque de filas
+
+
+def test_parse_time():
+    assert parse_time("2024-05-01") == INICIO
+    assert parse_time("2024-05-01T03:00:00-03:00") == INICIO + timedelta(hours=6)   # a UTC
+    with pytest.raises(ValueError):
+        parse_time("ayer")
+
+
+def test_formato_validado_antes_de_exportar():
+    with pytest.raises(ValueError):
+        check_format("xlsx")
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        with pytest.raises(RuntimeError):
+            check_format("parquet")
@@ -0,0 +1,36 @@
+from limitador import ConcurrencyLimit, RateLimiter
+
+
+def test_token_bucket_rafaga_y_reposicion():
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter.acquire("ESP1", now=0) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("ESP1", now=0) == 0.5
+    assert limiter.acquire("ESP1", now=0.5) == 0
+    assert limiter.acquire("ESP2", now=0) == 0       # cada clave tiene su bucket
+    assert limiter.rejected == 1
+
+
+def test_memoria_acotada_olvida_la_menos_usada():
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        limiter.acquire(key, now=0)
+    assert len(limiter) == 2
+    assert limiter.acquire("b", now=0) == 0          # olvidada: vuelve con el bucket lleno
+
+
+def test_acquire_all_es_todo_o_nada():
+    limiter = RateLimiter(rate=1, burst=1)
+    assert limiter.acquire("ESP2", now=0) == 0
+    assert limiter.acquire_all(["ESP1", "ESP2", "ESP1"], now=0) == (1.0, "ESP2")
+    # El rechazo no gastó la ficha de ESP1
+    assert limiter.acquire("ESP1", now=0) == 0
+    assert limiter.acquire_all(["ESP1", "ESP2"], now=1) == (0.0, None)
+    assert limiter.acquire("ESP2", now=1) > 0
+
+
+def test_concurrencia_rechaza_sin_esperar():
+    limit = ConcurrencyLimit(1)
+    assert limit.try_acquire() and not limit.try_acquire()
+    limit.release()
+    assert limit.try_acquire()
+    assert limit.rejected == 1
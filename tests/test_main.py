@@ -0,0 +1,76 @@
+import importlib
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+import almacenamiento
+
+LECTURA = {"device": "ESP1", "lux": 120, "nh3": 4, "hs": 1, "h": 60, "t": 22.5}
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    # API contra un SQLite temporal (una sola granja)
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "granja.db"))
+    monkeypatch.setenv("GRANJAS_CONFIG", str(tmp_path / "no_existe.json"))
+    monkeypatch.setattr(almacenamiento, "_farms", None)
+    import main
+    main = importlib.reload(main)
+    with TestClient(main.app) as client:
+        yield client, almacenamiento.engine_for_farm()
+
+
+def contar(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM sensors3")).scalar()
+
+
+def test_lote_sin_hora_se_rechaza(api):
+    client, engine = api
+    r = client.post("/api/sensores", json=[LECTURA, dict(LECTURA, lux=130)])
+    assert r.status_code == 422
+    assert contar(engine) == 0
+
+
+def test_lote_informa_las_filas_insertadas(api):
+    client, engine = api
+    lote = [dict(LECTURA, time=datetime(2024, 5, 1, 12, m).isoformat()) for m in range(3)]
+    r = client.post("/api/sensores", json=lote)
+    assert r.json()["guardadas"] == 3
+    # Reenvío con una lectura nueva: la ventana de deduplicación u ON CONFLICT descartan el resto
+    lote.append(dict(LECTURA, time=datetime(2024, 5, 1, 12, 30).isoformat()))
+    r = client.post("/api/sensores", json=lote)
+    assert r.json()["guardadas"] == 1
+    assert contar(engine) == 4
+
+
+def test_exportacion_valida_antes_de_responder(api):
+    client, engine = api
+    assert client.get("/api/export", params={"start": "basura"}).status_code == 422
+    assert client.get("/api/export", params={"format": "xlsx"}).status_code == 400
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        assert client.get("/api/export", params={"format": "parquet"}).status_code == 501
+    r = client.get("/api/export", params={"start": "2024-05-01", "end": "2024-06-01"})
+    assert r.status_code == 200 and r.text.startswith("id,device")
+
+
+def test_exportaciones_y_escrituras_no_comparten_pool(api, monkeypatch):
+    client, engine = api
+    import main
+    ingesta = main.router.engines()[0]
+    assert main.router_fondo.engines()[0] is not ingesta
+    assert client.get("/api/export").status_code == 200
+    assert main.exportaciones.active == 0                  # liberado al terminar el stream
+    assert almacenamiento.engine_for_farm(pool="exportacion") is not ingesta
+    monkeypatch.setattr(main.exportaciones, "active", main.exportaciones.limit)
+    r = client.get("/api/export")
+    assert r.status_code == 429 and "Retry-After" in r.headers
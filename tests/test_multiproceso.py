@@ -0,0 +1,68 @@
+import multiproceso
+from multiproceso import RESTART_BACKOFF, STABLE_UPTIME, Supervisor
+
+
+class FakeProcess:
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.exitcode = None if alive else 1
+
+    def is_alive(self):
+        return self.alive
+
+
+def test_la_espera_de_reinicio_se_reinicia_tras_un_periodo_estable(monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr(multiproceso.time, "monotonic", lambda: reloj[0])
+    sup = Supervisor(lambda sock, stats: None, "127.0.0.1", 0, workers=1)
+
+    def spawn(i):
+        sup._procs[i] = FakeProcess()
+        sup._started[i] = reloj[0]
+
+    monkeypatch.setattr(sup, "_spawn", spawn)
+
+    def caida():
+        sup._procs[0] = FakeProcess(alive=False)
+        sup._check_workers()
+        return sup._next_start[0] - reloj[0]
+
+    sup._spawn(0)
+    assert [caida(), caida(), caida()] == [RESTART_BACKOFF, 2 * RESTART_BACKOFF, 4 * RESTART_BACKOFF]
+    reloj[0] += 10
+    sup._check_workers()            # vuelve a arrancar
+    reloj[0] += STABLE_UPTIME
+    sup._check_workers()            # lleva STABLE_UPTIME vivo
+    assert caida() == RESTART_BACKOFF
+    assert sup.stats()["total"]["reinicios"] == 4
+
+
+def agregador_de_prueba(eventos):
+    pass
+
+
+def test_el_agregador_corre_en_su_proceso_y_se_relanza(monkeypatch):
+    sup = Supervisor(lambda sock, stats: None, "127.0.0.1", 0, workers=1, aggregator=agregador_de_prueba)
+    monkeypatch.setattr(sup, "_spawn", lambda i: None)
+    lanzados = []
+
+    def spawn_aggregator():
+        lanzados.append(FakeProcess())
+        sup._aggregator_proc = lanzados[-1]
+
+    monkeypatch.setattr(sup, "_spawn_aggregator", spawn_aggregator)
+    sup._spawn_aggregator()
+    sup._check_workers()
+    assert len(lanzados) == 1
+    lanzados[0].alive = False
+    sup._check_workers()
+    assert len(lanzados) == 2 and sup._aggregator_proc.is_alive()
+
+
+def test_descarta_conexiones_heredadas(sqlite_engine):
+    import almacenamiento
+    with sqlite_engine.connect():
+        pass
+    assert sqlite_engine.pool.checkedin() == 1
+    almacenamiento.discard_inherited_connections()
+    assert sqlite_engine.pool.checkedin() == 0
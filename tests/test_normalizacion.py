@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from normalizacion import COLUMNS, NormalizationError, normalize_reading, sensor_values, to_frame
+
+LECTURA = {"Device": "ESP1", "IP": "10.0.0.5", "LUX": 120, "NH3": 4.5, "HS": 1, "H": 60, "T": 22.5}
+
+
+def test_normaliza_claves_legadas():
+    fila = normalize_reading(LECTURA, now=datetime(2024, 5, 1, 12))
+    assert fila == ("ESP1", "10.0.0.5", 120.0, 4.5, 1.0, 60.0, 22.5, datetime(2024, 5, 1, 12))
+    assert sensor_values(fila) == {"lux": 120.0, "nh3": 4.5, "hs": 1.0, "h": 60.0, "t": 22.5}
+
+
+def test_usa_ts_del_dispositivo():
+    fila = normalize_reading(dict(LECTURA, ts=1_700_000_000))
+    # UTC sin zona, como la API HTTP
+    assert fila.time == datetime.fromtimestamp(1_700_000_000, timezone.utc).replace(tzinfo=None)
+
+
+@pytest.mark.parametrize("ts", ["abc", "1700000000", [1], True, 1e20, float("nan")])
+def test_ts_invalido_es_error_de_normalizacion(ts):
+    with pytest.raises(NormalizationError):
+        normalize_reading(dict(LECTURA, ts=ts))
+
+
+@pytest.mark.parametrize("cambio", [
+    {"Device": ""}, {"LUX": "alto"}, {"T": None},
+    # Mismas reglas que codificacion.normalize_reading en la API HTTP
+    {"NH3": "4.5"}, {"H": True}, {"T": float("nan")}, {"LUX": float("inf")},
+])
+def test_lectura_invalida(cambio):
+    with pytest.raises(NormalizationError):
+        normalize_reading(dict(LECTURA, **cambio))
+
+
+def test_to_frame():
+    df = to_frame([normalize_reading(LECTURA), normalize_reading(dict(LECTURA, Device="ESP2"))])
+    assert list(df.columns) == list(COLUMNS)
+    assert df["device"].tolist() == ["ESP1", "ESP2"]
@@ -0,0 +1,67 @@
+import socket
+import threading
+
+import pytest
+
+from protocolo import (
+    HEADER, ProtocolError, decode_body, encode_json, encode_readings, parse_message, read_readings,
+)
+
+LECTURA = {"Device": "ESP1", "IP": "10.0.0.5", "LUX": 120.5, "NH3": 4.25, "HS": 1, "H": 60, "T": -3.5}
+
+
+def test_ida_y_vuelta():
+    lecturas = [LECTURA, dict(LECTURA, Device="GALPON-NORTE-E01", seq=7, ts=1_700_000_000)]
+    assert decode_body(encode_readings(lecturas)[HEADER.size:]) == [
+        {**LECTURA, "HS": 1.0, "H": 60.0},
+        {**LECTURA, "HS": 1.0, "H": 60.0, "Device": "GALPON-NORTE-E01", "seq": 7, "ts": 1_700_000_000},
+    ]
+
+
+def test_id_largo_no_se_trunca():
+    with pytest.raises(ProtocolError, match="GALPON-NORTE-ESP-01"):
+        encode_readings([dict(LECTURA, Device="GALPON-NORTE-ESP-01")])
+
+
+@pytest.mark.parametrize("cambio", [
+    {"LUX": 3e7}, {"T": float("nan")}, {"T": "alto"}, {"seq": -1}, {"ts": 2 ** 32}, {"Device": "ñandú"},
+])
+def test_valores_fuera_del_formato(cambio):
+    with pytest.raises(ProtocolError):
+        encode_readings([dict(LECTURA, **cambio)])
+
+
+def test_cuerpo_con_largo_incorrecto():
+    with pytest.raises(ProtocolError):
+        decode_body(encode_readings([LECTURA])[HEADER.size:-1])
+
+
+@pytest.mark.parametrize("encode", [lambda r: encode_readings([r]), encode_json])
+def test_lectura_partida_en_segmentos(encode):
+    a, b = socket.socketpair()
+    data = encode(LECTURA)
+
+    def enviar():
+        # Un byte por segmento: el lector debe juntar el mensaje completo
+        for i in range(len(data)):
+            a.sendall(data[i:i + 1])
+        a.close()
+
+    threading.Thread(target=enviar).start()
+    with b:
+        (lectura,) = read_readings(b)
+    assert lectura["Device"] == "ESP1" and lectura["T"] == -3.5
+
+
+@pytest.mark.parametrize("mensaje", [b"[1, 2]", b"null", b"5", b'"ESP1"'])
+def test_json_que_no_es_objeto(mensaje):
+    with pytest.raises(ProtocolError):
+        parse_message(mensaje)
+    cliente, servidor = socket.socketpair()
+    try:
+        cliente.sendall(mensaje + b" ")
+        with pytest.raises(ProtocolError):
+            read_readings(servidor)
+    finally:
+        cliente.close()
+        servidor.close()
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import retencion
+from retencion import compact, dry_run
+
+
+def _insertar(engine, filas):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO sensors3 (device, t, time) VALUES (:device, :t, :time)"), filas)
+
+
+@pytest.fixture
+def lecturas_viejas(sqlite_engine):
+    vieja = (datetime.now() - timedelta(days=40)).replace(minute=0, second=0, microsecond=0)
+    _insertar(sqlite_engine, [
+        {"device": "ESP1", "t": 20.0, "time": vieja},
+        {"device": "ESP1", "t": 24.0, "time": vieja + timedelta(minutes=10)},
+        {"device": "ESP2", "t": 30.0, "time": vieja},
+        {"device": "ESP1", "t": 22.0, "time": datetime.now()},
+    ])
+    return sqlite_engine
+
+
+def test_dry_run_no_modifica(lecturas_viejas):
+    informe = dry_run(lecturas_viejas, days=30, interval=3600)
+    assert informe["filas"] == 3 and informe["agregados"] == 2
+    with lecturas_viejas.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM sensors3")).scalar() == 4
+
+
+def test_compacta_por_lotes_y_combina_agregados(lecturas_viejas):
+    assert compact(lecturas_viejas, days=30, interval=3600, batch=1, pause=0) == 3
+    with lecturas_viejas.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM sensors3")).scalar() == 1
+        fila = conn.execute(text(
+            "SELECT n, t_avg, t_min, t_max FROM sensors3_agregados WHERE device = 'ESP1'"
+        )).one()
+    # Los dos lotes del mismo intervalo se combinan en una sola fila
+    assert tuple(fila) == (2, 22.0, 20.0, 24.0)
+
+
+class _EngineConFallos:
+    # Envuelve un engine y hace fallar las primeras transacciones de compactación
+    def __init__(self, engine, errores):
+        self.engine, self.errores = engine, list(errores)
+        self.dialect = engine.dialect
+
+    def begin(self):
+        if self.errores and self.errores[0] is not None:
+            raise self.errores.pop(0)
+        if self.errores:
+            self.errores.pop(0)
+        return self.engine.begin()
+
+
+def _error(mensaje):
+    return OperationalError("DELETE", {}, Exception(mensaje))
+
+
+def test_reintenta_solo_bloqueos_y_con_tope(lecturas_viejas, monkeypatch):
+    monkeypatch.setattr(retencion.time, "sleep", lambda s: None)
+    # CREATE TABLE, luego un lote cancelado por bloqueo que se reintenta
+    engine = _EngineConFallos(lecturas_viejas, [None, _error("database is locked")])
+    assert compact(engine, days=30, pause=0) == 3
+
+    engine = _EngineConFallos(lecturas_viejas, [None] + [_error("canceling statement due to lock timeout")] * 10)
+    with pytest.raises(OperationalError):
+        compact(engine, days=30, pause=0)
+    assert len(engine.errores) == 10 - (retencion.MAX_RETRIES + 1)
+
+    engine = _EngineConFallos(lecturas_viejas, [None, _error("no such column: t_avg")])
+    with pytest.raises(OperationalError):
+        compact(engine, days=30, pause=0)
+    assert engine.errores == []
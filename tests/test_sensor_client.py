@@ -0,0 +1,82 @@
+import socket
+import threading
+
+import pytest
+
+import sensor_client
+from sensor_client import ReadingBuffer, backoff_delay
+
+
+def test_buffer_descarta_la_mas_vieja_al_llenarse():
+    buffer = ReadingBuffer(maxlen=2)
+    lecturas = [{"n": n} for n in range(3)]
+    for lectura in lecturas:
+        buffer.put(lectura)
+    assert buffer.peek(5) == lecturas[1:] and buffer.dropped == 1
+
+
+def test_confirm_quita_solo_lo_enviado():
+    buffer = ReadingBuffer(maxlen=2)
+    a, b, c = {"n": 1}, {"n": 2}, {"n": 3}
+    buffer.put(a)
+    buffer.put(b)
+    enviadas = buffer.peek(2)
+    buffer.put(c)               # descarta a mientras el lote estaba en vuelo
+    buffer.confirm(enviadas)    # a ya no está; b sí se confirma
+    assert buffer.peek(5) == [c]
+
+
+def test_backoff_acotado(monkeypatch):
+    monkeypatch.setattr(sensor_client.random, "uniform", lambda low, high: high)
+    assert backoff_delay(0) == sensor_client.BACKOFF_BASE
+    assert backoff_delay(3) == sensor_client.BACKOFF_BASE * 8
+    assert backoff_delay(50) == sensor_client.BACKOFF_MAX
+    monkeypatch.undo()
+    assert all(0 <= backoff_delay(n) <= sensor_client.BACKOFF_MAX for n in range(20))
+
+
+@pytest.fixture
+def servidor_que_cierra(monkeypatch):
+    # Acepta y cierra sin pedir datos, como un servidor saturado o apagándose
+    server = socket.create_server(("127.0.0.1", 0))
+    aceptadas = []
+
+    def loop():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            aceptadas.append(conn)
+            conn.close()
+
+    threading.Thread(target=loop, daemon=True).start()
+    monkeypatch.setattr(sensor_client, "SERVER_PORT", server.getsockname()[1])
+    yield aceptadas
+    server.close()
+
+
+def test_sin_pedido_del_servidor_no_envia(servidor_que_cierra):
+    buffer = ReadingBuffer()
+    buffer.put({"Device": "ESP1"})
+    assert sensor_client.connect_and_send_data(buffer) == 0
+    assert len(buffer) == 1
+
+
+def test_conexion_cerrada_sin_pedido_pasa_por_el_backoff(servidor_que_cierra, monkeypatch):
+    esperas = []
+
+    def sleep(segundos):
+        esperas.append(segundos)
+        if len(esperas) == 3:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(sensor_client, "PERSISTENT", False)
+    monkeypatch.setattr(sensor_client, "PROTOCOL", "json")
+    monkeypatch.setattr(sensor_client, "sample_forever", lambda buffer: buffer.put({"Device": "ESP1"}))
+    monkeypatch.setattr(sensor_client, "should_send", lambda buffer, last_send: True)
+    monkeypatch.setattr(sensor_client, "backoff_delay", lambda attempt: float(attempt + 1))
+    monkeypatch.setattr(sensor_client.time, "sleep", sleep)
+    sensor_client.main()
+    # Cada conexión fallida espera más que la anterior (attempt no se reinicia)
+    assert esperas == [1.0, 2.0, 3.0]
@@ -0,0 +1,50 @@
+import queue
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+import Servidor
+from normalizacion import normalize_reading
+from spool import PoisonBatch
+
+
+def registro(device, cuando):
+    fila = normalize_reading({"Device": device, "LUX": 1, "NH3": 2, "HS": 3, "H": 4, "T": 5}, now=cuando)
+    r = fila._asdict()
+    r["time"] = fila.time.isoformat(timespec="microseconds")
+    return r
+
+
+def test_lote_con_horas_con_y_sin_microsegundos(sqlite_engine):
+    a = registro("ESP1", datetime(2024, 5, 1, 12, 0, 0))
+    b = registro("ESP1", datetime(2024, 5, 1, 12, 0, 1, 250))
+    # Un registro escrito por una versión anterior, sin microsegundos
+    a["time"] = "2024-05-01T12:00:00"
+    Servidor.send_shard_batch(sqlite_engine, "prueba", [(1, a), (2, b)], 2)
+    with sqlite_engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM sensors3")).scalar() == 2
+        assert conn.execute(text("SELECT seq FROM ingest_checkpoint")).scalar() == 2
+
+
+def test_checkpoint_descarta_reenvios(sqlite_engine):
+    entradas = [(1, registro("ESP1", datetime(2024, 5, 1, 12))), (2, registro("ESP1", datetime(2024, 5, 1, 13)))]
+    Servidor.send_shard_batch(sqlite_engine, "prueba", entradas, 2)
+    Servidor.send_shard_batch(sqlite_engine, "prueba", entradas, 2)
+    with sqlite_engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM sensors3")).scalar() == 2
+
+
+def test_registro_irrecuperable_es_lote_envenenado(sqlite_engine):
+    malo = registro("ESP1", datetime(2024, 5, 1, 12))
+    malo["time"] = "ayer"
+    with pytest.raises(PoisonBatch):
+        Servidor.send_shard_batch(sqlite_engine, "prueba", [(1, malo)], 1)
+
+
+def test_con_agregador_los_eventos_van_a_la_cola(monkeypatch):
+    eventos = queue.Queue()
+    monkeypatch.setattr(Servidor, "EVENTOS", eventos)
+    Servidor.registrar_evento("ESP1", {"t": 70.0}, 1_700_000_000)
+    assert eventos.get_nowait() == ("ESP1", {"t": 70.0}, 1_700_000_000)
+    assert "ESP1" not in Servidor.ESTADISTICAS._index
@@ -0,0 +1,72 @@
+import socket
+import threading
+import time
+
+from protocolo import encode_json, encode_readings, parse_message
+from sesiones import PollIntervals, SessionServer
+
+LECTURA = {"Device": "ESP1", "IP": "10.0.0.5", "LUX": 1, "NH3": 2, "HS": 3, "H": 4, "T": 5}
+
+
+def test_parse_message_espera_el_mensaje_completo():
+    frame = encode_readings([LECTURA])
+    for data in (frame, encode_json(LECTURA)):
+        assert parse_message(data[:-1]) == (None, 0)
+        readings, consumed = parse_message(data + data)
+        assert readings[0]["Device"] == "ESP1" and consumed == len(data)
+
+
+def test_dispositivo_lento_no_frena_a_los_demas():
+    recibidas = []
+    listo = threading.Event()
+
+    def on_readings(session, readings):
+        recibidas.extend(r["Device"] for r in readings)
+        listo.set()
+
+    server = SessionServer(on_readings, intervals=PollIntervals(default=3600, jitter=0))
+    server.start()
+    lento_cli, lento_srv = socket.socketpair()
+    rapido_cli, rapido_srv = socket.socketpair()
+    try:
+        server.add_session(lento_srv, ("10.0.0.1", 1))
+        server.add_session(rapido_srv, ("10.0.0.2", 1))
+        # El lento manda medio marco y se queda callado
+        lento_cli.sendall(encode_readings([dict(LECTURA, Device="LENTO")])[:10])
+        time.sleep(0.2)
+        inicio = time.monotonic()
+        rapido_cli.sendall(encode_readings([dict(LECTURA, Device="RAPIDO")]))
+        assert listo.wait(2.0)
+        assert recibidas == ["RAPIDO"]
+        assert time.monotonic() - inicio < 1.0
+    finally:
+        server.stop()
+        lento_cli.close()
+        rapido_cli.close()
+
+
+def test_mensaje_invalido_cierra_solo_su_sesion():
+    recibidas = []
+    listo = threading.Event()
+
+    def on_readings(session, readings):
+        recibidas.extend(r["Device"] for r in readings)
+        listo.set()
+
+    server = SessionServer(on_readings, intervals=PollIntervals(default=3600, jitter=0))
+    server.start()
+    malo_cli, malo_srv = socket.socketpair()
+    bueno_cli, bueno_srv = socket.socketpair()
+    try:
+        server.add_session(malo_srv, ("10.0.0.1", 1))
+        server.add_session(bueno_srv, ("10.0.0.2", 1))
+        malo_cli.sendall(b"[1,2]")
+        time.sleep(0.2)
+        bueno_cli.sendall(encode_json(LECTURA))
+        assert listo.wait(2.0)
+        assert recibidas == ["ESP1"]
+        assert len(server.sessions) == 1
+    finally:
+        server.stop()
+        malo_cli.close()
+        bueno_cli.close()
@@ -0,0 +1,110 @@
+import json
+import os
+import time
+
+from spool import QUARANTINE_DIR, PoisonBatch, Spool
+
+
+def esperar(condicion, timeout=5.0):
+    fin = time.monotonic() + timeout
+    while time.monotonic() < fin:
+        if condicion():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_lote_envenenado_va_a_cuarentena_y_no_frena_el_resto(tmp_path):
+    recibidos = []
+
+    def sink(entradas):
+        if any(registro.get("malo") for _, registro in entradas):
+            raise PoisonBatch("dato inválido")
+        recibidos.extend(seq for seq, _ in entradas)
+
+    spool = Spool(str(tmp_path), sink, batch_size=2)
+    for registro in ({"malo": True}, {"n": 2}):
+        spool.append(registro)
+    spool.start()
+    try:
+        assert esperar(lambda: spool.committed == 2)
+        spool.append({"n": 3})
+        assert esperar(lambda: recibidos == [3])
+    finally:
+        spool.stop()
+    assert spool.stats()["cuarentena"] == 2
+    (archivo,) = os.listdir(tmp_path / QUARANTINE_DIR)
+    lineas = [json.loads(l) for l in open(tmp_path / QUARANTINE_DIR / archivo)]
+    assert [l["seq"] for l in lineas] == [1, 2]
+    assert lineas[0]["registro"] == {"malo": True}
+
+
+def test_recupera_registro_incompleto_y_sigue_el_seq(tmp_path):
+    spool = Spool(str(tmp_path), lambda entradas: None)
+    for n in range(3):
+        spool.append({"n": n})
+    spool.stop()
+    (segmento,) = [p for p in tmp_path.iterdir() if p.suffix == ".seg"]
+    with open(segmento, "ab") as f:
+        f.write(b"\x00\x00\x00")  # cabecera a medio escribir
+
+    recibidos = []
+    spool = Spool(str(tmp_path), recibidos.extend)
+    assert spool.stats()["pendientes"] == 3
+    assert spool.append({"n": 3}) == 4
+    spool.start()
+    try:
+        assert esperar(lambda: spool.committed == 4)
+    finally:
+        spool.stop()
+    assert [registro["n"] for _, registro in recibidos] == [0, 1, 2, 3]
+
+
+def test_reinicio_retoma_desde_el_checkpoint(tmp_path):
+    recibidos = []
+    spool = Spool(str(tmp_path), recibidos.extend).start()
+    spool.append({"n": 1})
+    assert esperar(lambda: spool.committed == 1)
+    spool.stop()
+    # Un registro que no llegó a drenarse antes de la caída
+    spool = Spool(str(tmp_path), recibidos.extend)
+    spool.append({"n": 2})
+    spool.stop()
+
+    spool = Spool(str(tmp_path), recibidos.extend).start()
+    try:
+        assert esperar(lambda: spool.committed == 2)
+    finally:
+        spool.stop()
+    assert [seq for seq, _ in recibidos] == [1, 2]
+
+
+def test_incarnation_persiste_y_cambia_si_se_borra_la_carpeta(tmp_path):
+    directorio = tmp_path / "spool"
+    primera = Spool(str(directorio), lambda entradas: None)
+    primera.stop()
+    assert Spool(str(directorio), lambda entradas: None).incarnation == primera.incarnation
+
+    for archivo in directorio.iterdir():
+        archivo.unlink()
+    directorio.rmdir()
+    nueva = Spool(str(directorio), lambda entradas: None)
+    assert nueva.incarnation != primera.incarnation
+    assert nueva.append({"n": 1}) == 1
+
+
+def test_solo_drena_lo_que_ya_esta_en_disco(tmp_path):
+    recibidos = []
+    # fsync periódico lento: en la primera fracción de segundo solo la rotación hace fsync
+    spool = Spool(str(tmp_path), recibidos.extend, fsync_interval=1.0, segment_bytes=200)
+    spool.append({"n": 1})
+    spool.start()
+    try:
+        time.sleep(0.3)
+        assert recibidos == []
+        spool.append({"n": 2, "relleno": "x" * 200})    # rota: fsync de {"n": 1}
+        assert esperar(lambda: [seq for seq, _ in recibidos] == [1])
+        time.sleep(0.2)
+        assert spool.committed == 1
+    finally:
+        spool.stop()